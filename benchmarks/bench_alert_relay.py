@@ -0,0 +1,125 @@
+# node RPC load and grid alert delivery latency, per meter polling vs the alert relay
+"""
+Runs N meters' BlockchainGetAlerts on one event loop while a grid alert is
+sent every --alert-interval seconds:
+    - direct: every meter follows GridAlert itself with its own EventSubscription
+    - relay: one AlertRelay follows the chain and pushes the alerts to the
+      meters over a Unix socket (or loopback TCP)
+
+Reported per method and meter count: JSON-RPC requests per second made to
+the node and the time from sending an alert until each
+meter shows it.
+
+Usage:
+    python -m benchmarks.bench_alert_relay --meters 12 50 200 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import time
+
+from eth_account import Account
+
+from benchmarks.common import (
+    connect,
+    get_private_key,
+    print_results,
+    summarise_latencies,
+)
+from client.alert_relay import AlertRelay, RELAY_PORT
+from client.blockchain_client import BlockchainGetAlerts
+from client.event_subscription import EventSubscription
+
+ALERT_PREFIX = "bench-alert-"
+
+
+class RecordingDisplay:
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    def update_notice_message(self, message):
+        if message.startswith(ALERT_PREFIX):
+            self.latencies.append(time.time() - float(message[len(ALERT_PREFIX) :]))
+
+
+def relay_address():
+    if hasattr(socket, "AF_UNIX"):
+        return os.path.join(tempfile.mkdtemp(), "alerts.sock")
+    return f"127.0.0.1:{RELAY_PORT + 1}"
+
+
+async def send_alerts(sender, interval):
+    w3, contract = sender
+    address = Account.from_key(get_private_key(0)).address
+    while True:
+        await asyncio.sleep(interval)
+        message = f"{ALERT_PREFIX}{time.time()}"
+        await asyncio.to_thread(
+            contract.functions.sendGridAlert(message).transact, {"from": address}
+        )
+
+
+async def run_meters(mode, meters, duration, interval):
+    w3, contract = connect()
+    latencies = []
+    coroutines = []
+    address = None
+    if mode == "relay":
+        address = relay_address()
+        relay = AlertRelay(address)
+        coroutines.append(relay.serve())
+        coroutines.append(
+            EventSubscription(w3, contract.events.GridAlert, relay.relay_alert).run()
+        )
+    for _ in range(meters):
+        coroutines.append(
+            BlockchainGetAlerts(
+                w3,
+                contract,
+                RecordingDisplay(latencies),
+                relay_address=address,
+            ).monitor_grid_alerts()
+        )
+    coroutines.append(send_alerts(connect(), interval))
+    tasks = [asyncio.create_task(coroutine) for coroutine in coroutines]
+    # Give the meters time to connect before counting
+    await asyncio.sleep(1)
+    w3.provider.reset()
+    latencies.clear()
+    started = time.perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - started
+    calls = dict(w3.provider.calls)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "method": mode,
+        "meters": meters,
+        "rpc_requests_per_second": round(sum(calls.values()) / elapsed, 2),
+        "delivery": summarise_latencies(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--meters", type=int, nargs="+", default=[12, 50, 200])
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--alert-interval", type=float, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for meters in args.meters:
+        for mode in ("direct", "relay"):
+            results.append(
+                asyncio.run(
+                    run_meters(mode, meters, args.duration, args.alert_interval)
+                )
+            )
+    print_results("alert_relay", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# gas per reading and throughput of storeMeterReadings at different batch sizes
+"""
+For each batch size the same number of readings is stored from one account,
+batch size 1 uses storeMeterReading and larger sizes storeMeterReadings. Each
+transaction waits for its receipt before the next one is sent.
+
+Reported per batch size: transactions, gas per reading, transactions per
+second and readings per second.
+
+Ganache must be started with a block gas limit that fits the largest batch,
+docker-compose.yml sets 30M which holds a little over 100 readings.
+
+Usage:
+    python -m benchmarks.bench_batch_submission --sizes 1 10 100 --readings 1000
+"""
+import argparse
+import time
+from uuid import uuid4
+
+from eth_account import Account
+
+from benchmarks.common import connect, get_private_key, print_results
+from client.blockchain_client import READING_SCALING_FACTOR, GenerateReadings
+
+
+def store_batch(w3, contract, address, batch_size):
+    uids = [str(uuid4()) for _ in range(batch_size)]
+    readings = [
+        int((GenerateReadings.generate_reading() or 0.001) * READING_SCALING_FACTOR)
+        for _ in range(batch_size)
+    ]
+    if batch_size == 1:
+        contract_function = contract.functions.storeMeterReading(uids[0], readings[0])
+    else:
+        contract_function = contract.functions.storeMeterReadings(uids, readings)
+    tx = contract_function.transact({"from": address})
+    return w3.eth.wait_for_transaction_receipt(tx).gasUsed
+
+
+def measure(w3, contract, address, batch_size, reading_count):
+    transactions = max(1, reading_count // batch_size)
+    gas_used = 0
+    started = time.perf_counter()
+    for _ in range(transactions):
+        gas_used += store_batch(w3, contract, address, batch_size)
+    elapsed = time.perf_counter() - started
+    return {
+        "batch_size": batch_size,
+        "transactions": transactions,
+        "readings": transactions * batch_size,
+        "gas_per_reading": round(gas_used / (transactions * batch_size)),
+        "transactions_per_second": round(transactions / elapsed, 2),
+        "readings_per_second": round(transactions * batch_size / elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--readings", type=int, default=1000)
+    parser.add_argument("--account", type=int, default=45)
+    args = parser.parse_args()
+
+    w3, contract = connect()
+    address = Account.from_key(get_private_key(args.account)).address
+    # One warm up write so the first size does not pay for the zero to non zero totals
+    store_batch(w3, contract, address, 1)
+
+    results = [
+        measure(w3, contract, address, batch_size, args.readings)
+        for batch_size in args.sizes
+    ]
+    print_results("batch_submission", results)
+
+
+if __name__ == "__main__":
+    main()
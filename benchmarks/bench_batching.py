@@ -0,0 +1,81 @@
+# one JSON-RPC batch against one eth_call per account
+"""
+Reads getMeterSummary for N accounts, first with one call per account and then
+through BatchedViewCaller. Accounts beyond the 50 Ganache ones are random
+addresses, which is fine for view calls.
+
+Reported per account count and mode: total time and HTTP requests sent.
+
+Usage:
+    python -m benchmarks.bench_batching --accounts 12 50 500 --repeat 5
+"""
+import argparse
+import asyncio
+import time
+
+from eth_account import Account
+
+from benchmarks.common import connect, get_private_key, print_results
+from client.batching import BatchedViewCaller
+
+
+def get_addresses(count):
+    addresses = [Account.from_key(get_private_key(i)).address for i in range(min(count, 50))]
+    addresses += [Account.create().address for _ in range(count - len(addresses))]
+    return addresses
+
+
+def read_individually(w3, contract, addresses):
+    return [
+        contract.functions.getMeterSummary().call({"from": address})
+        for address in addresses
+    ]
+
+
+def read_batched(w3, contract, addresses):
+    async def read_all():
+        batcher = BatchedViewCaller(w3, contract)
+        try:
+            return await asyncio.gather(
+                *(batcher.get_meter_summary(address) for address in addresses)
+            )
+        finally:
+            await batcher.close()
+
+    return asyncio.run(read_all())
+
+
+def measure(read, addresses, repeat):
+    w3, contract = connect()
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        read(w3, contract, addresses)
+        durations.append(time.perf_counter() - started)
+    return {
+        "mean_ms": round(sum(durations) / repeat * 1000, 2),
+        "http_requests_per_read": sum(w3.provider.calls.values()) // repeat,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--accounts", type=int, nargs="+", default=[12, 50, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for count in args.accounts:
+        addresses = get_addresses(count)
+        results.append(
+            {
+                "accounts": count,
+                "individual": measure(read_individually, addresses, args.repeat),
+                "batched": measure(read_batched, addresses, args.repeat),
+            }
+        )
+    print_results("batching", results)
+
+
+if __name__ == "__main__":
+    main()
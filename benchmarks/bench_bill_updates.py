@@ -0,0 +1,107 @@
+# compares the polling and push (event) modes of BlockchainGetBill
+"""
+For each mode a bill monitor runs against its own counting provider while
+readings are stored from the same account at a fixed interval.
+
+Reported per mode:
+    - JSON-RPC calls per minute made by the bill monitor
+    - latency from sending a reading to the monitor updating the display
+
+Usage:
+    python -m benchmarks.bench_bill_updates --duration 60 --interval 2
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import (
+    BackgroundLoop,
+    connect,
+    get_private_key,
+    print_results,
+    summarise_latencies,
+)
+from client.blockchain_client import (
+    BlockchainGetBill,
+    BlockchainStoreReading,
+    GenerateReadings,
+)
+from client.renderers import MeterDisplay
+
+WARMUP_SECONDS = 2
+
+
+class RecordingDisplay(MeterDisplay):
+    """Records when the bill monitor updated the bill"""
+
+    def __init__(self):
+        super().__init__()
+        self.update_times = []
+        self.state.subscribe(self.record_update)
+
+    def record_update(self, changed):
+        if "bill" in changed or "billed_usage" in changed:
+            self.update_times.append(time.perf_counter())
+
+
+def run_mode(push_updates, private_key, duration, interval):
+    monitor_w3, monitor_contract = connect()
+    writer_w3, writer_contract = connect()
+    display = RecordingDisplay()
+    bill_obj = BlockchainGetBill(
+        private_key, monitor_w3, monitor_contract, display, push_updates=push_updates
+    )
+    writer = BlockchainStoreReading(private_key, writer_w3, writer_contract)
+
+    coro = bill_obj.watch_bill_updates() if push_updates else bill_obj.poll_bill()
+    monitor = BackgroundLoop(coro)
+    monitor.start()
+    time.sleep(WARMUP_SECONDS)
+    monitor_w3.provider.reset()
+
+    sent_times = []
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        reading = GenerateReadings.generate_reading() or 0.001
+        sent_times.append(time.perf_counter())
+        asyncio.run(writer.store_reading(reading))
+        # Mirror GenerateReadings, which bumps the displayed usage straight away
+        display.state.record_reading(reading)
+        time.sleep(interval)
+    time.sleep(WARMUP_SECONDS)
+    elapsed = time.perf_counter() - started
+    monitor.stop()
+
+    latencies = []
+    for sent in sent_times:
+        updates = [t for t in display.update_times if t >= sent]
+        if updates:
+            latencies.append(updates[0] - sent)
+
+    calls = dict(monitor_w3.provider.calls)
+    return {
+        "mode": "push" if push_updates else "poll",
+        "readings_sent": len(sent_times),
+        "rpc_calls_per_minute": round(sum(calls.values()) / elapsed * 60, 1),
+        "rpc_calls_by_method": calls,
+        "update_latency": summarise_latencies(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--interval", type=float, default=2)
+    parser.add_argument("--account", type=int, default=1)
+    args = parser.parse_args()
+
+    private_key = get_private_key(args.account)
+    results = [
+        run_mode(push_updates, private_key, args.duration, args.interval)
+        for push_updates in (False, True)
+    ]
+    print_results("bill_updates", results)
+
+
+if __name__ == "__main__":
+    main()
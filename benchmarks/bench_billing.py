@@ -0,0 +1,151 @@
+# time to re-bill a year of half hourly readings with the server's billing engine
+"""
+compute: makes --readings-per-meter half hourly readings for --meters meters,
+a chunk of meters at a time like BillingEngine.run, and times compute_bills
+for each tariff, with a plain Python loop over the first chunk for scale.
+
+load: indexes --load-meters meters with a year of readings into a
+ReadingStore and times BillingEngine.run end to end, split into loading the
+arrays from the store's packed reading columns and billing them.
+
+No Ganache is needed for either.
+
+Usage:
+    python -m benchmarks.bench_billing --meters 10000 --readings-per-meter 17520
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import print_results
+from client.event_subscription import LOG_INDEX_END
+from server.billing import (
+    ECONOMY_7,
+    METERS_PER_CHUNK,
+    SLOT_SECONDS,
+    TIERS,
+    BillingEngine,
+    TieredTariff,
+    TimeOfUseTariff,
+    compute_bills,
+)
+from server.indexer import SCALING_FACTOR, ReadingStore
+
+YEAR_START = 1704067200  # 2024-01-01 00:00 UTC
+LOOP_READINGS = 2000000  # Readings billed by the Python loop baseline
+
+
+def synthetic_chunk(rng, meters, readings_per_meter):
+    meter_ids = np.repeat(np.arange(meters, dtype=np.int64), readings_per_meter)
+    timestamps = np.tile(
+        YEAR_START + np.arange(readings_per_meter, dtype=np.int64) * SLOT_SECONDS,
+        meters,
+    )
+    # Up to 2 kWh a half hour
+    readings = rng.integers(0, 2 * SCALING_FACTOR, len(meter_ids), dtype=np.int64)
+    return meter_ids, timestamps, readings
+
+
+def python_loop(rates, meter_ids, timestamps, readings, meter_count):
+    bills = [0] * meter_count
+    for meter_id, timestamp, reading in zip(
+        meter_ids.tolist(), timestamps.tolist(), readings.tolist()
+    ):
+        rate = rates[timestamp % 86400 // SLOT_SECONDS]
+        bills[meter_id] += reading * rate // SCALING_FACTOR
+    return bills
+
+
+def run_compute(meters, readings_per_meter):
+    rng = np.random.default_rng(1)
+    tariffs = {"time-of-use": TimeOfUseTariff(ECONOMY_7), "tiered": TieredTariff(TIERS)}
+    seconds = dict.fromkeys(tariffs, 0)
+    loop_result = None
+    for first in range(0, meters, METERS_PER_CHUNK):
+        group = min(METERS_PER_CHUNK, meters - first)
+        arrays = synthetic_chunk(rng, group, readings_per_meter)
+        for name, tariff in tariffs.items():
+            started = time.perf_counter()
+            bills = compute_bills(*arrays, tariff, group)
+            seconds[name] += time.perf_counter() - started
+        if loop_result is None:
+            # Same time of use bills one reading at a time, on part of the first chunk
+            count = min(LOOP_READINGS, len(arrays[0]))
+            loop_meters = int(arrays[0][count - 1]) + 1
+            count = loop_meters * readings_per_meter
+            started = time.perf_counter()
+            expected = python_loop(
+                tariffs["time-of-use"].rates.tolist(),
+                *(array[:count] for array in arrays),
+                loop_meters,
+            )
+            loop_seconds = time.perf_counter() - started
+            vectorized = compute_bills(
+                *(array[:count] for array in arrays), tariffs["time-of-use"], loop_meters
+            )
+            assert vectorized.tolist() == expected
+            loop_result = {
+                "method": "python loop, time-of-use",
+                "readings": count,
+                "readings_per_second": round(count / loop_seconds),
+            }
+    total = meters * readings_per_meter
+    return [loop_result] + [
+        {
+            "method": f"vectorized, {name}",
+            "readings": total,
+            "seconds": round(seconds[name], 2),
+            "readings_per_second": round(total / seconds[name]),
+        }
+        for name in tariffs
+    ]
+
+
+def run_load(meters, readings_per_meter):
+    rng = np.random.default_rng(2)
+    store = ReadingStore()
+    for meter_id in range(meters):
+        _ids, timestamps, readings = synthetic_chunk(rng, 1, readings_per_meter)
+        meter = f"0x{meter_id + 1:040x}"
+        store.ingest(
+            [
+                (meter_id, index, 0, meter, None, reading, timestamp)
+                for index, (timestamp, reading) in enumerate(
+                    zip(timestamps.tolist(), readings.tolist())
+                )
+            ],
+            "MeterReadingsSubmission",
+            (meter_id, LOG_INDEX_END),
+        )
+    # Both reading events indexed through the last block, so every reading is billed
+    store.save("MeterReadingSubmission", (meters, LOG_INDEX_END))
+    engine = BillingEngine(store, TimeOfUseTariff(ECONOMY_7))
+    started = time.perf_counter()
+    engine.run()
+    elapsed = time.perf_counter() - started
+    total = meters * readings_per_meter
+    return {
+        "method": "engine from SQLite, time-of-use",
+        "readings": total,
+        "seconds": round(elapsed, 2),
+        "load_seconds": round(engine.load_seconds, 2),
+        "compute_seconds": round(engine.compute_seconds, 2),
+        "readings_per_second": round(total / elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--meters", type=int, default=10000)
+    parser.add_argument("--readings-per-meter", type=int, default=17520)
+    parser.add_argument("--load-meters", type=int, default=100)
+    args = parser.parse_args()
+
+    results = run_compute(args.meters, args.readings_per_meter)
+    results.append(run_load(args.load_meters, args.readings_per_meter))
+    print_results("billing", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# JSON-RPC cost of confirming many pending readings
+"""
+Stores a set of readings spread over several accounts and confirms them:
+    - receipt_polling: one wait_for_transaction_receipt loop per transaction,
+      each in its own thread as a per reading waiter would be
+    - block_tracker: one ConfirmationTracker following blocks for all of them
+
+Reported per method: JSON-RPC requests (a batch counts as one) and the time
+until every reading is confirmed. Ganache mines a block per transaction by
+default, start it with --blockTime 5 to see the effect of shared blocks.
+
+Usage:
+    python -m benchmarks.bench_confirmations --readings 500
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from eth_account import Account
+
+from benchmarks.common import connect, get_private_key, print_results
+from client.confirmations import ConfirmationTracker
+
+ACCOUNT_INDEXES = range(30, 40)
+
+
+def send_readings(w3, contract, count):
+    addresses = [Account.from_key(get_private_key(i)).address for i in ACCOUNT_INDEXES]
+    return [
+        contract.functions.storeMeterReading(str(uuid4()), 500).transact(
+            {"from": addresses[i % len(addresses)]}
+        )
+        for i in range(count)
+    ]
+
+
+def confirm_polling(w3, tx_hashes, first_block):
+    with ThreadPoolExecutor(max_workers=len(tx_hashes)) as executor:
+        list(executor.map(w3.eth.wait_for_transaction_receipt, tx_hashes))
+
+
+async def confirm_tracker(w3, tx_hashes, first_block):
+    tracker = ConfirmationTracker(w3)
+    # Start from the first block of the run instead of the default lookback
+    tracker.last_block = first_block - 1
+    await asyncio.gather(*(tracker.wait(tx_hash) for tx_hash in tx_hashes))
+    await tracker.stop()
+
+
+def measure(name, w3, contract, count, confirm):
+    first_block = w3.eth.block_number + 1
+    tx_hashes = send_readings(w3, contract, count)
+    w3.provider.reset()
+    started = time.perf_counter()
+    confirm(w3, tx_hashes, first_block)
+    elapsed = time.perf_counter() - started
+    return {
+        "method": name,
+        "readings": count,
+        "rpc_requests": sum(w3.provider.calls.values()),
+        "seconds": round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=500)
+    args = parser.parse_args()
+
+    w3, contract = connect()
+    results = [
+        measure("receipt_polling", w3, contract, args.readings, confirm_polling),
+        measure(
+            "block_tracker",
+            w3,
+            contract,
+            args.readings,
+            lambda *args: asyncio.run(confirm_tracker(*args)),
+        ),
+    ]
+    print_results("confirmations", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# readings per second and memory per meter for the headless meter engine
+"""
+Runs client.engine in a fresh process for each meter count so memory figures
+are not shared between runs, then collects the JSON reports.
+
+Usage:
+    python -m benchmarks.bench_engine --meters 12 500 5000 --duration 120
+
+Add --local-signing to sign readings in process with the nonce manager.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from benchmarks.common import print_results
+
+
+def run_engine(meter_count, duration, min_wait, max_wait, local_signing=False):
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "client.engine",
+            "--meters",
+            str(meter_count),
+            "--duration",
+            str(duration),
+            "--min-wait",
+            str(min_wait),
+            "--max-wait",
+            str(max_wait),
+        ]
+        + (["--local-signing"] if local_signing else []),
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(output.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--meters", type=int, nargs="+", default=[12, 500, 5000])
+    parser.add_argument("--duration", type=float, default=120)
+    parser.add_argument("--min-wait", type=float, default=15)
+    parser.add_argument("--max-wait", type=float, default=60)
+    parser.add_argument("--local-signing", action="store_true")
+    args = parser.parse_args()
+
+    results = [
+        run_engine(
+            meter_count,
+            args.duration,
+            args.min_wait,
+            args.max_wait,
+            args.local_signing,
+        )
+        for meter_count in args.meters
+    ]
+    print_results("meter_engine", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# end to end load test of the real client classes on an in-process EVM
+"""
+Deploys the contract to a py-evm chain inside this process (benchmarks/evm.py)
+and drives the client's own BlockchainStoreReading and BlockchainGetBill
+against it, so no Docker, Ganache or Truffle is needed.
+
+For each batch size a fresh chain is deployed and --readings readings are
+stored round robin over --meters meter accounts, batch size 1 with
+storeMeterReading and larger sizes with storeMeterReadings. The first
+--watchers meters run watch_bill_updates on their own connection while the
+readings go in, as a meter's bill monitor would.
+
+Reported per batch size:
+    - readings per second, end to end with the bill watchers running
+    - bill update latency p50/p95/p99, from sending a reading to the
+      meter's MeterBillUpdated handler running
+    - JSON-RPC requests per reading made by the store client, per method
+    - JSON-RPC requests per second made by each bill watcher
+    - gas per reading in windows of the per meter history size, and how
+      much the last window grew over the first
+
+Results are printed as JSON, --output also appends them with the commit and
+parameters as one line of a JSON lines file, so runs can be compared later.
+
+Usage:
+    python -m benchmarks.bench_evm --meters 10 --readings 2000 --batch-sizes 1 10 100
+    python -m benchmarks.bench_evm --output benchmark-history.jsonl
+"""
+import argparse
+import asyncio
+import time
+from uuid import uuid4
+
+from benchmarks.common import print_results, save_results, summarise_latencies
+from benchmarks.evm import InProcessChain
+from client import blockchain_client
+from client.blockchain_client import (
+    BlockchainGetBill,
+    BlockchainStoreReading,
+    GenerateReadings,
+)
+from client.renderers import MeterDisplay
+
+BILL_POLL_INTERVAL = 0.05  # Seconds between bill filter checks, the client uses 0.5
+GAS_WINDOWS = 5  # History windows gas per reading is reported for
+DRAIN_TIMEOUT = 5  # Seconds to wait for the watchers to see the last updates
+
+
+class TimedBill(BlockchainGetBill):
+    """Records when each MeterBillUpdated event reached the meter"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.update_times = []
+
+    def handle_bill_update(self, event):
+        self.update_times.append(time.perf_counter())
+        super().handle_bill_update(event)
+
+
+def gas_windows(gas):
+    # gas is (meter history before the transaction, gas per reading)
+    longest = max(history for history, _gas in gas) + 1
+    windows = []
+    for index in range(GAS_WINDOWS):
+        low = longest * index // GAS_WINDOWS
+        high = longest * (index + 1) // GAS_WINDOWS
+        values = [value for history, value in gas if low <= history < high]
+        if values:
+            windows.append(
+                {
+                    "history_from": low,
+                    "history_to": high,
+                    "gas_per_reading": round(sum(values) / len(values)),
+                }
+            )
+    return windows
+
+
+async def load_test(chain, meters, readings, batch_size, watchers):
+    writer_w3, writer_contract = chain.connect()
+    # Receipts for the gas figures are not requests the client would make
+    receipt_w3, _receipt_contract = chain.connect()
+    stores = [
+        BlockchainStoreReading(chain.get_private_key(index), writer_w3, writer_contract)
+        for index in range(1, meters + 1)
+    ]
+    watched = []
+    for index in range(1, min(watchers, meters) + 1):
+        w3, contract = chain.connect()
+        watched.append(
+            TimedBill(chain.get_private_key(index), w3, contract, MeterDisplay())
+        )
+    tasks = [asyncio.create_task(bill.watch_bill_updates()) for bill in watched]
+    # Lets every watcher create its filter and read the initial bill
+    await asyncio.sleep(BILL_POLL_INTERVAL * 2)
+    for bill in watched:
+        bill.w3.provider.reset()
+
+    sent_times = [[] for _ in watched]
+    history = [0] * meters
+    gas = []
+    sent = 0
+    transactions = 0
+    started = time.perf_counter()
+    while sent < readings:
+        meter = transactions % meters
+        size = min(batch_size, readings - sent)
+        batch = [
+            (str(uuid4()), GenerateReadings.generate_reading() or 0.001)
+            for _ in range(size)
+        ]
+        if meter < len(watched):
+            sent_times[meter].append(time.perf_counter())
+        tx = await stores[meter].store_readings(batch)
+        gas_used = receipt_w3.eth.get_transaction_receipt(tx).gasUsed
+        gas.append((history[meter], gas_used / size))
+        history[meter] += size
+        sent += size
+        transactions += 1
+        # Lets the bill watchers run between transactions
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+
+    deadline = time.perf_counter() + DRAIN_TIMEOUT
+    while time.perf_counter() < deadline and any(
+        len(bill.update_times) < len(times) for bill, times in zip(watched, sent_times)
+    ):
+        await asyncio.sleep(BILL_POLL_INTERVAL)
+    watched_seconds = time.perf_counter() - started
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Each transaction emits one MeterBillUpdated, so updates pair up with sends in order
+    latencies = [
+        update - send
+        for bill, times in zip(watched, sent_times)
+        for send, update in zip(times, bill.update_times)
+    ]
+    missed = sum(
+        max(0, len(times) - len(bill.update_times))
+        for bill, times in zip(watched, sent_times)
+    )
+    writer_calls = writer_w3.provider.calls
+    watcher_calls = sum(sum(bill.w3.provider.calls.values()) for bill in watched)
+    windows = gas_windows(gas)
+    return {
+        "batch_size": batch_size,
+        "meters": meters,
+        "readings": sent,
+        "transactions": transactions,
+        "readings_per_second": round(sent / elapsed, 1),
+        "bill_update_latency": summarise_latencies(latencies),
+        "bill_updates_missed": missed,
+        "rpc_per_reading": round(sum(writer_calls.values()) / sent, 3),
+        "rpc_per_reading_by_method": {
+            method: round(count / sent, 3) for method, count in sorted(writer_calls.items())
+        },
+        "watcher_rpc_per_second": (
+            round(watcher_calls / len(watched) / watched_seconds, 1) if watched else 0
+        ),
+        "gas_per_reading": round(sum(value for _history, value in gas) / len(gas)),
+        "gas_by_history": windows,
+        "gas_growth": round(
+            windows[-1]["gas_per_reading"] / windows[0]["gas_per_reading"] - 1, 4
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--meters", type=int, default=10)
+    parser.add_argument("--readings", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--watchers", type=int, default=3)
+    parser.add_argument("--output", default=None, help="JSON lines file to append the run to")
+    args = parser.parse_args()
+
+    blockchain_client.BILL_EVENT_POLL_INTERVAL = BILL_POLL_INTERVAL
+    results = []
+    for batch_size in args.batch_sizes:
+        # The first account deploys the contract, the meters are the ones after it
+        chain = InProcessChain(accounts=args.meters + 1)
+        results.append(
+            asyncio.run(
+                load_test(chain, args.meters, args.readings, batch_size, args.watchers)
+            )
+        )
+    print_results("evm", results)
+    if args.output:
+        save_results(args.output, "evm", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
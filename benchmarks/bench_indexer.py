@@ -0,0 +1,178 @@
+# ingest rate and query latency of the server's reading indexer
+"""
+store: feeds --readings synthetic reading events to ReadingIndexer in
+chunks the size of one eth_getLogs response, so only the decoding and
+SQLite side is measured and no Ganache is needed. Then times the queries
+the indexer is for at that size.
+
+chain: stores --readings readings on Ganache with storeMeterReadings in
+batches of --batch-size spread over the meter accounts, then indexes the
+chain from block 0 with server.indexer and reports the end to end rate.
+
+Usage:
+    python -m benchmarks.bench_indexer store --readings 1000000
+    python -m benchmarks.bench_indexer chain --readings 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from itertools import islice
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+from benchmarks.common import print_results
+from server.indexer import ReadingIndexer, ReadingStore, run_indexer
+
+LOGS_PER_CHUNK = 1000  # Synthetic logs handed to the indexer per chunk
+METERS = 50
+BLOCK_TIME = 12  # Seconds between synthetic blocks
+
+
+class SyntheticChain:
+    """Answers the indexer's block timestamp batches without a node"""
+
+    def __init__(self):
+        self.provider = MagicMock(is_async=False)
+        self.eth = self
+
+    @staticmethod
+    def get_block(number):
+        return {
+            "number": number,
+            "timestamp": 1700000000 + number * BLOCK_TIME,
+            "hash": number.to_bytes(32, "big"),
+        }
+
+    def batch_requests(self):
+        return SyntheticBatch()
+
+
+class SyntheticBatch:
+    def __enter__(self):
+        self.results = []
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def add(self, result):
+        self.results.append(result)
+
+    def execute(self):
+        return self.results
+
+
+def synthetic_logs(count, batch_size):
+    meters = [f"0x{index:040x}" for index in range(1, METERS + 1)]
+    block_number = 0
+    made = 0
+    while made < count:
+        block_number += 1
+        size = min(batch_size, count - made)
+        readings = [random.randint(1, 1000) for _ in range(size)]
+        if size == 1:
+            args = {
+                "addr": random.choice(meters),
+                "mtr": {"uid": str(uuid4()), "mtr_reading": readings[0]},
+            }
+        else:
+            args = {
+                "addr": random.choice(meters),
+                "firstIndex": 0,
+                "mtr_readings": readings,
+            }
+        yield {"blockNumber": block_number, "logIndex": 0, "args": args}
+        made += size
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def run_store(readings, batch_size, path):
+    store = ReadingStore(path)
+    indexer = ReadingIndexer(SyntheticChain(), MagicMock(), "MeterReadingsSubmission", store)
+    elapsed = 0
+    logs = synthetic_logs(readings, batch_size)
+    while chunk := list(islice(logs, LOGS_PER_CHUNK)):
+        # Only the indexer is timed, not making up the logs
+        started = time.perf_counter()
+        asyncio.run(indexer.handle_logs(chunk))
+        elapsed += time.perf_counter() - started
+    return {
+        "method": "store",
+        "readings": indexer.readings_indexed,
+        "events": indexer.logs_handled,
+        "events_per_second": round(indexer.logs_handled / elapsed),
+        "readings_per_second": round(indexer.readings_indexed / elapsed),
+        "top_10_ms": timed(store.meter_totals, 10),
+        "bills_ms": timed(store.bills),
+        "usage_per_hour_ms": timed(store.usage_by_bucket, 3600),
+        "usage_per_hour_one_meter_ms": timed(
+            store.usage_by_bucket, 3600, f"0x{1:040x}"
+        ),
+    }
+
+
+def store_chain_readings(readings, batch_size):
+    from benchmarks.common import connect, get_private_key
+    from eth_account import Account
+
+    w3, contract = connect()
+    addresses = [Account.from_key(get_private_key(i)).address for i in range(1, METERS)]
+    sent = 0
+    while sent < readings:
+        size = min(batch_size, readings - sent)
+        tx = contract.functions.storeMeterReadings(
+            [str(uuid4()) for _ in range(size)],
+            [random.randint(1, 1000) for _ in range(size)],
+        ).transact({"from": addresses[(sent // batch_size) % len(addresses)]})
+        sent += size
+    w3.eth.wait_for_transaction_receipt(tx)
+
+
+def run_chain(readings, batch_size, path):
+    from client.parameters import BLOCKCHAIN_URL, CONTRACT_ABI, CONTRACT_ADDRESS
+
+    store_chain_readings(readings, batch_size)
+    store = ReadingStore(path)
+    started = time.perf_counter()
+    asyncio.run(
+        run_indexer(store, BLOCKCHAIN_URL, CONTRACT_ADDRESS, CONTRACT_ABI, follow=False)
+    )
+    elapsed = time.perf_counter() - started
+    indexed = store.reading_count()
+    return {
+        "method": "chain",
+        "readings": indexed,
+        "readings_per_second": round(indexed / elapsed),
+        "seconds": round(elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("mode", choices=("store", "chain"))
+    parser.add_argument("--readings", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index.sqlite")
+        if args.mode == "store":
+            results = [
+                run_store(args.readings, 1, path),
+                run_store(args.readings, args.batch_size, path + "-batched"),
+            ]
+        else:
+            results = [run_chain(args.readings, args.batch_size, path)]
+    print_results("indexer", results)
+
+
+if __name__ == "__main__":
+    main()
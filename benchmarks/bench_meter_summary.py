@@ -0,0 +1,96 @@
+# compares reading the full history against the getMeterSummary view
+"""
+Each history size uses its own account, which is topped up with readings until
+it holds at least that many. The accounts are then read both ways:
+    - history: getMeterReadings and summing the readings in Python
+    - summary: getMeterSummary
+
+Reported per size and method: call latency and JSON-RPC response size.
+
+Usage:
+    python -m benchmarks.bench_meter_summary --sizes 10 1000 10000 --repeat 20
+"""
+import argparse
+import asyncio
+import time
+
+from eth_account import Account
+
+from benchmarks.common import (
+    connect,
+    get_private_key,
+    print_results,
+    summarise_latencies,
+)
+from client.blockchain_client import (
+    BlockchainStoreReading,
+    GenerateReadings,
+    READING_SCALING_FACTOR,
+)
+
+
+def seed_account(private_key, w3, contract, size):
+    address = Account.from_key(private_key).address
+    reading_count = contract.functions.getMeterSummary().call({"from": address})[2]
+    store_readings_obj = BlockchainStoreReading(private_key, w3, contract)
+    for _ in range(size - reading_count):
+        reading = GenerateReadings.generate_reading() or 0.001
+        asyncio.run(store_readings_obj.store_reading(reading))
+    return address
+
+
+def read_history(contract, address):
+    meter_readings = contract.functions.getMeterReadings().call({"from": address})
+    return sum(reading[1] for reading in meter_readings) / READING_SCALING_FACTOR
+
+
+def read_summary(contract, address):
+    return contract.functions.getMeterSummary().call({"from": address})[1] / (
+        READING_SCALING_FACTOR
+    )
+
+
+def measure(w3, read, contract, address, repeat):
+    w3.provider.reset()
+    latencies = []
+    errors = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        try:
+            read(contract, address)
+        except Exception as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+    calls = w3.provider.calls["eth_call"] or 1
+    return {
+        "latency": summarise_latencies(latencies),
+        "response_bytes_per_call": w3.provider.response_bytes["eth_call"] // calls,
+        "errors": errors[:1] + ([f"+{len(errors) - 1} more"] if len(errors) > 1 else []),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--first-account", type=int, default=20)
+    args = parser.parse_args()
+
+    w3, contract = connect()
+    results = []
+    for offset, size in enumerate(args.sizes):
+        private_key = get_private_key(args.first_account + offset)
+        address = seed_account(private_key, w3, contract, size)
+        results.append(
+            {
+                "readings": size,
+                "history": measure(w3, read_history, contract, address, args.repeat),
+                "summary": measure(w3, read_summary, contract, address, args.repeat),
+            }
+        )
+    print_results("meter_summary", results)
+
+
+if __name__ == "__main__":
+    main()
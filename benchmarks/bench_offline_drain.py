@@ -0,0 +1,93 @@
+# drain rate of the offline reading queue after a simulated outage
+"""
+Fills the offline queue of every meter with the readings it would have taken
+during an outage (one reading every 37.5 s on average, the middle of the
+15-60 s range), then replays all queues concurrently on one event loop, as
+happens when the connection monitor sees the node come back.
+
+Reported: readings queued, time to fill the queues, drain time and drain rate.
+
+Usage:
+    python -m benchmarks.bench_offline_drain --meters 500 --outage 3600
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from uuid import uuid4
+
+from benchmarks.common import print_results
+from client.blockchain_client import GenerateReadings
+from client.engine import MeterEngine
+from client.offline_queue import ReadingQueue
+from client.parameters import CONTRACT_ABI, CONTRACT_ADDRESS
+from client.renderers import MeterDisplay
+from client.transport import close_async_web3, get_async_web3
+
+MEAN_READING_INTERVAL = 37.5
+
+
+async def run(meters, outage, queue_dir, fsync, local_signing):
+    w3 = await get_async_web3()
+    contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+    readings_per_meter = int(outage / MEAN_READING_INTERVAL)
+
+    readings_objs = []
+    started = time.perf_counter()
+    for meter_index in range(meters):
+        reading_queue = ReadingQueue(
+            os.path.join(queue_dir, f"meter-{meter_index}.sqlite"), fsync=fsync
+        )
+        for _ in range(readings_per_meter):
+            reading_queue.append(
+                str(uuid4()), GenerateReadings.generate_reading() or 0.001
+            )
+        readings_objs.append(
+            GenerateReadings(
+                MeterEngine.get_private_key(meter_index),
+                w3,
+                contract,
+                MeterDisplay(),
+                local_signing=local_signing,
+                reading_queue=reading_queue,
+            )
+        )
+    fill_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    drained = await asyncio.gather(*(obj.drain_backlog() for obj in readings_objs))
+    drain_seconds = time.perf_counter() - started
+    await close_async_web3(w3)
+
+    return {
+        "meters": meters,
+        "outage_s": outage,
+        "fsync": fsync,
+        "local_signing": local_signing,
+        "readings_queued": readings_per_meter * meters,
+        "fill_seconds": round(fill_seconds, 2),
+        "readings_drained": sum(drained),
+        "readings_left": sum(len(obj.reading_queue) for obj in readings_objs),
+        "drain_seconds": round(drain_seconds, 2),
+        "drain_readings_per_second": round(sum(drained) / drain_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--meters", type=int, default=500)
+    parser.add_argument("--outage", type=float, default=3600)
+    parser.add_argument("--fsync", default="normal", choices=["always", "normal", "off"])
+    parser.add_argument("--local-signing", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as queue_dir:
+        result = asyncio.run(
+            run(args.meters, args.outage, queue_dir, args.fsync, args.local_signing)
+        )
+    print_results("offline_drain", [result])
+
+
+if __name__ == "__main__":
+    main()
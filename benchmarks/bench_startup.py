@@ -0,0 +1,128 @@
+# cold start of the meter processes, measured with python -X importtime
+"""
+Starts --meters Python processes at once, as run-clients.sh does, and each
+runs what a meter does before its window can show: import
+client.blockchain_client, client.runtime and client.renderers and read its
+private key and the contract ABI. No display or Ganache is needed.
+
+before: the imports, then web3 and eth_account and the Truffle artifact and
+ganache accounts file parsed whole, as importing the client used to
+after: the imports and the runtime config only, web3 is imported later on the
+runtime's own thread
+
+Reported per method, over all the processes:
+    - ready_ms, from starting the process until the meter could show its window
+    - import_ms, the summed top level -X importtime of the process
+    - config_ms, reading the private key and the ABI
+    - slowest_imports, the top level modules with the most cumulative time
+
+Write the runtime config first with python -m client.parameters, otherwise
+after falls back to reading the full files too.
+
+Usage:
+    python -m benchmarks.bench_startup --meters 12
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from benchmarks.common import print_results, summarise_latencies
+from client.parameters import PARENT_DIR
+
+SLOWEST_IMPORTS = 5  # Top level modules listed per method
+
+METER_SCRIPT = """
+import json, time
+started = time.time()
+import client.blockchain_client
+import client.renderers
+import client.runtime
+from client import parameters
+{before}
+imported = time.time()
+parameters.get_private_key({meter})
+parameters.get_contract_abi()
+{before_config}
+ready = time.time()
+print(json.dumps({{"imported": imported, "started": started, "ready": ready}}))
+"""
+BEFORE_IMPORTS = "import web3, eth_account"
+BEFORE_CONFIG = (
+    "parameters.load_json_file(parameters.CONTRACT_COMPILE_FILE_PATH); "
+    "parameters.load_json_file(parameters.GANACHE_ACCOUNTS_FILE_PATH)"
+)
+
+
+def parse_importtime(stderr):
+    # Lines are "import time: self | cumulative | name", nested imports are indented
+    top_level = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self, cumulative, name = line[len("import time:") :].split("|")
+        if not name.startswith("  "):
+            top_level[name.strip()] += int(cumulative)
+    return top_level
+
+
+def start_meters(meters, before):
+    processes = []
+    for meter in range(1, meters + 1):
+        script = METER_SCRIPT.format(
+            meter=meter,
+            before=BEFORE_IMPORTS if before else "",
+            before_config=BEFORE_CONFIG if before else "",
+        )
+        spawned = time.time()
+        process = subprocess.Popen(
+            [sys.executable, "-X", "importtime", "-c", script],
+            cwd=PARENT_DIR,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        processes.append((spawned, process))
+
+    ready, imports, config = [], [], []
+    top_level = Counter()
+    for spawned, process in processes:
+        stdout, stderr = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(stderr.strip().splitlines()[-1])
+        times = json.loads(stdout)
+        modules = parse_importtime(stderr)
+        ready.append(times["ready"] - spawned)
+        imports.append(sum(modules.values()) / 1e6)
+        config.append(times["ready"] - times["imported"])
+        top_level.update(modules)
+    return {
+        "method": "before" if before else "after",
+        "meters": meters,
+        "all_ready_ms": round(max(ready) * 1000, 1),
+        "ready_ms": summarise_latencies(ready),
+        "import_ms": summarise_latencies(imports),
+        "config_ms": summarise_latencies(config),
+        "slowest_imports": {
+            name: round(cumulative / meters / 1000, 1)
+            for name, cumulative in top_level.most_common(SLOWEST_IMPORTS)
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--meters", type=int, default=12)
+    args = parser.parse_args()
+
+    results = [
+        start_meters(args.meters, before=True),
+        start_meters(args.meters, before=False),
+    ]
+    print_results("startup", results)
+
+
+if __name__ == "__main__":
+    main()
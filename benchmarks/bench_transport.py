@@ -0,0 +1,156 @@
+# connection churn and RPC latency before and after the shared transport
+"""
+Simulates the RPC traffic of several meters, each with the four subsystems
+that share its provider (alerts, readings, bill and connection monitor).
+
+    sync modes, one thread per subsystem:
+        - per_provider: a fresh Web3(HTTPProvider) per meter, as get_contract used to build
+        - shared_pool: client.transport.get_web3 for every meter
+    async modes, one coroutine per subsystem:
+        - default_async: web3's default AsyncHTTPProvider session
+        - shared_async: client.transport.get_async_web3
+
+Reported per mode: TCP connects per minute and getMeterSummary latency percentiles.
+
+Usage:
+    python -m benchmarks.bench_transport --meters 12 --duration 30
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+import urllib3.util.connection
+from eth_account import Account
+from web3 import AsyncWeb3, Web3
+
+from benchmarks.common import get_private_key, print_results, summarise_latencies
+from client.parameters import BLOCKCHAIN_URL, CONTRACT_ABI, CONTRACT_ADDRESS
+from client.transport import close_async_web3, get_async_web3, get_web3
+
+SUBSYSTEMS_PER_METER = 4
+CALL_INTERVAL = 0.1
+
+
+class ConnectCounter:
+    """Counts new TCP connections made by urllib3 and by the asyncio loop"""
+
+    def __init__(self):
+        self.connects = 0
+        self._lock = threading.Lock()
+        self._create_connection = urllib3.util.connection.create_connection
+
+    def __enter__(self):
+        def create_connection(*args, **kwargs):
+            with self._lock:
+                self.connects += 1
+            return self._create_connection(*args, **kwargs)
+
+        urllib3.util.connection.create_connection = create_connection
+        return self
+
+    def __exit__(self, *exc_info):
+        urllib3.util.connection.create_connection = self._create_connection
+
+    def watch_loop(self, loop):
+        create_connection = loop.create_connection
+
+        async def counting_create_connection(*args, **kwargs):
+            self.connects += 1
+            return await create_connection(*args, **kwargs)
+
+        loop.create_connection = counting_create_connection
+
+
+def result(mode, connects, latencies, elapsed):
+    return {
+        "mode": mode,
+        "tcp_connects_per_minute": round(connects / elapsed * 60, 1),
+        "rpc_latency": summarise_latencies(latencies),
+    }
+
+
+def run_sync(mode, meters, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    def worker(contract, address):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            contract.functions.getMeterSummary().call({"from": address})
+            latencies.append(time.perf_counter() - started)
+            time.sleep(CALL_INTERVAL)
+
+    threads = []
+    with ConnectCounter() as counter:
+        started = time.perf_counter()
+        for meter_index in range(meters):
+            if mode == "per_provider":
+                w3 = Web3(Web3.HTTPProvider(BLOCKCHAIN_URL, request_kwargs={"timeout": 60}))
+            else:
+                w3 = get_web3(BLOCKCHAIN_URL)
+            contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+            address = Account.from_key(get_private_key(1 + meter_index % 49)).address
+            for _ in range(SUBSYSTEMS_PER_METER):
+                threads.append(
+                    threading.Thread(target=worker, args=(contract, address), daemon=True)
+                )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    return result(mode, counter.connects, latencies, elapsed)
+
+
+async def run_async(mode, meters, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    counter = ConnectCounter()
+    counter.watch_loop(asyncio.get_running_loop())
+
+    if mode == "default_async":
+        w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(BLOCKCHAIN_URL))
+    else:
+        w3 = await get_async_web3(BLOCKCHAIN_URL)
+    contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+
+    async def worker(address):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await contract.functions.getMeterSummary().call({"from": address})
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(CALL_INTERVAL)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            worker(Account.from_key(get_private_key(1 + meter_index % 49)).address)
+            for meter_index in range(meters)
+            for _ in range(SUBSYSTEMS_PER_METER)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    await close_async_web3(w3)
+    return result(mode, counter.connects, latencies, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--meters", type=int, default=12)
+    parser.add_argument("--duration", type=float, default=30)
+    args = parser.parse_args()
+
+    results = [
+        run_sync(mode, args.meters, args.duration)
+        for mode in ("per_provider", "shared_pool")
+    ]
+    results += [
+        asyncio.run(run_async(mode, args.meters, args.duration))
+        for mode in ("default_async", "shared_async")
+    ]
+    print_results("transport", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# Tk widget calls per minute, direct label updates vs MeterState and the render scheduler
+"""
+Replays one simulated minute of a meter's UI traffic against labels that
+count their configure and cget calls, so no display or Ganache is needed:
+    - the clock label ticks every second
+    - the connection check reports "connected" every 5 seconds
+    - a reading is taken every --reading-interval seconds and its bill update
+      arrives a second later
+    - one grid alert arrives
+    - in --poll-bills mode the bill monitor looks at the usage every 100 ms
+
+before: the label parsing and direct widget updates the client used to do
+after: MeterState, RenderScheduler (one render per 50 ms frame) and
+SmartMeterUI.render, which skips widgets whose value did not change
+
+Usage:
+    python -m benchmarks.bench_ui_render --reading-interval 20
+"""
+import argparse
+from collections import Counter
+
+from benchmarks.common import print_results
+from client.gui import SmartMeterUI
+from client.meter_state import MeterState, RenderScheduler
+
+STEP_MS = 50  # One UI frame, the TkDispatcher drain interval
+SIMULATED_MS = 60000
+
+
+class CountingLabel:
+    def __init__(self, calls, text=""):
+        self.calls = calls
+        self.text = text
+
+    def configure(self, **kwargs):
+        self.calls["configure"] += 1
+        self.text = kwargs.get("text", self.text)
+
+    def cget(self, _option):
+        self.calls["cget"] += 1
+        return self.text
+
+
+class CountingApp:
+    """Has the labels of SmartMeterUI and runs its real widget methods"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.connection_status_label = CountingLabel(self.calls)
+        self.time_label = CountingLabel(self.calls)
+        self.price_label = CountingLabel(self.calls, "£x.xx")
+        self.usage_label = CountingLabel(self.calls, "Used so far: xx.xx kWh")
+        self.notice_label = CountingLabel(self.calls, "No current notices")
+        self.rendered = {
+            "price": "£x.xx",
+            "usage": "Used so far: xx.xx kWh",
+            "connection_status": None,
+            "alert": "",
+            "time": None,
+        }
+
+    def update_connection_status(self, status):
+        SmartMeterUI.update_connection_status(self, status)
+
+    def update_notice_message(self, message):
+        SmartMeterUI.update_notice_message(self, message)
+
+    def render(self, view):
+        SmartMeterUI.render(self, view)
+
+
+def events(now_ms, reading_interval_ms):
+    if now_ms % 1000 == 0:
+        yield "tick"
+    if now_ms % 5000 == 0:
+        yield "connection"
+    if now_ms % reading_interval_ms == 0:
+        yield "reading"
+    if now_ms % reading_interval_ms == 1000:
+        yield "bill"
+    if now_ms == 30000:
+        yield "alert"
+
+
+def run_before(reading_interval_ms, poll_bills):
+    app = CountingApp()
+    usage = 0.0
+    bill = 0.0
+    for now_ms in range(0, SIMULATED_MS, STEP_MS):
+        for event in events(now_ms, reading_interval_ms):
+            if event == "tick":
+                app.time_label.configure(text="11:11")
+            elif event == "connection":
+                app.update_connection_status("connected")
+            elif event == "reading":
+                # reading_generator read both labels back and parsed the usage
+                price = app.price_label.cget("text")
+                app.usage_label.cget("text")
+                usage += 0.5
+                app.price_label.configure(text=price)
+                app.usage_label.configure(text=f"Used so far: {usage:.2f} kWh")
+            elif event == "bill":
+                bill += 0.11
+                app.price_label.configure(text=f"£{bill:.2f}")
+                app.usage_label.configure(text=f"Used so far: {usage:.2f} kWh")
+            elif event == "alert":
+                app.update_notice_message("Grid overload")
+        if poll_bills and now_ms % 100 == 0:
+            app.usage_label.cget("text")
+    return app.calls
+
+
+def run_after(reading_interval_ms, poll_bills):
+    app = CountingApp()
+    state = MeterState()
+    scheduled = []
+    scheduler = RenderScheduler(state, app.render, scheduled.append)
+    state.set_bill(0.0, 0.0)
+    billed_usage = 0.0
+    bill = 0.0
+    for now_ms in range(0, SIMULATED_MS, STEP_MS):
+        for event in events(now_ms, reading_interval_ms):
+            if event == "tick":
+                # update_time only configures once the minute changes
+                if app.rendered["time"] != "11:11":
+                    app.time_label.configure(text="11:11")
+                    app.rendered["time"] = "11:11"
+            elif event == "connection":
+                state.update(connection_status="connected")
+            elif event == "reading":
+                state.record_reading(0.5)
+            elif event == "bill":
+                billed_usage += 0.5
+                bill += 0.11
+                state.set_bill(bill, billed_usage)
+            elif event == "alert":
+                state.update(alert="Grid overload")
+        # poll_bill now reads state.usage, which never touches Tk
+        while scheduled:
+            scheduled.pop()()
+    return app.calls, scheduler.renders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reading-interval", type=float, default=20)
+    parser.add_argument("--poll-bills", action="store_true")
+    args = parser.parse_args()
+
+    reading_interval_ms = int(args.reading_interval * 1000)
+    before = run_before(reading_interval_ms, args.poll_bills)
+    after, renders = run_after(reading_interval_ms, args.poll_bills)
+    results = [
+        {
+            "method": "before",
+            "configure_per_minute": before["configure"],
+            "cget_per_minute": before["cget"],
+        },
+        {
+            "method": "after",
+            "configure_per_minute": after["configure"],
+            "cget_per_minute": after["cget"],
+            "renders_per_minute": renders,
+        },
+    ]
+    print_results("ui_render", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# shared helpers for the benchmark scripts in this folder
+"""
+The benchmarks run against the Ganache node started by run-docker.sh with the
+contract deployed by run-server.sh.
+
+Run a benchmark from the repository root, for example:
+    python -m benchmarks.bench_bill_updates --duration 60
+"""
+import asyncio
+import json
+import platform
+import subprocess
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+from web3 import Web3
+
+from client.parameters import (
+    ACCOUNTS_DATA,
+    BLOCKCHAIN_URL,
+    CONTRACT_ABI,
+    CONTRACT_ADDRESS,
+)
+# Same latency summary the meters report, the benchmarks import it from here
+from client.scheduler import summarise_latencies  # noqa: F401
+
+
+class CountingHTTPProvider(Web3.HTTPProvider):
+    """HTTP provider that counts the JSON-RPC requests and bytes it sends, per method"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = Counter()
+        self.request_bytes = Counter()
+        self.response_bytes = Counter()
+
+    def make_request(self, method, params):
+        self.calls[method] += 1
+        return super().make_request(method, params)
+
+    def make_batch_request(self, batch_requests):
+        self.calls["batch"] += 1
+        return super().make_batch_request(batch_requests)
+
+    def _make_request(self, method, request_data):
+        raw_response = super()._make_request(method, request_data)
+        self.request_bytes[method] += len(request_data)
+        self.response_bytes[method] += len(raw_response or b"")
+        return raw_response
+
+    def reset(self):
+        self.calls.clear()
+        self.request_bytes.clear()
+        self.response_bytes.clear()
+
+
+def connect():
+    provider = CountingHTTPProvider(BLOCKCHAIN_URL, request_kwargs={"timeout": 60})
+    w3 = Web3(provider)
+    contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+    return w3, contract
+
+
+def get_private_key(index):
+    return list(ACCOUNTS_DATA["private_keys"].values())[index]
+
+
+class BackgroundLoop:
+    """Runs a coroutine on its own event loop thread so it can be cancelled"""
+
+    def __init__(self, coro):
+        self.loop = asyncio.new_event_loop()
+        self.task = self.loop.create_task(coro)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join()
+        self.loop.close()
+
+
+def print_results(name, results):
+    print(json.dumps({"benchmark": name, "results": results}, indent=2))
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def save_results(path, name, results, parameters=None):
+    # Appends the run as one JSON line so runs can be compared over time
+    record = {
+        "benchmark": name,
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "parameters": parameters or {},
+        "results": results,
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
@@ -0,0 +1,114 @@
+# in-process EVM for benchmarks that do not need Ganache
+"""
+Deploys ElectricityMeterReading to an eth-tester chain backed by py-evm in
+the benchmark's own process, so the real client classes can be load tested
+without Docker, Ganache or Truffle migrations.
+
+The contract comes from the Truffle artifact (blockchain/build/contracts).
+When the artifact has no bytecode yet the contract source is compiled with
+py-solc-x, which needs a solc install (python -m solcx.install 0.8.24).
+
+Every block is mined as soon as a transaction is sent, and every JSON-RPC
+request made through InProcessChain.connect goes through its own
+InProcessProvider, which counts them per method like CountingHTTPProvider
+does for Ganache.
+"""
+import json
+import os
+from collections import Counter
+
+from eth_tester import EthereumTester, PyEVMBackend
+from web3 import EthereumTesterProvider, Web3
+
+from client.parameters import (
+    BLOCKCHAIN_BASE_DIR,
+    CONTRACT_COMPILE_FILE_PATH,
+    PARENT_DIR,
+)
+
+CONTRACT_NAME = "ElectricityMeterReading"
+CONTRACT_SOURCE_PATH = os.path.join(
+    PARENT_DIR, BLOCKCHAIN_BASE_DIR, "contracts", "electricity_meter_contract.sol"
+)
+SOLC_VERSION = "0.8.24"  # Compiler used when the artifact has no bytecode
+BLOCK_GAS_LIMIT = 30000000  # Same as the Ganache docker-compose.yml
+DEFAULT_ACCOUNTS = 10
+
+
+class InProcessProvider(EthereumTesterProvider):
+    """eth-tester provider that counts the JSON-RPC requests made, per method"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = Counter()
+
+    def make_request(self, method, params):
+        self.calls[method] += 1
+        return super().make_request(method, params)
+
+    def reset(self):
+        self.calls.clear()
+
+
+def load_artifact(path=CONTRACT_COMPILE_FILE_PATH):
+    # (abi, bytecode) from the Truffle build, compiled here if it was never built
+    with open(path) as f:
+        artifact = json.load(f)
+    bytecode = artifact.get("bytecode", "")
+    if artifact.get("abi") and bytecode not in ("", "0x"):
+        return artifact["abi"], bytecode
+    return compile_contract()
+
+
+def compile_contract(source_path=CONTRACT_SOURCE_PATH, solc_version=SOLC_VERSION):
+    try:
+        import solcx
+    except ImportError as e:
+        raise RuntimeError(
+            "The contract artifact has no bytecode, run truffle compile in "
+            "blockchain/ or pip install py-solc-x"
+        ) from e
+    compiled = solcx.compile_files(
+        [source_path],
+        output_values=["abi", "bin"],
+        solc_version=solc_version,
+        optimize=True,
+    )
+    for name, output in compiled.items():
+        if name.endswith(f":{CONTRACT_NAME}"):
+            return output["abi"], output["bin"]
+    raise RuntimeError(f"{CONTRACT_NAME} not found in {source_path}")
+
+
+class InProcessChain:
+    """A funded py-evm chain with the meter contract deployed by the first account"""
+
+    def __init__(self, accounts=DEFAULT_ACCOUNTS, abi=None, bytecode=None):
+        backend = PyEVMBackend(
+            genesis_parameters=PyEVMBackend.generate_genesis_params(
+                overrides={"gas_limit": BLOCK_GAS_LIMIT}
+            ),
+            genesis_state=PyEVMBackend.generate_genesis_state(num_accounts=accounts),
+        )
+        self.private_keys = [key.to_hex() for key in backend.account_keys]
+        self.tester = EthereumTester(backend)
+        self.w3 = Web3(InProcessProvider(self.tester))
+        self.owner = self.w3.eth.accounts[0]
+        if abi is None:
+            abi, bytecode = load_artifact()
+        self.contract = self.deploy(abi, bytecode)
+
+    def connect(self):
+        # Another web3 on the same chain with its own request counts
+        w3 = Web3(InProcessProvider(self.tester))
+        return w3, w3.eth.contract(address=self.contract.address, abi=self.contract.abi)
+
+    def deploy(self, abi, bytecode):
+        tx = self.w3.eth.contract(abi=abi, bytecode=bytecode).constructor().transact(
+            {"from": self.owner}
+        )
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx)
+        return self.w3.eth.contract(address=receipt.contractAddress, abi=abi)
+
+    def get_private_key(self, index):
+        return self.private_keys[index]
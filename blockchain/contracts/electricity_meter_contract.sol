@@ -18,12 +18,23 @@ contract ElectricityMeterReading {
 
     event MeterReadingSubmission(address addr, MeterReading mtr);
     event GridAlert(string message);
+    event MeterBillUpdated(address indexed addr, uint256 bill, uint256 totalUsage);
+    // One event per batch, the readings are at positions firstIndex onwards in the meter's history
+    event MeterReadingsSubmission(address indexed addr, uint256 firstIndex, uint256[] mtr_readings);
 
     mapping(address => MeterReading[]) private _meterReadings;
     mapping(address => uint256) private _bills;
+    mapping(address => uint256) private _totalUsage;
+    // keccak256(uid) => position of the reading in _meterReadings plus one, zero when not stored
+    mapping(address => mapping(bytes32 => uint256)) private _readingIndex;
 
     uint256 private cost_per_kwh = 22; // Representing 0.001 as 1 after scaling by 1000
     uint256 private constant SCALING_FACTOR = 1000; // Scaling factor to handle 3 decimal places
+    uint256 private constant MAX_UNBILLED_READINGS = 100; // Readings setMeterBills adds back per meter at most
+
+    constructor() {
+        owner = msg.sender;
+    }
 
     function getMeterReadings() public view returns (MeterReading[] memory) {
         uint length = _meterReadings[msg.sender].length;
@@ -35,38 +46,107 @@ contract ElectricityMeterReading {
         return readings;
     }
 
-    function getSpecificMeterReading(string memory uidValue) public view returns (MeterReading memory) {
-        uint length = _meterReadings[msg.sender].length;
-
-        for (uint i = 0; i < length; i++) {
-            if (keccak256(abi.encodePacked(_meterReadings[msg.sender][i].uid)) == keccak256(abi.encodePacked(uidValue))) {
-                return _meterReadings[msg.sender][i];
-            }
+    // Bounded slice of the caller's history so large accounts can be read page by page
+    function getMeterReadingsPage(uint256 offset, uint256 limit) public view returns (MeterReading[] memory) {
+        uint256 length = _meterReadings[msg.sender].length;
+        if (offset >= length) {
+            return new MeterReading[](0);
+        }
+        uint256 end = limit > length - offset ? length : offset + limit;
+        MeterReading[] memory readings = new MeterReading[](end - offset);
+        for (uint256 i = offset; i < end; i++) {
+            readings[i - offset] = _meterReadings[msg.sender][i];
         }
-        revert("Meter reading not found");
+        return readings;
+    }
+
+    function getSpecificMeterReading(string memory uidValue) public view returns (MeterReading memory) {
+        uint256 position = _readingIndex[msg.sender][keccak256(abi.encodePacked(uidValue))];
+        require(position > 0, "Meter reading not found");
+        return _meterReadings[msg.sender][position - 1];
     }
 
     function getMeterBill() public view returns (uint256) {
         return _bills[msg.sender];
     }
 
-    function storeMeterReading(string memory uid, uint256 mtr_reading) public {
+    // Constant cost summary so clients do not need to pull the whole reading history
+    function getMeterSummary() public view returns (uint256 bill, uint256 totalUsage, uint256 readingCount, string memory lastUid) {
+        readingCount = _meterReadings[msg.sender].length;
+        if (readingCount > 0) {
+            lastUid = _meterReadings[msg.sender][readingCount - 1].uid;
+        }
+        return (_bills[msg.sender], _totalUsage[msg.sender], readingCount, lastUid);
+    }
+
+    function _addReading(string memory uid, uint256 mtr_reading) private returns (MeterReading memory) {
         // Input Validation for ensuring uid and meter reading are valid and not empty
         require(bytes(uid).length > 0, "UID can not be empty");
         require(mtr_reading > 0, "Meter reading must be greater than zero");
 
-        // Duplicate readings check
-        for (uint i = 0; i < _meterReadings[msg.sender].length; i++) {
-            require(keccak256(abi.encodePacked(_meterReadings[msg.sender][i].uid)) != keccak256(abi.encodePacked(uid)), "Duplicate reading is not allowed");
-        }
+        // Duplicate readings check, constant gas however long the history is
+        bytes32 uidHash = keccak256(abi.encodePacked(uid));
+        require(_readingIndex[msg.sender][uidHash] == 0, "Duplicate reading is not allowed");
 
         uint256 scaledReading = mtr_reading; // Scale up the meter reading to store as integer
         MeterReading memory reading = MeterReading({uid: uid, mtr_reading: scaledReading });
         _meterReadings[msg.sender].push(reading);
+        _readingIndex[msg.sender][uidHash] = _meterReadings[msg.sender].length;
+        return reading;
+    }
+
+    function storeMeterReading(string memory uid, uint256 mtr_reading) public {
+        MeterReading memory reading = _addReading(uid, mtr_reading);
         emit MeterReadingSubmission(msg.sender, reading);
 
         // Update the bill with scaled cost calculation
-        _bills[msg.sender] += (scaledReading * cost_per_kwh)/SCALING_FACTOR;
+        _bills[msg.sender] += (mtr_reading * cost_per_kwh)/SCALING_FACTOR;
+        _totalUsage[msg.sender] += mtr_reading;
+
+        // Push the new bill to the meter so clients do not have to poll for it
+        emit MeterBillUpdated(msg.sender, _bills[msg.sender], _totalUsage[msg.sender]);
+    }
+
+    // Stores many readings in one transaction, the bill and totals are written once
+    function storeMeterReadings(string[] memory uids, uint256[] memory mtr_readings) public {
+        require(uids.length == mtr_readings.length, "Every reading needs a UID");
+        require(uids.length > 0, "No readings given");
+
+        uint256 firstIndex = _meterReadings[msg.sender].length;
+        uint256 batchCost = 0;
+        uint256 batchUsage = 0;
+        for (uint256 i = 0; i < uids.length; i++) {
+            _addReading(uids[i], mtr_readings[i]);
+            // Same rounding as storeMeterReading so batching does not change the bill
+            batchCost += (mtr_readings[i] * cost_per_kwh)/SCALING_FACTOR;
+            batchUsage += mtr_readings[i];
+        }
+        emit MeterReadingsSubmission(msg.sender, firstIndex, mtr_readings);
+
+        _bills[msg.sender] += batchCost;
+        _totalUsage[msg.sender] += batchUsage;
+        emit MeterBillUpdated(msg.sender, _bills[msg.sender], _totalUsage[msg.sender]);
+    }
+
+    // Replaces the running bills with ones the server's billing engine worked out
+    // off chain (time of use or tiered tariffs), each meter hears about it through MeterBillUpdated.
+    // bills[i] covers the first readingCounts[i] readings of meters[i], readings stored since the
+    // engine's last indexed block are added back at the flat rate so none drop out of the bill.
+    // A bill more than MAX_UNBILLED_READINGS behind is refused so the loop stays bounded
+    function setMeterBills(address[] memory meters, uint256[] memory bills, uint256[] memory readingCounts) public onlyOwner {
+        require(meters.length == bills.length, "Every meter needs a bill");
+        require(meters.length == readingCounts.length, "Every bill needs a reading count");
+        for (uint256 i = 0; i < meters.length; i++) {
+            MeterReading[] storage readings = _meterReadings[meters[i]];
+            require(readingCounts[i] <= readings.length, "Bill covers readings not stored");
+            require(readings.length - readingCounts[i] <= MAX_UNBILLED_READINGS, "Bill is too far behind the readings");
+            uint256 bill = bills[i];
+            for (uint256 j = readingCounts[i]; j < readings.length; j++) {
+                bill += (readings[j].mtr_reading * cost_per_kwh)/SCALING_FACTOR;
+            }
+            _bills[meters[i]] = bill;
+            emit MeterBillUpdated(meters[i], bill, _totalUsage[meters[i]]);
+        }
     }
 
     function sendGridAlert(string memory _message) public {
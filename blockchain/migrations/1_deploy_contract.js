@@ -6,7 +6,7 @@ let Contract = artifacts.require("ElectricityMeterReading");
 const fs = require('fs')
 
 module.exports = async function (deployer) {
-  await deployer.deploy(Contract , "Hulk");
+  await deployer.deploy(Contract);
   const deployedCertification = await Contract.deployed();
   let configData = {};
   configData.address = deployedCertification.address;
@@ -0,0 +1,175 @@
+# local relay that follows grid alerts once and pushes them to every meter
+"""
+Every meter used to create its own GridAlert filter and poll it every 2
+seconds, so 12 meters meant 12 filters on the node and 6 polls a second for
+the same events.
+
+The relay keeps the only GridAlert filter and writes each alert as one JSON
+line to every meter connected to it:
+
+    {"message": "Grid overload", "block": 120, "log_index": 0, "sent": 1700000000.0}
+
+The relay follows GridAlert with an EventSubscription, so alerts sent while
+it was down are pushed once it is back, and meters use block and log_index
+to skip alerts they already read from the chain themselves.
+
+The relay listens on a Unix socket, or on a loopback TCP port where Unix
+sockets are not available (an address of the form "127.0.0.1:8555").
+BlockchainGetAlerts reads from the relay when one is running and polls the
+chain directly when it is not, trying the relay again every
+RELAY_RETRY_INTERVAL seconds.
+
+Usage:
+    python -m client.alert_relay
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import tempfile
+import time
+
+try:
+    from client.event_subscription import BlockCursor, EventSubscription
+except Exception as e:
+    from event_subscription import BlockCursor, EventSubscription
+
+RELAY_PORT = 8555  # Loopback port used where Unix sockets are not available
+RELAY_ADDRESS = (
+    os.path.join(tempfile.gettempdir(), "shu-meter-alerts.sock")
+    if hasattr(socket, "AF_UNIX")
+    else f"127.0.0.1:{RELAY_PORT}"
+)
+RELAY_CURSOR = "alert-relay-cursor.sqlite"  # Last relayed alert, kept across restarts
+RELAY_RETRY_INTERVAL = 30  # Seconds a meter polls the chain itself before trying the relay again
+MAX_CLIENT_BUFFER = 64 * 1024  # Bytes queued for a meter before it is dropped as stuck
+
+
+def is_tcp_address(address):
+    return ":" in address and os.path.sep not in address
+
+
+async def open_relay_connection(address=RELAY_ADDRESS):
+    if is_tcp_address(address):
+        host, port = address.rsplit(":", 1)
+        return await asyncio.open_connection(host, int(port))
+    return await asyncio.open_unix_connection(address)
+
+
+async def read_relay_alerts(on_alert, address=RELAY_ADDRESS, on_connected=None):
+    # Calls on_alert(alert) for every alert until the relay goes away,
+    # raises OSError if there is no relay to connect to
+    reader, writer = await open_relay_connection(address)
+    logging.info("Receiving grid alerts from the relay at %s", address)
+    try:
+        if on_connected is not None:
+            # Alerts pushed meanwhile wait in the socket buffer
+            await on_connected()
+        while line := await reader.readline():
+            on_alert(json.loads(line))
+    finally:
+        writer.close()
+
+
+class AlertRelay:
+
+    def __init__(self, address=RELAY_ADDRESS):
+        self.address = address
+        self.writers = set()
+        self.alerts_sent = 0
+
+    async def start_server(self):
+        if is_tcp_address(self.address):
+            host, port = self.address.rsplit(":", 1)
+            return await asyncio.start_server(self.handle_meter, host, int(port))
+        # A socket file left by a relay that was killed would stop the bind
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        return await asyncio.start_unix_server(self.handle_meter, self.address)
+
+    async def serve(self):
+        server = await self.start_server()
+        logging.warning("Grid alert relay listening on %s", self.address)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_meter(self, reader, writer):
+        self.writers.add(writer)
+        try:
+            # Meters never send anything, this returns when one disconnects
+            await reader.read()
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def broadcast(self, alert):
+        line = (json.dumps(alert) + "\n").encode()
+        for writer in list(self.writers):
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                logging.warning("Dropping a meter that stopped reading alerts")
+                self.writers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+        self.alerts_sent += 1
+
+    def relay_alert(self, event):
+        logging.warning(
+            "Relaying grid alert to %s meters: %s",
+            len(self.writers),
+            event.args.message,
+        )
+        self.broadcast(
+            {
+                "message": event.args.message,
+                "block": event.blockNumber,
+                "log_index": event.logIndex,
+                "sent": time.time(),
+            }
+        )
+
+    # The relay is the app of its ConnectionHealth
+    def update_connection_status(self, status):
+        logging.warning("Blockchain connection status: %s", status)
+
+
+async def run_relay(address=RELAY_ADDRESS, cursor_path=RELAY_CURSOR):
+    try:
+        from client.health import ConnectionHealth
+    except Exception as e:
+        from health import ConnectionHealth
+    relay = AlertRelay(address)
+    health = ConnectionHealth(relay)
+    w3, contract = await health.connect()
+    subscription = EventSubscription(
+        w3,
+        contract.events.GridAlert,
+        relay.relay_alert,
+        name="GridAlert",
+        cursor=BlockCursor(cursor_path),
+        health=health,
+    )
+    await asyncio.gather(relay.serve(), subscription.run(), health.run())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relay grid alerts to local meters")
+    parser.add_argument("--address", default=RELAY_ADDRESS)
+    parser.add_argument("--cursor", default=RELAY_CURSOR)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=args.log_level,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    try:
+        asyncio.run(run_relay(args.address, args.cursor))
+    except KeyboardInterrupt:
+        logging.warning("Stopping grid alert relay")
+
+
+if __name__ == "__main__":
+    main()
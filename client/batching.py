@@ -0,0 +1,113 @@
+# batches contract view calls made by many callers into single JSON-RPC requests
+"""
+BatchedViewCaller collects view calls (getMeterBill, getMeterSummary,
+getMeterReadings or any other view) made within a short window, sends them
+to the node as one JSON-RPC batch and resolves each caller with its own
+result. A dashboard reading the bill of all 50 accounts costs one HTTP
+request instead of 50.
+
+If the node rejects the batch as a whole, the calls in it are retried one by
+one so each caller still gets its own result or error. Batches still being
+sent are kept until they finish, await close() before the event loop ends.
+
+Usage:
+    batcher = BatchedViewCaller(w3, contract)
+    bills = await asyncio.gather(*(batcher.get_meter_bill(a) for a in addresses))
+    await batcher.close()
+"""
+import asyncio
+import logging
+
+try:
+    from client.blockchain_client import maybe_await
+except Exception as e:
+    from blockchain_client import maybe_await
+
+BATCH_WINDOW = 0.01  # Seconds to wait for more calls before sending a batch
+MAX_BATCH_SIZE = 500  # Calls per batch, a full batch is sent straight away
+
+
+class BatchedViewCaller:
+
+    def __init__(self, w3, contract, window=BATCH_WINDOW, max_batch_size=MAX_BATCH_SIZE):
+        self.w3 = w3
+        self.contract = contract
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.batches_sent = 0
+        self._pending = []
+        self._flush_timer = None
+        self._sending = set()  # Tasks sending a batch, until they finish
+
+    async def call(self, function_name, *args, address):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        contract_function = getattr(self.contract.functions, function_name)(*args)
+        self._pending.append((contract_function, address, future))
+        if len(self._pending) >= self.max_batch_size:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    async def get_meter_bill(self, address):
+        return await self.call("getMeterBill", address=address)
+
+    async def get_meter_summary(self, address):
+        return await self.call("getMeterSummary", address=address)
+
+    async def get_meter_readings(self, address):
+        return await self.call("getMeterReadings", address=address)
+
+    def flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.get_running_loop().create_task(self._send(pending))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def close(self):
+        # Sends the calls still waiting for the window and waits for every batch
+        self.flush()
+        await asyncio.gather(*self._sending, return_exceptions=True)
+
+    async def _send(self, pending):
+        try:
+            results = await self._execute_batch(pending)
+            self.batches_sent += 1
+        except Exception as e:
+            logging.warning(
+                "Batch of %s calls failed, sending them one by one: %s", len(pending), e
+            )
+            results = [await self._call_one(function, address) for function, address, _ in pending]
+
+        for (_function, _address, future), result in zip(pending, results):
+            if future.done():
+                continue  # caller gave up waiting
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _execute_batch(self, pending):
+        if self.w3.provider.is_async:
+            async with self.w3.batch_requests() as batch:
+                for contract_function, address, _future in pending:
+                    batch.add(contract_function.call({"from": address}))
+                return await batch.async_execute()
+        with self.w3.batch_requests() as batch:
+            for contract_function, address, _future in pending:
+                batch.add(contract_function.call({"from": address}))
+            # The sync request blocks, on a thread the event loop keeps queueing calls
+            return await asyncio.to_thread(batch.execute)
+
+    async def _call_one(self, contract_function, address):
+        try:
+            if self.w3.provider.is_async:
+                return await maybe_await(contract_function.call({"from": address}))
+            return await asyncio.to_thread(contract_function.call, {"from": address})
+        except Exception as e:
+            return e
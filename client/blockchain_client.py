@@ -15,11 +15,11 @@ Integrate with Client Logic:
 Reference link: https://medium.com/@0xCodeCharmer/interacting-with-smart-contracts-with-web3-py-9fee1a4274ec
 """
 import asyncio
+import inspect
 import json
 import logging
 import random
 import sys
-import textwrap
 import threading
 import time
 from datetime import datetime
@@ -27,61 +27,180 @@ from decimal import Decimal
 from multiprocessing import Process
 from uuid import uuid4
 
-import customtkinter as ctk
-from eth_account import Account
-from web3 import Web3
-
-
 try:
     from client.parameters import (
-        ACCOUNTS_DATA,
         BLOCKCHAIN_URL,
-        CONTRACT_ABI,
-        CONTRACT_ADDRESS,
+        get_contract_abi,
+        get_contract_address,
+        get_private_key,
     )
+    from client.alert_relay import RELAY_RETRY_INTERVAL, read_relay_alerts
+    from client.confirmations import CONFIRMATION_DEPTH, ConfirmationTracker
+    from client.event_subscription import EventSubscription
+    from client.metrics import POLL_ITERATIONS
+    from client.offline_queue import ReadingQueue, ReadingQueueFull
+    from client.scheduler import FAILED, MAX_IN_FLIGHT, MINED, SubmissionScheduler
+    from client.transport import close_async_web3, get_async_web3, get_web3
 except Exception as e: 
     from parameters import (
-        ACCOUNTS_DATA,
         BLOCKCHAIN_URL,
-        CONTRACT_ABI,
-        CONTRACT_ADDRESS,
+        get_contract_abi,
+        get_contract_address,
+        get_private_key,
     )
+    from alert_relay import RELAY_RETRY_INTERVAL, read_relay_alerts
+    from confirmations import CONFIRMATION_DEPTH, ConfirmationTracker
+    from event_subscription import EventSubscription
+    from metrics import POLL_ITERATIONS
+    from offline_queue import ReadingQueue, ReadingQueueFull
+    from scheduler import FAILED, MAX_IN_FLIGHT, MINED, SubmissionScheduler
+    from transport import close_async_web3, get_async_web3, get_web3
 
 READING_SCALING_FACTOR = 1000  # Scaled Integer to represent 3dp decimal reading
 BILL_SCALING_FACTOR = 100  # Scaled Integer to represent 2dp decimal price
+BILL_EVENT_POLL_INTERVAL = 0.5  # Seconds between checks of the bill update filter
+READING_PAGE_SIZE = 200  # Readings fetched per getMeterReadingsPage call
+STORE_READING_GAS = 300000  # Gas limit for locally signed storeMeterReading, usage is flat
+SIGNED_TX_RETRIES = 2  # Resends after a nonce resync before a signed reading is given up
+DRAIN_BATCH_SIZE = 100  # Queued readings replayed together after a reconnect
+BATCH_GAS_MARGIN = 1.2  # Headroom over estimate_gas for locally signed storeMeterReadings
+RECEIPT_TIMEOUT = 120  # Seconds to wait for a stored reading to be confirmed
+MONITOR_RESTART_DELAY = 1  # Seconds before a failed monitor checks the connection health
 
 
 class BlockchainConnectionError(Exception):
     pass
 
 
+INVALID_READING_ERRORS = (
+    "UID can not be empty",
+    "Meter reading must be greater than zero",
+)
+
+
+def is_duplicate_reading_error(error):
+    # The contract already holds this uid, so the reading was stored by an earlier attempt
+    return "Duplicate reading is not allowed" in str(error)
+
+
+# Rejections a resent transaction with a fresh nonce or gas price can get past,
+# "correct nonce" is how Ganache v6 words a nonce that is too low or too high
+NONCE_REJECTION_ERRORS = (
+    "nonce too low",
+    "nonce too high",
+    "correct nonce",
+    "underpriced",
+    "replacement transaction",
+)
+
+
+def is_nonce_rejection(error):
+    message = str(error).lower()
+    return any(rejection in message for rejection in NONCE_REJECTION_ERRORS)
+
+
+def is_settled_reading_error(error):
+    # Errors after which a queued reading must not be replayed: it is already on
+    # chain, or the contract will never accept it and it would block the queue
+    return is_duplicate_reading_error(error) or any(
+        message in str(error) for message in INVALID_READING_ERRORS
+    )
+
+
+def final_reading_state(error):
+    # Scheduler state for errors that retrying can not change, None if it is worth a retry
+    if is_duplicate_reading_error(error):
+        return MINED
+    if is_settled_reading_error(error):
+        return FAILED
+    return None
+
+
+async def maybe_await(value):
+    # Contract calls return coroutines on AsyncWeb3 and plain values on Web3,
+    # this lets the same classes run on either provider
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+async def run_resilient(coroutine_function, health=None):
+    # Restarts a long running monitor once the node is reachable again, without
+    # a ConnectionHealth (client/health.py) its errors are raised as before
+    while True:
+        try:
+            return await coroutine_function()
+        except Exception as e:
+            if health is None:
+                raise e
+            logging.error(e)
+            health.record_failure(e)
+            await asyncio.sleep(MONITOR_RESTART_DELAY)
+            await health.wait_available()
+
+
+def get_account(private_key):
+    # eth_account (with web3, most of the client's import time) is imported on
+    # first use, so the module loads before the window is up
+    from eth_account import Account
+
+    return Account.from_key(private_key)
+
+
 def get_contract(app):
     try:
-        w3 = Web3(Web3.HTTPProvider(BLOCKCHAIN_URL, request_kwargs={"timeout": 60}))
+        # Shared pooled keep-alive transport, see client/transport.py
+        w3 = get_web3(BLOCKCHAIN_URL)
         if not w3.is_connected():
             app.update_connection_status("error")
             raise BlockchainConnectionError("Failed to connect to the blockchain")
             # return None, None
-        contract_instance = w3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+        contract_instance = w3.eth.contract(
+            address=get_contract_address(), abi=get_contract_abi()
+        )
+        app.update_connection_status("connected")
+        return w3, contract_instance
+    except Exception as e:
+        app.update_connection_status("error")
+        logging.error(e)
+        raise e
+
+
+async def get_async_contract(app):
+    # Same as get_contract on a keep-alive AsyncWeb3, close it with close_async_web3
+    w3 = await get_async_web3(BLOCKCHAIN_URL)
+    try:
+        if not await w3.is_connected():
+            raise BlockchainConnectionError("Failed to connect to the blockchain")
+        contract_instance = w3.eth.contract(
+            address=get_contract_address(), abi=get_contract_abi()
+        )
         app.update_connection_status("connected")
         return w3, contract_instance
     except Exception as e:
+        await close_async_web3(w3)
         app.update_connection_status("error")
         logging.error(e)
         raise e
 
 
 class BlockchainConnectionMonitor:
-    def __init__(self, app, w3):
+    def __init__(self, app, w3, on_reconnect=None):
         self.app = app
         self.w3 = w3
+        self.on_reconnect = on_reconnect
+        self.connected = None
+
+    def set_connected(self, connected):
+        self.app.update_connection_status("connected" if connected else "error")
+        if connected and self.connected is False and self.on_reconnect is not None:
+            logging.info("Blockchain connection restored")
+            self.on_reconnect()
+        self.connected = connected
 
     def check_connection(self, stop_flag=False):
         while True:
-            if not self.w3.is_connected():
-                self.app.update_connection_status("error")
-            else:
-                self.app.update_connection_status("connected")
+            self.set_connected(self.w3.is_connected())
 
             # Stop flag for testing the loop
             if stop_flag:
@@ -97,114 +216,293 @@ class BlockchainGetBill:
         w3,
         contract,
         ui_callback,
+        push_updates=True,
+        health=None,
     ):
         self.w3 = w3
         self.private_key = private_key
         self.contract = contract
-        self.acc = Account.from_key(self.private_key)
+        self.acc = get_account(self.private_key)
         self.ui_callback = ui_callback
+        self.push_updates = push_updates
+        self.health = health
+
+    async def get_current_bill(self):
+        # One constant size view call instead of pulling the whole reading history
+        bill, total_usage, _reading_count, _last_uid = await maybe_await(
+            self.contract.functions.getMeterSummary().call({"from": self.acc.address})
+        )
+        bill = bill / BILL_SCALING_FACTOR  # Using Scaled Integer to represent decimal price
+        total_usage = (
+            total_usage / READING_SCALING_FACTOR
+        )  # Using Scaled Integer to represent decimal reading
+        return bill, round(total_usage, 2)
+
+    def handle_bill_update(self, event):
+        bill = event.args.bill / BILL_SCALING_FACTOR
+        total_usage = round(event.args.totalUsage / READING_SCALING_FACTOR, 2)
+        logging.info(
+            "Received New Bill: £%s @ Meter reading: %s kWh", bill, total_usage
+        )
+        self.ui_callback.state.set_bill(bill, total_usage)
+
+    async def watch_bill_updates(self):
+        logging.info("Subscribing to bill update events")
+        # Filter is created before the initial read so no update can slip between them
+        event_filter = await maybe_await(
+            self.contract.events.MeterBillUpdated.create_filter(
+                from_block="latest", argument_filters={"addr": self.acc.address}
+            )
+        )
+        bill, total_usage = await self.get_current_bill()
+        logging.info(
+            "Received Initial Bill: £%s @ Meter reading: %s kWh", bill, total_usage
+        )
+        self.ui_callback.state.set_bill(bill, total_usage)
+        while True:
+            POLL_ITERATIONS["bill"] += 1
+            for event in await maybe_await(event_filter.get_new_entries()):
+                self.handle_bill_update(event)
+            await asyncio.sleep(BILL_EVENT_POLL_INTERVAL)
 
     async def poll_bill(self):
         logging.info("Polling for bill updates")
         total_usage = None
         while True:
+            POLL_ITERATIONS["bill"] += 1
+            if self.health is not None:
+                await self.health.wait_available()
             if total_usage == None:
-                bill = (
-                    self.contract.functions.getMeterBill().call(
-                        {"from": self.acc.address}
-                    )
-                    / BILL_SCALING_FACTOR  # Using Scaled Integer to represent decimal price
-                )
-                meter_readings = self.contract.functions.getMeterReadings.call(
-                    {"from": self.acc.address}
-                )
-                total_usage = (
-                    sum(reading[1] for reading in meter_readings)
-                    / READING_SCALING_FACTOR
-                )  # Using Scaled Integer to represent decimal reading
-                total_usage = round(total_usage, 2)
+                bill, total_usage = await self.get_current_bill()
                 logging.info(
                     "Received Initial Bill: £%s @ Meter reading: %s kWh",
                     bill,
                     total_usage,
                 )
-                self.ui_callback.update_main_display(
-                    f"£{bill:.2f}", f"{total_usage:.2f} kWh"
-                )
+                self.ui_callback.state.set_bill(bill, total_usage)
             else:
                 # Get displayed meter reading
-                displayed_usage = float(
-                    self.ui_callback.usage_label.cget("text")
-                    .split(": ")[1]
-                    .strip()
-                    .split(" ")[0]
-                )
+                displayed_usage = self.ui_callback.state.usage
                 logging.info(
                     "Displayed usage: %s total usage: %s", displayed_usage, total_usage
                 )
                 if displayed_usage > total_usage:
                     try:
-                        meter_readings = self.contract.functions.getMeterReadings.call(
-                            {"from": self.acc.address}
-                        )
+                        bill, total_usage = await self.get_current_bill()
                     except Exception as e:
                         logging.error(e)
-
-                    bill = (
-                        self.contract.functions.getMeterBill().call(
-                            {"from": self.acc.address}
+                        if self.health is not None:
+                            self.health.record_failure(e)
+                    else:
+                        logging.info(
+                            "Received New Bill: £%s @ Meter reading: %s kWh",
+                            bill,
+                            total_usage,
+                        )
+                        self.ui_callback.state.set_bill(
+                            bill, total_usage, usage=displayed_usage
                         )
-                        / BILL_SCALING_FACTOR  # Using Scaled Integer to represent decimal price
-                    )
-
-                    total_usage = (
-                        sum(reading[1] for reading in meter_readings)
-                        / READING_SCALING_FACTOR
-                    )  # Using Scaled Integer to represent decimal reading
-                    total_usage = round(total_usage, 2)
-
-                    logging.info(
-                        "Received New Bill: £%s @ Meter reading: %s kWh",
-                        bill,
-                        total_usage,
-                    )
-                    self.ui_callback.update_main_display(
-                        f"£{bill:.2f}", f"{displayed_usage:.2f} kWh"
-                    )
 
             # polling every 0.1 seconds
             await asyncio.sleep(0.1)
 
+    def bill_monitor(self):
+        return run_resilient(
+            self.watch_bill_updates if self.push_updates else self.poll_bill,
+            self.health,
+        )
+
     def start_bill_monitor(self):
         try:
-            asyncio.run(self.poll_bill())
+            asyncio.run(self.bill_monitor())
         except KeyboardInterrupt:
             logging.warning("Stopping billing polling")
 
 
+class BlockchainReadingHistory:
+
+    def __init__(self, private_key, w3, contract, page_size=READING_PAGE_SIZE):
+        self.private_key = private_key
+        self.w3 = w3
+        self.contract = contract
+        self.acc = get_account(self.private_key)
+        self.page_size = page_size
+
+    def get_page(self, offset, limit):
+        return self.contract.functions.getMeterReadingsPage(offset, limit).call(
+            {"from": self.acc.address}
+        )
+
+    async def fetch_page(self, offset):
+        # AsyncWeb3's call returns a coroutine, a sync call blocks so it runs on a
+        # thread to overlap with the page being consumed
+        if self.w3.provider.is_async:
+            return await maybe_await(self.get_page(offset, self.page_size))
+        return await asyncio.to_thread(self.get_page, offset, self.page_size)
+
+    async def iter_readings(self, offset=0):
+        """
+        Yields (index, uid, reading in kWh) for the meter's history from offset.
+        The next page is fetched while the current one is being consumed, so only
+        two pages are held in memory whatever the size of the history. Resume an
+        interrupted read by passing the last yielded index plus one as offset.
+        """
+        next_page = asyncio.ensure_future(self.fetch_page(offset))
+        try:
+            while next_page is not None:
+                page = await next_page
+                next_page = None
+                if len(page) == self.page_size:
+                    next_page = asyncio.ensure_future(self.fetch_page(offset + len(page)))
+                for uid, mtr_reading in page:
+                    # Using Scaled Integer to represent decimal reading
+                    yield offset, uid, mtr_reading / READING_SCALING_FACTOR
+                    offset += 1
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+
+class NonceManager:
+    """
+    Hands out nonces for one account locally so signed transactions can be sent
+    back to back without waiting for each one to be mined. After a rejected
+    transaction the counter is resynced from the node's pending count, which
+    also fills any gap left by a nonce that was handed out but never used.
+    """
+
+    _managers = {}
+    _managers_lock = threading.Lock()
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self._next_nonce = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_account(cls, w3, address):
+        # One manager per account per Web3, shared by every sender using it. A
+        # different Web3 may be on another chain or provider with its own nonces.
+        # The manager holds its w3, so the id is not reused while it is kept
+        key = (id(w3), address)
+        with cls._managers_lock:
+            if key not in cls._managers:
+                cls._managers[key] = cls(w3, address)
+            return cls._managers[key]
+
+    async def resync(self):
+        pending_nonce = await maybe_await(
+            self.w3.eth.get_transaction_count(self.address, "pending")
+        )
+        with self._lock:
+            self._next_nonce = pending_nonce
+        logging.info("Nonce for %s resynced to %s", self.address, pending_nonce)
+
+    async def next_nonce(self):
+        if self._next_nonce is None:
+            await self.resync()
+        with self._lock:
+            nonce = self._next_nonce
+            self._next_nonce += 1
+        return nonce
+
+
 class BlockchainStoreReading:
 
-    def __init__(self, private_key, w3, contract):
+    def __init__(self, private_key, w3, contract, local_signing=False):
         try:
             self.private_key = private_key
             self.w3 = w3
             self.contract = contract
-            self.acc = Account.from_key(self.private_key)
+            self.acc = get_account(self.private_key)
+            self.readings_stored = 0
+            self.local_signing = local_signing
+            self.nonce_manager = NonceManager.for_account(w3, self.acc.address)
+            self.chain_id = None
+            self.gas_price = None
         except Exception as e:
             logging.error(e)
             raise e
 
-    async def store_reading(self, reading):
+    async def send_signed(self, contract_function, gas=STORE_READING_GAS):
+        # Sign with the meter's own key so the node never needs to hold it
+        if self.chain_id is None:
+            self.chain_id = await maybe_await(self.w3.eth.chain_id)
+        if gas is None:
+            # Batch cost grows with the number of readings so it is estimated
+            estimate = await maybe_await(
+                contract_function.estimate_gas({"from": self.acc.address})
+            )
+            gas = int(estimate * BATCH_GAS_MARGIN)
+        for attempt in range(SIGNED_TX_RETRIES + 1):
+            if self.gas_price is None:
+                self.gas_price = await maybe_await(self.w3.eth.gas_price)
+            nonce = await self.nonce_manager.next_nonce()
+            try:
+                tx = await maybe_await(
+                    contract_function.build_transaction(
+                        {
+                            "from": self.acc.address,
+                            "nonce": nonce,
+                            "gas": gas,
+                            "gasPrice": self.gas_price,
+                            "chainId": self.chain_id,
+                        }
+                    )
+                )
+                signed_tx = self.acc.sign_transaction(tx)
+                return await maybe_await(
+                    self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+                )
+            except Exception as e:
+                # Reverts and other errors would fail the same way again, and a
+                # reverted transaction still used its nonce
+                if not is_nonce_rejection(e) or attempt == SIGNED_TX_RETRIES:
+                    raise e
+                logging.warning("Transaction with nonce %s rejected: %s", nonce, e)
+                self.gas_price = None
+                await self.nonce_manager.resync()
+
+    async def store_reading(self, reading, uid=None):
         try:
             reading = int(
                 reading * READING_SCALING_FACTOR
             )  # Using Scaled Integer to represent decimal reading
-            uuid_ = uuid4()
+            uid = uid or str(uuid4())
             # reading being stored with a transaction id
-            tx = self.contract.functions.storeMeterReading(
-                uuid_.__str__(), reading
-            ).transact({"from": self.acc.address})
+            contract_function = self.contract.functions.storeMeterReading(uid, reading)
+            if self.local_signing:
+                tx = await self.send_signed(contract_function)
+            else:
+                tx = await maybe_await(
+                    contract_function.transact({"from": self.acc.address})
+                )
+            self.readings_stored += 1
             logging.info("Stored reading: %s with tx: %s", reading, tx.hex())
+            return tx
+        except Exception as e:
+            logging.error(e)
+            raise e
+
+    async def store_readings(self, batch):
+        # batch is a list of (uid, reading) stored in a single transaction
+        if len(batch) == 1:
+            uid, reading = batch[0]
+            return await self.store_reading(reading, uid)
+        try:
+            uids = [uid for uid, _reading in batch]
+            readings = [int(reading * READING_SCALING_FACTOR) for _uid, reading in batch]
+            contract_function = self.contract.functions.storeMeterReadings(uids, readings)
+            if self.local_signing:
+                tx = await self.send_signed(contract_function, gas=None)
+            else:
+                tx = await maybe_await(
+                    contract_function.transact({"from": self.acc.address})
+                )
+            self.readings_stored += len(batch)
+            logging.info("Stored %s readings with tx: %s", len(batch), tx.hex())
+            return tx
         except Exception as e:
             logging.error(e)
             raise e
@@ -212,13 +510,58 @@ class BlockchainStoreReading:
 
 class GenerateReadings:
 
-    def __init__(self, private_key, w3, contract, app):
+    def __init__(
+        self,
+        private_key,
+        w3,
+        contract,
+        app,
+        min_wait=15,
+        max_wait=60,
+        local_signing=False,
+        reading_queue=None,
+        coalesce_window=None,
+        coalesce_size=DRAIN_BATCH_SIZE,
+        max_in_flight=MAX_IN_FLIGHT,
+        confirmations=CONFIRMATION_DEPTH,
+        health=None,
+    ):
         self.private_key = private_key
         self.w3 = w3
         self.contract = contract
-        self.store_readings_obj = BlockchainStoreReading(private_key, w3, contract)
+        self.store_readings_obj = BlockchainStoreReading(
+            private_key, w3, contract, local_signing
+        )
         self.app = app
-        self.backlogs = []
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.readings_generated = 0
+        # Readings wait here until the blockchain accepts them, see client/offline_queue.py
+        # An empty queue has len 0, so it is checked against None rather than for truth
+        if reading_queue is None:
+            reading_queue = ReadingQueue()
+        self.reading_queue = reading_queue
+        # When set, readings are sent together every coalesce_window seconds or
+        # once coalesce_size are waiting, instead of one transaction each
+        self.coalesce_window = coalesce_window
+        self.coalesce_size = coalesce_size
+        # One block follower per process confirms every meter's readings
+        self.confirmation_tracker = ConfirmationTracker.for_web3(w3, confirmations)
+        # While its circuit is open readings only go to the offline queue
+        self.health = health
+        if health is not None:
+            self.confirmation_tracker.health = health
+        # Bounds the readings being sent at once, see client/scheduler.py
+        self.scheduler = SubmissionScheduler(
+            self.send_reading,
+            self.confirm_reading,
+            final_state=final_reading_state,
+            on_settled=lambda uid: self.reading_queue.remove([uid]),
+            on_capacity=self.request_drain,
+            max_in_flight=max_in_flight,
+        )
+        self.loop = None
+        self.drain_requested = None
 
     @staticmethod
     def generate_reading():
@@ -226,51 +569,126 @@ class GenerateReadings:
         return random_reading
 
     async def reading_generator(self):
-        MIN_WAIT = 15  
-        MAX_WAIT = 60
-
         while True:
 
-            delay_interval = random.randint(MIN_WAIT, MAX_WAIT)
+            delay_interval = random.uniform(self.min_wait, self.max_wait)
             await asyncio.sleep(delay_interval)
 
             reading = self.generate_reading()
+            self.readings_generated += 1
             logging.info("Generated reading: %s", reading)
 
             # Populate the UI with new reading incase of connection loss with the blockchain
-            previous_price_text = app.price_label.cget("text")
-            previous_usage_text = app.usage_label.cget("text")
+            self.app.state.record_reading(reading)
+
+            uid = str(uuid4())
             try:
-                previous_usage = float(
-                    previous_usage_text.split(": ")[1].strip().split(" ")[0]
-                )
-                new_usage = previous_usage + reading
-                app.update_main_display(previous_price_text, f"{new_usage:.2f} kWh")
-            except ValueError:
-                pass
+                self.reading_queue.append(uid, reading)
+            except ReadingQueueFull as e:
+                logging.error(e)
+                continue
+            if not self.node_available():
+                # Drained by request_drain once the connection health reconnects
+                continue
+            if self.coalesce_window is None:
+                # Stays in the offline queue if the scheduler is full
+                self.scheduler.submit(uid, reading)
+            elif len(self.reading_queue) >= self.coalesce_size:
+                self.drain_requested.set()
+
+    def node_available(self):
+        return self.health is None or self.health.available
+
+    async def send_reading(self, uid, reading):
+        return await self.store_readings_obj.store_reading(reading, uid)
+
+    async def confirm_reading(self, tx):
+        return await asyncio.wait_for(
+            self.confirmation_tracker.wait(tx), RECEIPT_TIMEOUT
+        )
 
+    def next_drain_batch(self):
+        # Readings the scheduler is still sending are left to it
+        active = self.scheduler.active
+        batch = self.reading_queue.peek(self.coalesce_size + len(active))
+        return [(uid, reading) for uid, reading in batch if uid not in active][
+            : self.coalesce_size
+        ]
+
+    async def store_one_by_one(self, batch):
+        results = await asyncio.gather(
+            *(
+                self.store_readings_obj.store_reading(reading, uid)
+                for uid, reading in batch
+            ),
+            return_exceptions=True,
+        )
+        return [
+            uid
+            for (uid, _reading), result in zip(batch, results)
+            if not isinstance(result, Exception) or is_settled_reading_error(result)
+        ]
+
+    async def drain_backlog(self):
+        drained = 0
+        while self.node_available():
+            batch = self.next_drain_batch()
+            if not batch:
+                break
             try:
-                asyncio.create_task(self.store_readings_obj.store_reading(reading))
-                logging.info(self.backlogs)
-                asyncio.create_task(self.clear_backlogs())
+                await self.store_readings_obj.store_readings(batch)
+                stored = [uid for uid, _reading in batch]
             except Exception as e:
-                self.backlogs.append(e)
-
-    async def clear_backlogs(self):
-        if len(self.backlogs) > 1:
-            for index in range(self.backlogs):
-                try:
-                    asyncio.create_task(
-                        self.store_readings_obj.store_reading(self.backlogs[index])
-                    )
-                    record = self.backlogs.pop(index)
-                    logging.info("Stored reading from backlog: %s ", str(record))
-                except Exception as e:
-                    logging.error(str(e))
+                if not is_settled_reading_error(e):
+                    if self.health is not None:
+                        self.health.record_failure(e)
+                    break
+                # One bad or already stored reading reverts the whole batch,
+                # so settle the readings one at a time instead
+                stored = await self.store_one_by_one(batch)
+            self.reading_queue.remove(stored)
+            drained += len(stored)
+            if len(stored) < len(batch):
+                # Still failing, wait for the connection health to report a reconnect
+                break
+        if drained:
+            logging.info("Stored %s readings from the offline queue", drained)
+        return drained
+
+    def request_drain(self):
+        # Safe to call from the connection monitor thread
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.drain_requested.set)
+
+    async def backlog_drainer(self):
+        while True:
+            await self.drain_requested.wait()
+            self.drain_requested.clear()
+            await self.drain_backlog()
+
+    async def coalescer(self):
+        while True:
+            await asyncio.sleep(self.coalesce_window)
+            if len(self.reading_queue):
+                self.drain_requested.set()
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.drain_requested = asyncio.Event()
+        # Replay anything left in the queue by a previous run
+        self.drain_requested.set()
+        coroutines = [
+            self.reading_generator(),
+            self.backlog_drainer(),
+            self.scheduler.run(),
+        ]
+        if self.coalesce_window is not None:
+            coroutines.append(self.coalescer())
+        await asyncio.gather(*coroutines)
 
     def start_reading_generator(self):
         try:
-            asyncio.run(self.reading_generator())
+            asyncio.run(self.run())
             logging.info("Started reading generator")
         except Exception as e:
             logging.error(e)
@@ -286,29 +704,75 @@ def generate_existing_readings():
 
 
 def store_initial_set(initial_set, **blockchain_args):
+    # The whole set goes in one storeMeterReadings transaction
     store_readings_obj = BlockchainStoreReading(**blockchain_args)
-    for record in initial_set:
-        asyncio.run(store_readings_obj.store_reading(record.get("reading")))
+    asyncio.run(
+        store_readings_obj.store_readings(
+            [(record.get("uuid_"), record.get("reading")) for record in initial_set]
+        )
+    )
 
 
 class BlockchainGetAlerts:
 
-    def __init__(self, w3, contract, ui_callback):
+    def __init__(
+        self, w3, contract, ui_callback, health=None, relay_address=None, cursor=None
+    ):
         self.contract = contract
         self.w3 = w3
         self.ui_callback = ui_callback
+        self.health = health
+        # Alerts come from the local relay (client/alert_relay.py) when one is running
+        self.relay_address = relay_address
+        # Alerts sent while the meter was down are backfilled from cursor,
+        # see client/event_subscription.py
+        self.subscription = EventSubscription(
+            w3,
+            contract.events.GridAlert,
+            self.handle_grid_alert,
+            name="GridAlert",
+            cursor=cursor,
+            health=health,
+        )
 
-    async def handle_grid_alert(self, event):
-        alert_message = event.args.message
+    def show_alert(self, alert_message):
         logging.warning(f"Alert from the grid: {alert_message}")
         self.ui_callback.update_notice_message(alert_message)
 
+    async def handle_grid_alert(self, event):
+        self.show_alert(event.args.message)
+
+    def handle_relayed_alert(self, alert):
+        # The relay and the meter's own backfill can both deliver an alert
+        position = (alert["block"], alert["log_index"])
+        if self.subscription.is_handled(position):
+            return
+        self.subscription.advance(position)
+        self.show_alert(alert["message"])
+
     async def monitor_grid_alerts(self):
-        event_filter = self.contract.events.GridAlert.create_filter(from_block="latest")
+        if self.relay_address is None:
+            await self.watch_grid_alerts()
+            return
         while True:
-            for event in event_filter.get_new_entries():
-                await self.handle_grid_alert(event)
-            await asyncio.sleep(2)
+            try:
+                # Alerts missed while disconnected are read from the chain
+                # before the ones the relay pushes
+                await read_relay_alerts(
+                    self.handle_relayed_alert,
+                    self.relay_address,
+                    on_connected=self.subscription.catch_up,
+                )
+                logging.warning("Alert relay closed, polling grid alerts directly")
+            except Exception as e:
+                logging.warning("No alert relay, polling grid alerts directly: %s", e)
+            try:
+                await asyncio.wait_for(self.watch_grid_alerts(), RELAY_RETRY_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def watch_grid_alerts(self):
+        await self.subscription.run()
 
     def start_grid_alert_monitor(self):
         try:
@@ -318,139 +782,22 @@ class BlockchainGetAlerts:
             pass
 
 
-class SmartMeterUI(ctk.CTk):
-    def __init__(self):
-        super().__init__()
-
-        # Appearance and theme
-        self.title("Smart Meter Interface")
-        self.geometry("533x300")
-        # Use native system dark / light mode
-        ctk.set_appearance_mode("system")
-        ctk.set_default_color_theme("blue")
-
-        # Configure Grid layout
-        self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure(0, weight=1)  # Server Connection status section
-        self.grid_rowconfigure(1, weight=3)  # Main display
-        self.grid_rowconfigure(2, weight=1)  # Outage Notice section
-
-        # Define attributes
-        self.connection_status_frame = None
-        self.connection_status_label = None
-        self.time_label = None
-        self.middle_frame = None
-        self.price_label = None
-        self.usage_label = None
-        self.notice_frame = None
-        self.notice_label = None
-
-        self.create_widgets()
-
-    # Create UI components
-    def create_widgets(self):
-        self.create_connection_status()
-        self.create_main_display()
-        self.create_notice_section()
-        self.update_time()
-
-    def create_connection_status(self):
-        self.connection_status_frame = ctk.CTkFrame(
-            self, corner_radius=10, fg_color="grey17"
-        )
-        self.connection_status_frame.grid(
-            row=0, column=0, padx=20, pady=10, sticky="nsew"
-        )
-
-        self.time_label = ctk.CTkLabel(
-            self.connection_status_frame,
-            text="11:11",
-            font=("Arial", 12),
-            text_color="white",
-        )
-        self.time_label.pack(side="top", anchor="ne", padx=10)
-
-        self.connection_status_label = ctk.CTkLabel(
-            self.connection_status_frame,
-            text="Connecting to server...",
-            font=("Arial", 14, "bold"),
-            text_color="white",
-        )
-        self.connection_status_label.pack(pady=(0, 10))
-
-    def create_main_display(self):
-        self.middle_frame = ctk.CTkFrame(self, corner_radius=10, fg_color="grey12")
-        self.middle_frame.grid(row=1, column=0, padx=20, pady=10, sticky="nsew")
-
-        self.price_label = ctk.CTkLabel(
-            self.middle_frame,
-            text="£x.xx",
-            font=("Arial", 36, "bold"),
-            text_color="green",
-        )
-        self.price_label.pack(pady=(20, 5))
-
-        self.usage_label = ctk.CTkLabel(
-            self.middle_frame,
-            text="Used so far: xx.xx kWh",
-            font=("Arial", 16),
-            text_color="white",
-        )
-        self.usage_label.pack(pady=(5, 0))
-
-    def create_notice_section(self):
-        self.notice_frame = ctk.CTkFrame(self, corner_radius=10, fg_color="grey17")
-        self.notice_frame.grid(row=2, column=0, padx=20, pady=10, sticky="nsew")
-
-        self.notice_label = ctk.CTkLabel(
-            self.notice_frame,
-            text="No current notices",
-            font=("Arial", 14, "bold"),
-            text_color="white",
-        )
-        self.notice_label.pack(pady=10)
-
-    def update_connection_status(self, status):
-        if status == "connected":
-            self.connection_status_label.configure(
-                text="Connected to server", text_color="green"
-            )
-            self.price_label.configure(text_color="green")
-            logging.info("Connected to blockchain")
-        if status == "error":
-            self.connection_status_label.configure(
-                text="Error: Failed to connect to server. Retrying...",
-                text_color="gold",
-            )
-            self.price_label.configure(text_color="gold")
-            logging.error("Failed to connect to blockchain")
-
-    def update_main_display(self, price, usage):
-        self.price_label.configure(text=f"{price}")
-        self.usage_label.configure(text=f"Used so far: {usage}")
-
-    def update_main_usage(self, usage):
-        self.usage_label.configure(text=f"Used so far: {usage}")
-
-    def update_notice_message(self, message):
-        if message == "":
-            message = "No current notices"
-            self.notice_label.configure(text=message, text_color="white")
-        else:
-            max_width = 60
-            wrapped_message = "\n".join(
-                textwrap.wrap(f"Alert from the grid: {message}", width=max_width)
-            )
-            self.notice_label.configure(text=wrapped_message, text_color="red")
-
-    def update_time(self):
-        current_time = datetime.now().strftime("%H:%M")
-        self.time_label.configure(text=current_time)  # Update the time label
-        self.after(1000, self.update_time)  # Set to update every second
+def __getattr__(name):
+    # SmartMeterUI lives in client/gui.py so customtkinter is only imported when
+    # the GUI is used, it is still reachable from here for older imports
+    if name == "SmartMeterUI":
+        try:
+            from client.gui import SmartMeterUI
+        except Exception as e:
+            from gui import SmartMeterUI
+        return SmartMeterUI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
-    client_number = int(sys.argv[1])
+    # --metrics serves the meter's metrics on METRICS_BASE_PORT + client number
+    arguments = [argument for argument in sys.argv[1:] if argument != "--metrics"]
+    client_number = int(arguments[0])
 
     current_date = datetime.now().strftime("%Y-%m-%d")
     log_filename = f"Electricity-Meter-{client_number}-{current_date}.log"
@@ -461,53 +808,30 @@ if __name__ == "__main__":
         format="%(asctime)s - %(levelname)s - %(message)s",
     )
 
-    private_key = list(ACCOUNTS_DATA["private_keys"].values())[client_number]
-    app = SmartMeterUI()
-    w3, contract = get_contract(app)
-
-    initial_set = generate_existing_readings()
-    store_initial_set(initial_set, private_key=private_key, w3=w3, contract=contract)
+    private_key = get_private_key(client_number)
+    # Optional second argument picks the display: gui (default), terminal or null
+    renderer_name = arguments[1] if len(arguments) > 1 else "gui"
 
-    if w3 and contract:
-        alerts_obj = BlockchainGetAlerts(w3, contract, app)
-        readings_obj = GenerateReadings(private_key, w3, contract, app)
-        bill_obj = BlockchainGetBill(private_key, w3, contract, app)
-        connection_monitor = BlockchainConnectionMonitor(app, w3)
-
-        alert_thread = threading.Thread(
-            target=alerts_obj.start_grid_alert_monitor, daemon=True
-        )
-        readings_thread = threading.Thread(
-            target=readings_obj.start_reading_generator, daemon=True
-        )
-        bill_thread = threading.Thread(target=bill_obj.start_bill_monitor, daemon=True)
-        connection_monitor_thread = threading.Thread(
-            target=connection_monitor.check_connection, daemon=True
-        )
-
-        alert_thread.start()
-        if alert_thread.is_alive():
-            logging.info("Alert thread started successfully.")
-        else:
-            logging.error("Alert thread failed to start.")
-
-        readings_thread.start()
-        if readings_thread.is_alive():
-            logging.info("Readings thread started successfully.")
-        else:
-            logging.error("Readings thread failed to start.")
-
-        bill_thread.start()
-        if bill_thread.is_alive():
-            logging.info("Bill thread started successfully.")
-        else:
-            logging.error("Bill thread failed to start.")
-
-        connection_monitor_thread.start()
-        if connection_monitor_thread.is_alive():
-            logging.info("Connection monitor thread started successfully.")
-        else:
-            logging.error("Connection monitor thread failed to start.")
+    # All background work runs on one event loop, see client/runtime.py
+    try:
+        from client.renderers import create_renderer
+        from client.runtime import ClientRuntime
+    except Exception as e:
+        from renderers import create_renderer
+        from runtime import ClientRuntime
+    try:
+        from client.instrumentation import install_dump_handlers
+        from client.metrics import METRICS_BASE_PORT
+    except Exception as e:
+        from instrumentation import install_dump_handlers
+        from metrics import METRICS_BASE_PORT
+    metrics_port = None
+    if "--metrics" in sys.argv[1:]:
+        metrics_port = METRICS_BASE_PORT + client_number
+    # Per contract method RPC profile, also written on SIGUSR1
+    install_dump_handlers(path=f"Electricity-Meter-{client_number}-rpc-profile.json")
+    renderer = create_renderer(renderer_name)
+    ClientRuntime(renderer, private_key, client_number, metrics_port).start()
 
     logging.info("App started with client number: %s", client_number)
-    app.mainloop()
+    renderer.mainloop()
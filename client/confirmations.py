@@ -0,0 +1,200 @@
+# confirms transactions by following new blocks once per process
+"""
+ConfirmationTracker replaces one wait_for_transaction_receipt polling loop
+per transaction. A single follower walks every new block, matches the block's
+transaction hashes against everything being waited on in one pass and
+resolves the futures of all the waiters, so thousands of pending readings
+cost a few requests per block instead of one request per reading per poll.
+
+Each poll sends at most three requests:
+    - eth_blockNumber
+    - one JSON-RPC batch of eth_getBlockByNumber for the new blocks
+    - one batch of eth_getTransactionReceipt for the matched transactions
+
+A transaction is confirmed once its block is `confirmations` blocks deep,
+1 means as soon as it is mined. Hashes of recent blocks are remembered, so a
+transaction mined before its sender started waiting is still found.
+
+The last block followed is fetched again with the new ones. When its hash has
+changed, or the chain is behind it (Ganache restarted), the remembered hashes
+and receipts are dropped and the tracker follows the chain again from
+START_LOOKBACK blocks back.
+
+The tracker starts on the event loop of its first waiter, waiters must use
+that same loop.
+
+Usage:
+    tracker = ConfirmationTracker.for_web3(w3)
+    receipt = await tracker.wait(tx_hash)
+"""
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+from hexbytes import HexBytes
+
+try:
+    from client.metrics import POLL_ITERATIONS
+except Exception as e:
+    from metrics import POLL_ITERATIONS
+
+CONFIRMATION_DEPTH = 1  # Blocks on top of and including the one holding the transaction
+BLOCK_POLL_INTERVAL = 0.5  # Seconds between checks for new blocks
+MAX_BLOCKS_PER_POLL = 100  # Blocks fetched in one batch when catching up
+START_LOOKBACK = 16  # Blocks before the current one scanned when the tracker starts
+SEEN_TRANSACTIONS = 10000  # Recent transaction hashes remembered for late waiters
+
+
+class ConfirmationTracker:
+    _trackers = {}
+    _trackers_lock = threading.Lock()
+
+    def __init__(
+        self,
+        w3,
+        confirmations=CONFIRMATION_DEPTH,
+        poll_interval=BLOCK_POLL_INTERVAL,
+    ):
+        self.w3 = w3
+        self.confirmations = confirmations
+        self.poll_interval = poll_interval
+        self.pending = {}  # tx hash -> futures of its waiters
+        self.included = {}  # tx hash -> receipt, waiting to be deep enough
+        self.seen = OrderedDict()  # tx hash -> number of the block holding it
+        self.last_block = None
+        self.last_hash = None  # Hash of last_block, to notice it leaving the chain
+        self.requests_sent = 0
+        self.health = None  # ConnectionHealth that pauses polling while the node is down
+        self._task = None
+
+    @classmethod
+    def for_web3(cls, w3, confirmations=CONFIRMATION_DEPTH):
+        # One block follower per provider, shared by every meter using it
+        key = (w3, confirmations)
+        with cls._trackers_lock:
+            tracker = cls._trackers.get(key)
+            if tracker is None:
+                tracker = cls(w3, confirmations)
+                cls._trackers[key] = tracker
+            return tracker
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def wait(self, tx_hash):
+        tx_hash = HexBytes(tx_hash)
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(tx_hash, []).append(future)
+        self.start()
+        try:
+            return await future
+        finally:
+            # Waiters that time out or are cancelled stop being tracked
+            waiters = self.pending.get(tx_hash, [])
+            if future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self.pending[tx_hash]
+                    self.included.pop(tx_hash, None)
+
+    async def run(self):
+        while True:
+            POLL_ITERATIONS["confirmations"] += 1
+            if self.health is not None:
+                await self.health.wait_available()
+            try:
+                behind = await self.poll()
+            except Exception as e:
+                logging.error(e)
+                if self.health is not None:
+                    self.health.record_failure(e)
+                behind = False
+            if not behind:
+                await asyncio.sleep(self.poll_interval)
+
+    async def poll(self):
+        latest = await self._block_number()
+        if self.last_block is not None and latest < self.last_block:
+            logging.warning("Chain is behind block %s, following it again", self.last_block)
+            self.restart()
+        if self.last_block is None:
+            self.last_block = max(-1, latest - START_LOOKBACK)
+        last = min(latest, self.last_block + MAX_BLOCKS_PER_POLL)
+        first = self.last_block + 1
+        if self.last_hash is not None and last > self.last_block:
+            first = self.last_block  # Fetched again to check it is still on the chain
+        blocks = await self._execute_batch(
+            self.w3.eth.get_block, [(number,) for number in range(first, last + 1)]
+        )
+        if first == self.last_block:
+            if HexBytes(blocks[0]["hash"]) != self.last_hash:
+                logging.warning("Block %s changed, following the chain again", first)
+                self.restart()
+                return True
+            blocks = blocks[1:]
+        for block in blocks:
+            for tx_hash in block["transactions"]:
+                self.seen[HexBytes(tx_hash)] = block["number"]
+            self.last_block = block["number"]
+            self.last_hash = HexBytes(block["hash"])
+        while len(self.seen) > SEEN_TRANSACTIONS:
+            self.seen.popitem(last=False)
+
+        matched = [
+            tx_hash
+            for tx_hash in self.pending
+            if tx_hash in self.seen and tx_hash not in self.included
+        ]
+        receipts = await self._execute_batch(
+            self.w3.eth.get_transaction_receipt, [(tx_hash,) for tx_hash in matched]
+        )
+        self.included.update(zip(matched, receipts))
+        self.resolve()
+        return self.last_block < latest
+
+    def restart(self):
+        # Receipts and hashes from the old chain are dropped, waiters stay and
+        # are matched against the blocks of the new one
+        self.last_block = None
+        self.last_hash = None
+        self.seen.clear()
+        self.included.clear()
+
+    def resolve(self):
+        for tx_hash, receipt in list(self.included.items()):
+            if self.last_block - receipt["blockNumber"] + 1 < self.confirmations:
+                continue
+            del self.included[tx_hash]
+            for future in self.pending.pop(tx_hash, []):
+                if not future.done():
+                    future.set_result(receipt)
+
+    async def _block_number(self):
+        self.requests_sent += 1
+        if self.w3.provider.is_async:
+            return await self.w3.eth.block_number
+        # Sync requests block, on a thread the loop keeps running the UI and submissions
+        return await asyncio.to_thread(lambda: self.w3.eth.block_number)
+
+    async def _execute_batch(self, method, args_list):
+        if not args_list:
+            return []
+        self.requests_sent += 1
+        if self.w3.provider.is_async:
+            async with self.w3.batch_requests() as batch:
+                for args in args_list:
+                    batch.add(method(*args))
+                return await batch.async_execute()
+        with self.w3.batch_requests() as batch:
+            for args in args_list:
+                batch.add(method(*args))
+            return await asyncio.to_thread(batch.execute)
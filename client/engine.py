@@ -0,0 +1,283 @@
+# headless engine that runs many simulated meters in one process
+"""
+Drives N meters as coroutines on a single event loop over an async web3
+provider. Each meter reuses GenerateReadings and BlockchainGetBill from the
+GUI client, while grid alerts and the connection check run once for the whole
+process and are fanned out to every meter. One ConnectionHealth (see
+client/health.py) pauses every meter while the node is down and drains their
+queued readings once it is back.
+
+With --metrics-port the engine serves Prometheus and JSON metrics for all of
+its meters under the label meter="engine", see client/metrics.py.
+
+With --coalesce-window each meter sends its readings in one storeMeterReadings
+transaction per window (or per --coalesce-size readings) instead of one each.
+
+Ganache only unlocks 50 accounts, so meters beyond that share accounts.
+
+Usage:
+    python -m client.engine --meters 500 --duration 120
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import time
+
+try:
+    from client.blockchain_client import (
+        DRAIN_BATCH_SIZE,
+        BlockchainGetAlerts,
+        BlockchainGetBill,
+        GenerateReadings,
+    )
+    from client.confirmations import CONFIRMATION_DEPTH, ConfirmationTracker
+    from client.health import ConnectionHealth
+    from client.instrumentation import PROFILE, install_dump_handlers
+    from client.metrics import create_registry, serve_metrics
+    from client.offline_queue import ReadingQueue
+    from client.renderers import MeterDisplay
+    from client.scheduler import FAILED, summarise_latencies
+    from client.parameters import get_account_pairs, get_private_key, load_accounts_data
+    from client.transport import close_async_web3
+except Exception as e:
+    from blockchain_client import (
+        DRAIN_BATCH_SIZE,
+        BlockchainGetAlerts,
+        BlockchainGetBill,
+        GenerateReadings,
+    )
+    from confirmations import CONFIRMATION_DEPTH, ConfirmationTracker
+    from health import ConnectionHealth
+    from instrumentation import PROFILE, install_dump_handlers
+    from metrics import create_registry, serve_metrics
+    from offline_queue import ReadingQueue
+    from renderers import MeterDisplay
+    from scheduler import FAILED, summarise_latencies
+    from parameters import get_account_pairs, get_private_key, load_accounts_data
+    from transport import close_async_web3
+
+
+class MeterEngine:
+
+    def __init__(
+        self,
+        meter_count,
+        min_wait=15,
+        max_wait=60,
+        push_updates=True,
+        local_signing=False,
+        queue_dir=None,
+        coalesce_window=None,
+        coalesce_size=DRAIN_BATCH_SIZE,
+        confirmations=CONFIRMATION_DEPTH,
+        metrics_port=None,
+    ):
+        self.meter_count = meter_count
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.push_updates = push_updates
+        self.local_signing = local_signing
+        self.queue_dir = queue_dir
+        self.coalesce_window = coalesce_window
+        self.coalesce_size = coalesce_size
+        self.confirmations = confirmations
+        self.metrics_port = metrics_port
+        self.displays = []
+        self.readings_objs = []
+        self.connection_status = None
+        self.health = None
+
+    @staticmethod
+    def get_private_key(meter_index):
+        # Account 0 deploys the contract, meters use the others in turn. The runtime
+        # config holds the first meters' keys, the rest come from the accounts file
+        account_pairs = get_account_pairs()
+        if 1 + meter_index < len(account_pairs):
+            return account_pairs[1 + meter_index][1]
+        return get_private_key(1 + meter_index % MeterEngine.meter_accounts())
+
+    @staticmethod
+    def meter_accounts():
+        # Every Ganache account but the deployer's
+        return len(load_accounts_data()["private_keys"]) - 1
+
+    # Process wide alert and connection updates are fanned out to every meter
+    def update_notice_message(self, message):
+        for display in self.displays:
+            display.update_notice_message(message)
+
+    def request_drain(self):
+        for readings_obj in self.readings_objs:
+            readings_obj.request_drain()
+
+    def get_reading_queue(self, meter_index):
+        # In memory unless a directory is given for durable per meter queues
+        if self.queue_dir is None:
+            return ReadingQueue()
+        return ReadingQueue(
+            os.path.join(self.queue_dir, f"meter-{meter_index}.sqlite"), fsync="normal"
+        )
+
+    def update_connection_status(self, status):
+        if status != self.connection_status:
+            logging.warning("Blockchain connection status: %s", status)
+        self.connection_status = status
+        for display in self.displays:
+            display.update_connection_status(status)
+
+    def create_meters(self, w3, contract):
+        if self.meter_count >= len(get_account_pairs()) and (
+            self.meter_count > self.meter_accounts()
+        ):
+            logging.warning(
+                "%s meters share %s accounts, meters on one account share its nonces "
+                "and totals",
+                self.meter_count,
+                self.meter_accounts(),
+            )
+        coroutines = []
+        for meter_index in range(self.meter_count):
+            private_key = self.get_private_key(meter_index)
+            display = MeterDisplay()
+            readings_obj = GenerateReadings(
+                private_key,
+                w3,
+                contract,
+                display,
+                self.min_wait,
+                self.max_wait,
+                self.local_signing,
+                self.get_reading_queue(meter_index),
+                self.coalesce_window,
+                self.coalesce_size,
+                confirmations=self.confirmations,
+                health=self.health,
+            )
+            bill_obj = BlockchainGetBill(
+                private_key,
+                w3,
+                contract,
+                display,
+                push_updates=self.push_updates,
+                health=self.health,
+            )
+            self.displays.append(display)
+            self.readings_objs.append(readings_obj)
+            coroutines.append(readings_obj.run())
+            coroutines.append(bill_obj.bill_monitor())
+        return coroutines
+
+    async def run(self, duration=None):
+        self.health = ConnectionHealth(self, on_reconnect=self.request_drain)
+        w3, contract = await self.health.connect()
+        memory_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        coroutines = self.create_meters(w3, contract)
+        alerts_obj = BlockchainGetAlerts(w3, contract, self, self.health)
+        coroutines.append(alerts_obj.monitor_grid_alerts())
+        coroutines.append(self.health.run())
+        if self.metrics_port is not None:
+            registry = create_registry(
+                {"meter": "engine"},
+                self.health,
+                self.readings_objs,
+                [alerts_obj.subscription],
+            )
+            coroutines.append(serve_metrics(registry, self.metrics_port))
+        tasks = [asyncio.create_task(coroutine) for coroutine in coroutines]
+        logging.warning("Started %s meters", self.meter_count)
+
+        started = time.perf_counter()
+        done, pending = await asyncio.wait(
+            tasks, timeout=duration, return_when=asyncio.FIRST_EXCEPTION
+        )
+        elapsed = time.perf_counter() - started
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            if task.exception() is not None:
+                logging.error(task.exception())
+
+        await ConfirmationTracker.for_web3(w3, self.confirmations).stop()
+        await close_async_web3(w3)
+        memory_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return self.report(elapsed, memory_before, memory_after)
+
+    def report(self, elapsed, memory_before, memory_after):
+        generated = sum(obj.readings_generated for obj in self.readings_objs)
+        stored = sum(obj.store_readings_obj.readings_stored for obj in self.readings_objs)
+        # ru_maxrss is in kilobytes on Linux
+        return {
+            "meters": self.meter_count,
+            "duration_s": round(elapsed, 1),
+            "readings_generated": generated,
+            "readings_stored": stored,
+            "readings_queued": sum(len(obj.reading_queue) for obj in self.readings_objs),
+            "readings_per_second": round(stored / elapsed, 2),
+            "readings_failed": sum(
+                obj.scheduler.counts[FAILED] for obj in self.readings_objs
+            ),
+            "enqueue_to_mined": summarise_latencies(
+                latency
+                for obj in self.readings_objs
+                for latency in obj.scheduler.latencies
+            ),
+            "connection": self.health.stats(),
+            "rpc_profile": PROFILE.snapshot()["methods"],
+            "peak_rss_mb": round(memory_after / 1024, 1),
+            "memory_per_meter_kb": round(
+                (memory_after - memory_before) / self.meter_count, 2
+            ),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run simulated meters headless")
+    parser.add_argument("--meters", type=int, default=12)
+    parser.add_argument("--duration", type=float, default=None)
+    parser.add_argument("--min-wait", type=float, default=15)
+    parser.add_argument("--max-wait", type=float, default=60)
+    parser.add_argument("--poll-bills", action="store_true")
+    parser.add_argument("--local-signing", action="store_true")
+    parser.add_argument("--queue-dir", default=None)
+    parser.add_argument("--coalesce-window", type=float, default=None)
+    parser.add_argument("--coalesce-size", type=int, default=DRAIN_BATCH_SIZE)
+    parser.add_argument("--confirmations", type=int, default=CONFIRMATION_DEPTH)
+    parser.add_argument("--metrics-port", type=int, default=None)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=args.log_level,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    # The report carries the RPC profile, SIGUSR1 logs it while the engine runs
+    install_dump_handlers(at_exit=False)
+    engine = MeterEngine(
+        args.meters,
+        min_wait=args.min_wait,
+        max_wait=args.max_wait,
+        push_updates=not args.poll_bills,
+        local_signing=args.local_signing,
+        queue_dir=args.queue_dir,
+        coalesce_window=args.coalesce_window,
+        coalesce_size=args.coalesce_size,
+        confirmations=args.confirmations,
+        metrics_port=args.metrics_port,
+    )
+    try:
+        report = asyncio.run(engine.run(args.duration))
+    except KeyboardInterrupt:
+        logging.warning("Stopping meter engine")
+        return
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# gap free contract event subscriptions that resume from a saved block cursor
+"""
+Filters made with from_block="latest" lose every event sent while a client is
+restarting or disconnected, and Ganache forgets its filters when it restarts.
+
+EventSubscription reads an event with eth_getLogs over block ranges instead
+of a filter:
+    - the (block, log index) of the last handled log is kept in a
+      BlockCursor, so a restarted client carries on where it stopped
+    - missed blocks are backfilled in chunks of chunk_size blocks, the chunk
+      is halved when a request fails (too many results, timeouts) and doubled
+      again while full chunks succeed, so catching up after a long outage
+      only ever holds one chunk in memory
+    - once caught up the same loop tails new blocks every poll_interval
+    - logs at or before the cursor are skipped, so overlapping ranges and
+      alerts that also came through the relay are handled once
+
+The cursor is saved after each chunk, a process killed part way through a
+chunk handles that chunk's remaining logs again when it restarts.
+
+Works with GridAlert, MeterReadingSubmission or any other contract event.
+
+Usage:
+    subscription = EventSubscription(
+        w3, contract.events.GridAlert, handle_grid_alert, cursor=BlockCursor(path)
+    )
+    await subscription.run()
+"""
+import asyncio
+import inspect
+import logging
+import sqlite3
+import threading
+
+try:
+    from client.metrics import POLL_ITERATIONS
+except Exception as e:
+    from metrics import POLL_ITERATIONS
+
+DEFAULT_CHUNK_SIZE = 1000  # Blocks per eth_getLogs request when a subscription starts
+MIN_CHUNK_SIZE = 1
+MAX_CHUNK_SIZE = 10000
+EVENT_POLL_INTERVAL = 2  # Seconds between checks for new blocks once caught up
+LOG_INDEX_END = 2**31  # Log index meaning every log of the block was handled
+
+
+def log_position(log):
+    return (log["blockNumber"], log["logIndex"])
+
+
+class BlockCursor:
+    """Last handled (block, log index) of each subscription, kept in SQLite"""
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS event_cursors (
+                name TEXT PRIMARY KEY,
+                block_number INTEGER NOT NULL,
+                log_index INTEGER NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    def load(self, name):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT block_number, log_index FROM event_cursors WHERE name = ?",
+                (name,),
+            ).fetchone()
+        return None if row is None else tuple(row)
+
+    def save(self, name, position):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO event_cursors (name, block_number, log_index) "
+                "VALUES (?, ?, ?)",
+                (name, *position),
+            )
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class EventSubscription:
+
+    def __init__(
+        self,
+        w3,
+        event,
+        handler,
+        name=None,
+        cursor=None,
+        argument_filters=None,
+        start_block=None,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        poll_interval=EVENT_POLL_INTERVAL,
+        health=None,
+    ):
+        # handler(log) may be a plain function or a coroutine function
+        self.w3 = w3
+        self.event = event
+        self.handler = handler
+        self.name = name or event.event_name
+        self.cursor = cursor or BlockCursor()
+        self.argument_filters = argument_filters
+        # Without a saved cursor: None starts at the current block, like a
+        # "latest" filter, a number backfills from that block
+        self.start_block = start_block
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        # ConnectionHealth that pauses polling while the node is down
+        self.health = health
+        self.position = self.cursor.load(self.name)
+        self.logs_handled = 0
+        self.duplicates = 0
+        self.requests_sent = 0
+        self.head = None  # Latest block number seen, for the filter lag metric
+        # True while run polls the chain, a meter fed by the alert relay only catches up
+        self.following = False
+
+    def is_handled(self, position):
+        return self.position is not None and tuple(position) <= self.position
+
+    def advance(self, position):
+        # For logs handled outside poll, such as alerts pushed by the relay
+        self.position = tuple(position)
+        self.cursor.save(self.name, self.position)
+
+    def restart(self):
+        # Subclasses that keep state derived from the old chain drop it here
+        self.position = None
+
+    async def run(self):
+        self.following = True
+        try:
+            while True:
+                POLL_ITERATIONS[self.name] += 1
+                if self.health is not None:
+                    await self.health.wait_available()
+                try:
+                    behind = await self.poll()
+                except Exception as e:
+                    logging.error(e)
+                    if self.health is not None:
+                        self.health.record_failure(e)
+                    behind = False
+                if not behind:
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            self.following = False
+
+    async def catch_up(self):
+        while await self.poll():
+            pass
+
+    async def poll(self):
+        head = self.head = await self._block_number()
+        if self.position is not None and self.position[0] > head:
+            # A restarted Ganache starts a new chain below the saved cursor
+            logging.warning(
+                "Chain is behind the %s cursor (%s < %s), starting again",
+                self.name,
+                head,
+                self.position[0],
+            )
+            self.restart()
+        if self.position is None:
+            first = head + 1 if self.start_block is None else self.start_block
+            self.advance((first - 1, LOG_INDEX_END))
+
+        block, log_index = self.position
+        # A block whose logs were only partly handled is read again
+        from_block = block + 1 if log_index == LOG_INDEX_END else block
+        if from_block > head:
+            return False
+        to_block = min(head, from_block + self.chunk_size - 1)
+        try:
+            logs = await self._get_logs(from_block, to_block)
+        except Exception as e:
+            if self.chunk_size == MIN_CHUNK_SIZE:
+                raise e
+            self.chunk_size = max(MIN_CHUNK_SIZE, self.chunk_size // 2)
+            logging.warning(
+                "eth_getLogs for %s failed, retrying with %s blocks: %s",
+                self.name,
+                self.chunk_size,
+                e,
+            )
+            return True
+
+        new_logs = []
+        for log in sorted(logs, key=log_position):
+            if self.is_handled(log_position(log)):
+                self.duplicates += 1
+            else:
+                new_logs.append(log)
+        try:
+            await self.handle_logs(new_logs)
+            self.position = (to_block, LOG_INDEX_END)
+        finally:
+            self.cursor.save(self.name, self.position)
+
+        if to_block - from_block + 1 == self.chunk_size:
+            self.chunk_size = min(MAX_CHUNK_SIZE, self.chunk_size * 2)
+        return to_block < head
+
+    async def handle_logs(self, logs):
+        # Subclasses can handle a whole chunk at once, self.position must end
+        # at the last log that was handled
+        for log in logs:
+            result = self.handler(log)
+            if inspect.isawaitable(result):
+                await result
+            self.position = log_position(log)
+            self.logs_handled += 1
+
+    async def _block_number(self):
+        self.requests_sent += 1
+        if self.w3.provider.is_async:
+            return await self.w3.eth.block_number
+        # Sync requests block, on a thread the loop keeps running every other task
+        return await asyncio.to_thread(lambda: self.w3.eth.block_number)
+
+    async def _get_logs(self, from_block, to_block):
+        self.requests_sent += 1
+        kwargs = dict(
+            argument_filters=self.argument_filters,
+            from_block=from_block,
+            to_block=to_block,
+        )
+        if self.w3.provider.is_async:
+            return await self.event.get_logs(**kwargs)
+        # A large chunk can take a while to come back, keep it off the loop
+        return await asyncio.to_thread(self.event.get_logs, **kwargs)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "head": self.head,
+            "following": self.following,
+            "position": self.position,
+            "chunk_size": self.chunk_size,
+            "logs_handled": self.logs_handled,
+            "duplicates": self.duplicates,
+            "requests_sent": self.requests_sent,
+        }
@@ -0,0 +1,209 @@
+# customtkinter display backend for a smart meter
+"""
+SmartMeterUI is the GUI renderer, see client/renderers.py for the renderer
+interface and the headless backends. customtkinter is imported by this
+module only, so nothing pays for it unless the GUI backend is chosen.
+
+TkDispatcher moves calls from the client runtime thread onto the Tk main
+loop: call() queues from any thread and an after() callback applies the
+queue every UI_DRAIN_INTERVAL milliseconds. Widgets are only touched from
+the thread that owns them, and a burst of changes is drawn once per drain.
+"""
+import logging
+import queue
+import textwrap
+from datetime import datetime
+
+import customtkinter as ctk
+
+try:
+    from client.meter_state import price_text, usage_text
+except Exception as e:
+    from meter_state import price_text, usage_text
+
+UI_DRAIN_INTERVAL = 50  # Milliseconds between applying queued UI updates
+
+
+class TkDispatcher:
+    """Runs calls on the Tk main loop, call() is safe from any thread"""
+
+    def __init__(self, app, interval_ms=UI_DRAIN_INTERVAL):
+        self.app = app
+        self.interval_ms = interval_ms
+        self._calls = queue.SimpleQueue()
+
+    def call(self, function, *args):
+        self._calls.put((function, args))
+
+    def start(self):
+        self.app.after(self.interval_ms, self.drain)
+
+    def drain(self):
+        while True:
+            try:
+                function, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                function(*args)
+            except Exception as e:
+                logging.error(e)
+        self.app.after(self.interval_ms, self.drain)
+
+
+class SmartMeterUI(ctk.CTk):
+    def __init__(self):
+        super().__init__()
+
+        # Appearance and theme
+        self.title("Smart Meter Interface")
+        self.geometry("533x300")
+        # Use native system dark / light mode
+        ctk.set_appearance_mode("system")
+        ctk.set_default_color_theme("blue")
+
+        # Configure Grid layout
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)  # Server Connection status section
+        self.grid_rowconfigure(1, weight=3)  # Main display
+        self.grid_rowconfigure(2, weight=1)  # Outage Notice section
+
+        # Define attributes
+        self.connection_status_frame = None
+        self.connection_status_label = None
+        self.time_label = None
+        self.middle_frame = None
+        self.price_label = None
+        self.usage_label = None
+        self.notice_frame = None
+        self.notice_label = None
+        # Last value shown by each widget, so render only reconfigures what changed
+        self.rendered = {
+            "price": price_text(None),
+            "usage": usage_text(None),
+            "connection_status": None,
+            "alert": "",
+            "time": None,
+        }
+        # Renders from the client runtime thread are applied on the Tk main loop
+        self.dispatcher = TkDispatcher(self)
+
+        self.create_widgets()
+        self.dispatcher.start()
+
+    # Create UI components
+    def create_widgets(self):
+        self.create_connection_status()
+        self.create_main_display()
+        self.create_notice_section()
+        self.update_time()
+
+    def create_connection_status(self):
+        self.connection_status_frame = ctk.CTkFrame(
+            self, corner_radius=10, fg_color="grey17"
+        )
+        self.connection_status_frame.grid(
+            row=0, column=0, padx=20, pady=10, sticky="nsew"
+        )
+
+        self.time_label = ctk.CTkLabel(
+            self.connection_status_frame,
+            text="11:11",
+            font=("Arial", 12),
+            text_color="white",
+        )
+        self.time_label.pack(side="top", anchor="ne", padx=10)
+
+        self.connection_status_label = ctk.CTkLabel(
+            self.connection_status_frame,
+            text="Connecting to server...",
+            font=("Arial", 14, "bold"),
+            text_color="white",
+        )
+        self.connection_status_label.pack(pady=(0, 10))
+
+    def create_main_display(self):
+        self.middle_frame = ctk.CTkFrame(self, corner_radius=10, fg_color="grey12")
+        self.middle_frame.grid(row=1, column=0, padx=20, pady=10, sticky="nsew")
+
+        self.price_label = ctk.CTkLabel(
+            self.middle_frame,
+            text="£x.xx",
+            font=("Arial", 36, "bold"),
+            text_color="green",
+        )
+        self.price_label.pack(pady=(20, 5))
+
+        self.usage_label = ctk.CTkLabel(
+            self.middle_frame,
+            text="Used so far: xx.xx kWh",
+            font=("Arial", 16),
+            text_color="white",
+        )
+        self.usage_label.pack(pady=(5, 0))
+
+    def create_notice_section(self):
+        self.notice_frame = ctk.CTkFrame(self, corner_radius=10, fg_color="grey17")
+        self.notice_frame.grid(row=2, column=0, padx=20, pady=10, sticky="nsew")
+
+        self.notice_label = ctk.CTkLabel(
+            self.notice_frame,
+            text="No current notices",
+            font=("Arial", 14, "bold"),
+            text_color="white",
+        )
+        self.notice_label.pack(pady=10)
+
+    def update_connection_status(self, status):
+        if status == "connected":
+            self.connection_status_label.configure(
+                text="Connected to server", text_color="green"
+            )
+            self.price_label.configure(text_color="green")
+            logging.info("Connected to blockchain")
+        if status == "error":
+            self.connection_status_label.configure(
+                text="Error: Failed to connect to server. Retrying...",
+                text_color="gold",
+            )
+            self.price_label.configure(text_color="gold")
+            logging.error("Failed to connect to blockchain")
+
+    def schedule(self, callback):
+        # Safe from any thread, callback runs on the next dispatcher drain
+        self.dispatcher.call(callback)
+
+    def render(self, view):
+        # view is a MeterState snapshot, see client/meter_state.py
+        price = price_text(view["bill"])
+        if price != self.rendered["price"]:
+            self.price_label.configure(text=price)
+            self.rendered["price"] = price
+        usage = usage_text(view["usage"])
+        if usage != self.rendered["usage"]:
+            self.usage_label.configure(text=usage)
+            self.rendered["usage"] = usage
+        if view["connection_status"] != self.rendered["connection_status"]:
+            self.update_connection_status(view["connection_status"])
+            self.rendered["connection_status"] = view["connection_status"]
+        if view["alert"] != self.rendered["alert"]:
+            self.update_notice_message(view["alert"])
+            self.rendered["alert"] = view["alert"]
+
+    def update_notice_message(self, message):
+        if message == "":
+            message = "No current notices"
+            self.notice_label.configure(text=message, text_color="white")
+        else:
+            max_width = 60
+            wrapped_message = "\n".join(
+                textwrap.wrap(f"Alert from the grid: {message}", width=max_width)
+            )
+            self.notice_label.configure(text=wrapped_message, text_color="red")
+
+    def update_time(self):
+        current_time = datetime.now().strftime("%H:%M")
+        if current_time != self.rendered["time"]:
+            self.time_label.configure(text=current_time)  # Update the time label
+            self.rendered["time"] = current_time
+        self.after(1000, self.update_time)  # Set to update every second
@@ -0,0 +1,181 @@
+# one connection health check per process with backoff and a circuit breaker
+"""
+ConnectionHealth replaces the 5 second is_connected loop of
+BlockchainConnectionMonitor, which only updated a label while every reader
+and writer kept sending requests to a dead node.
+
+One ConnectionHealth is shared by every meter of a process:
+    - connect() retries the first connection with exponential backoff and
+      full jitter, so a meter can start before its node is up
+    - while the circuit is closed the node is probed every probe_interval
+      seconds, or straight away after a caller reports a failure
+    - a failed probe, or failure_threshold reported failures in a row, opens
+      the circuit: wait_available() blocks the bill and alert monitors and
+      new readings stay in the offline queue
+    - while open the node is probed after a backoff delay (half open), once
+      it answers the provider is rebuilt in place, the circuit closes and
+      on_reconnect is called to drain the queued readings
+
+The provider is swapped on the same AsyncWeb3, so contracts and trackers
+made from it keep working without being rebuilt.
+
+    closed -> open -> half_open -> closed
+                   <-
+
+Usage:
+    health = ConnectionHealth(app, on_reconnect=readings_obj.request_drain)
+    w3, contract = await health.connect()
+    asyncio.create_task(health.run())
+"""
+import asyncio
+import logging
+
+try:
+    from client.blockchain_client import get_async_contract
+    from client.metrics import POLL_ITERATIONS
+    from client.scheduler import backoff_delay
+    from client.transport import rebuild_async_web3
+except Exception as e:
+    from blockchain_client import get_async_contract
+    from metrics import POLL_ITERATIONS
+    from scheduler import backoff_delay
+    from transport import rebuild_async_web3
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+PROBE_INTERVAL = 5  # Seconds between probes while the node is reachable
+FAILURE_THRESHOLD = 3  # Reported failures in a row that open the circuit without a probe
+RECONNECT_BASE_DELAY = 1  # Seconds, doubled on every failed reconnect before jitter
+RECONNECT_MAX_DELAY = 60
+
+
+class ConnectionHealth:
+
+    def __init__(
+        self,
+        app,
+        on_reconnect=None,
+        probe_interval=PROBE_INTERVAL,
+        failure_threshold=FAILURE_THRESHOLD,
+        base_delay=RECONNECT_BASE_DELAY,
+        max_delay=RECONNECT_MAX_DELAY,
+    ):
+        # app gets "connected" / "error" through update_connection_status
+        self.app = app
+        self.on_reconnect = on_reconnect
+        self.probe_interval = probe_interval
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.w3 = None
+        self.contract = None
+        self.state = CLOSED
+        self.failures = 0
+        self.attempt = 0
+        self.probes = 0
+        self.opens = 0
+        self.rebinds = 0
+        self._available = asyncio.Event()
+        self._available.set()
+        self._probe_requested = asyncio.Event()
+
+    @property
+    def available(self):
+        return self.state == CLOSED
+
+    async def wait_available(self):
+        await self._available.wait()
+
+    async def connect(self):
+        attempt = 0
+        while True:
+            try:
+                self.w3, self.contract = await get_async_contract(self.app)
+                return self.w3, self.contract
+            except Exception as e:
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                logging.warning("Blockchain not reachable, retrying in %.1fs", delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def record_failure(self, error=None):
+        # Called by readers and writers whose request failed
+        if self.state != CLOSED:
+            return
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.open_circuit(error)
+        else:
+            self._probe_requested.set()
+
+    def open_circuit(self, error=None):
+        if self.state == OPEN:
+            return
+        logging.warning("Blockchain connection lost, pausing requests: %s", error)
+        self.state = OPEN
+        self.opens += 1
+        self.attempt = 0
+        self._available.clear()
+        self.app.update_connection_status("error")
+
+    def close_circuit(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._available.set()
+        self.app.update_connection_status("connected")
+
+    async def probe(self):
+        self.probes += 1
+        try:
+            return bool(await self.w3.is_connected())
+        except Exception:
+            return False
+
+    async def rebind(self):
+        # Fresh keep-alive connections, the old pool may hold sockets to a dead node
+        await rebuild_async_web3(self.w3)
+        self.rebinds += 1
+        logging.warning("Blockchain connection restored")
+        self.close_circuit()
+        if self.on_reconnect is not None:
+            self.on_reconnect()
+
+    async def wait_for_probe(self):
+        try:
+            await asyncio.wait_for(self._probe_requested.wait(), self.probe_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._probe_requested.clear()
+
+    async def run(self):
+        while True:
+            POLL_ITERATIONS["health"] += 1
+            if self.state == CLOSED:
+                await self.wait_for_probe()
+                if await self.probe():
+                    self.failures = 0
+                else:
+                    self.open_circuit("no answer to the connection probe")
+                continue
+            await asyncio.sleep(
+                backoff_delay(self.attempt, self.base_delay, self.max_delay)
+            )
+            self.attempt += 1
+            self.state = HALF_OPEN
+            try:
+                if await self.probe():
+                    await self.rebind()
+                    continue
+            except Exception as e:
+                logging.error(e)
+            self.state = OPEN
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "probes": self.probes,
+            "opens": self.opens,
+            "rebinds": self.rebinds,
+        }
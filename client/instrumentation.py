@@ -0,0 +1,412 @@
+# per contract method profile of every JSON-RPC request a web3 instance sends
+"""
+RpcProfiler is a web3 middleware that times every request and names it after
+the contract function it calls, taken from the 4 byte selector of its
+calldata (getMeterSummary:eth_call, storeMeterReading:eth_sendRawTransaction,
+...). Requests that are not contract calls keep their JSON-RPC method name.
+
+Per name the profile keeps:
+    - a latency histogram, in fixed millisecond buckets
+    - calldata bytes sent and return data bytes received
+    - error counts by class, raised exceptions by their type and JSON-RPC
+      errors as ContractLogicError (reverts) or RPCError
+    - for transactions, a gasUsed histogram and the mean gasUsed of every
+      GAS_WINDOW receipts, so drift shows as the readings pile up
+
+gasUsed comes from the receipts the client fetches anyway (the confirmation
+tracker's batches or wait_for_transaction_receipt), matched to the method by
+the hash the send returned. Requests in a JSON-RPC batch share the batch's
+round trip time.
+
+Buckets are allocated once per name, so a request only bumps counters. One
+PROFILE is shared by every web3 made in client/transport.py, dump it with
+PROFILE.dump(), by sending the process SIGUSR1 or when it exits (see
+install_dump_handlers).
+
+Importing this module does not import web3 or eth_utils, or read the
+contract ABI: the selectors are made on the first request and RpcProfiler,
+a web3 middleware class, is made the first time it is used.
+
+Usage:
+    w3.middleware_onion.add(RpcProfiler.build(PROFILE))
+    print(PROFILE.snapshot())
+"""
+import atexit
+import json
+import logging
+import signal
+import threading
+import time
+from bisect import bisect_left
+from functools import cache
+
+try:
+    from client.parameters import get_contract_abi
+except Exception as e:
+    from parameters import get_contract_abi
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+GAS_BUCKETS = (25000, 50000, 75000, 100000, 150000, 200000, 300000, 500000, 1000000)
+GAS_WINDOW = 100  # Receipts per gasUsed mean kept for drift
+GAS_WINDOWS_KEPT = 200  # Most recent window means kept per method
+PENDING_TRANSACTIONS = 10000  # Sent transactions remembered until their receipt arrives
+CALLDATA_METHODS = ("eth_call", "eth_estimateGas", "eth_sendTransaction")
+SEND_METHODS = ("eth_sendTransaction", "eth_sendRawTransaction")
+RECEIPT_METHOD = "eth_getTransactionReceipt"
+
+
+class Histogram:
+    """Counts per fixed upper bound, the last count is everything above the bounds"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def snapshot(self):
+        return {
+            "buckets": {
+                str(bound): count for bound, count in zip(self.bounds, self.counts)
+            },
+            "over": self.counts[-1],
+            "count": sum(self.counts),
+            "sum": round(self.total, 3),
+        }
+
+
+class MethodStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.errors = {}
+        self.gas = None
+        self.gas_windows = None
+        self._window_gas = 0
+        self._window_count = 0
+
+    def record_gas(self, gas_used):
+        if self.gas is None:
+            self.gas = Histogram(GAS_BUCKETS)
+            self.gas_windows = []
+        self.gas.observe(gas_used)
+        self._window_gas += gas_used
+        self._window_count += 1
+        if self._window_count == GAS_WINDOW:
+            self.gas_windows.append(round(self._window_gas / GAS_WINDOW))
+            del self.gas_windows[:-GAS_WINDOWS_KEPT]
+            self._window_gas = 0
+            self._window_count = 0
+
+    def snapshot(self):
+        stats = {
+            "calls": self.calls,
+            "errors": dict(self.errors),
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "latency_ms": self.latency_ms.snapshot(),
+        }
+        if self.gas is not None:
+            stats["gas_used"] = self.gas.snapshot()
+            stats["gas_used_windows"] = list(self.gas_windows)
+        return stats
+
+
+class Profile:
+    """Stats of every profiled request in the process, by method name"""
+
+    def __init__(self, abi=None):
+        self.abi = abi  # The contract's ABI when None
+        self.methods = {}
+        self.selectors = None  # selector -> {JSON-RPC method: profile name}
+        self.pending = {}  # sent transaction hash -> method name, until its receipt
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def get_selectors(self):
+        # Made on the first request rather than when the profile is created
+        if self.selectors is None:
+            from eth_utils import function_abi_to_4byte_selector
+
+            selectors = {}
+            for entry in self.abi if self.abi is not None else get_contract_abi():
+                if entry.get("type") == "function":
+                    selector = "0x" + function_abi_to_4byte_selector(entry).hex()
+                    # Names are made once here rather than on every request
+                    selectors[selector] = {
+                        method: f"{entry['name']}:{method}"
+                        for method in CALLDATA_METHODS + ("eth_sendRawTransaction",)
+                    }
+            self.selectors = selectors
+        return self.selectors
+
+    def name(self, method, params):
+        # Contract function behind the request, or the JSON-RPC method
+        try:
+            if method in CALLDATA_METHODS:
+                data = params[0].get("data") or params[0].get("input") or ""
+                return self.get_selectors()[data[:10]][method], len(data) // 2 - 1
+            if method == "eth_sendRawTransaction":
+                selector, size = raw_transaction_data(params[0])
+                return self.get_selectors()[selector][method], size
+        except Exception:
+            pass
+        return method, 0
+
+    def stats(self, name):
+        stats = self.methods.get(name)
+        if stats is None:
+            stats = self.methods[name] = MethodStats()
+        return stats
+
+    def record(self, name, method, request_bytes, response, elapsed):
+        with self._lock:
+            stats = self.stats(name)
+            stats.calls += 1
+            stats.request_bytes += request_bytes
+            stats.latency_ms.observe(elapsed * 1000)
+            error = response.get("error") if isinstance(response, dict) else None
+            if error is not None:
+                message = error.get("message", "") if isinstance(error, dict) else error
+                if "revert" in str(message):
+                    self.count_error(stats, "ContractLogicError")
+                else:
+                    self.count_error(stats, "RPCError")
+                return
+            result = response.get("result") if isinstance(response, dict) else None
+            if isinstance(result, str):
+                stats.response_bytes += len(result) // 2 - 1
+            if result is None:
+                return
+            if method in SEND_METHODS:
+                if len(self.pending) >= PENDING_TRANSACTIONS:
+                    del self.pending[next(iter(self.pending))]
+                self.pending[hash_key(result)] = name
+            elif method == RECEIPT_METHOD:
+                self.record_receipt(result)
+
+    def record_receipt(self, receipt):
+        name = self.pending.pop(hash_key(receipt["transactionHash"]), None)
+        if name is None:
+            return
+        stats = self.stats(name)
+        stats.record_gas(to_int(receipt["gasUsed"]))
+        if to_int(receipt.get("status", 1)) == 0:
+            self.count_error(stats, "Reverted")
+
+    def record_exception(self, name, error, elapsed):
+        with self._lock:
+            stats = self.stats(name)
+            stats.calls += 1
+            stats.latency_ms.observe(elapsed * 1000)
+            self.count_error(stats, type(error).__name__)
+
+    @staticmethod
+    def count_error(stats, error_class):
+        stats.errors[error_class] = stats.errors.get(error_class, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "since": self.started,
+                "methods": {
+                    name: stats.snapshot()
+                    for name, stats in sorted(self.methods.items())
+                },
+            }
+
+    def dump(self, path=None):
+        snapshot = self.snapshot()
+        if path is None:
+            logging.warning("RPC profile: %s", json.dumps(snapshot))
+            return
+        with open(path, "w") as f:
+            json.dump(snapshot, f, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self.methods.clear()
+            self.pending.clear()
+            self.started = time.time()
+
+
+def raw_transaction_data(raw_transaction):
+    # Selector and calldata size of a signed legacy, EIP-2930 or EIP-1559
+    # transaction, read from the RLP headers without decoding or copying it
+    if isinstance(raw_transaction, str):
+        start = 2 if raw_transaction[:2] in ("0x", "0X") else 0
+
+        def byte_at(index):
+            return int(raw_transaction[start + 2 * index : start + 2 * index + 2], 16)
+
+    else:
+        byte_at = raw_transaction.__getitem__
+    if byte_at(0) >= 0xC0:
+        position, fields = 0, 5  # nonce, gasPrice, gas, to, value
+    else:
+        # chainId and, since EIP-1559, the priority fee come first
+        position, fields = 1, 6 if byte_at(0) == 1 else 7
+    position = rlp_item(byte_at, position)[0]  # Into the transaction's list
+    for _field in range(fields):
+        position = sum(rlp_item(byte_at, position))
+    position, length = rlp_item(byte_at, position)
+    selector = "0x" + "".join(
+        f"{byte_at(index):02x}" for index in range(position, position + min(length, 4))
+    )
+    return selector, length
+
+
+def rlp_item(byte_at, position):
+    # Offset and length of the payload of the RLP item at position
+    prefix = byte_at(position)
+    if prefix < 0x80:
+        return position, 1
+    if prefix <= 0xB7:
+        return position + 1, prefix - 0x80
+    if prefix < 0xC0:
+        length_size = prefix - 0xB7
+    elif prefix <= 0xF7:
+        return position + 1, prefix - 0xC0
+    else:
+        length_size = prefix - 0xF7
+    length = 0
+    for index in range(position + 1, position + 1 + length_size):
+        length = length << 8 | byte_at(index)
+    return position + 1 + length_size, length
+
+
+def hash_key(tx_hash):
+    if isinstance(tx_hash, (bytes, bytearray)):
+        return tx_hash.hex()
+    return tx_hash.lower().removeprefix("0x")
+
+
+def to_int(value):
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+@cache
+def rpc_profiler_class():
+    # Made on first use, so importing this module does not import web3
+    from eth_utils.toolz import curry
+    from web3.middleware.base import Web3MiddlewareBuilder
+
+    class RpcProfiler(Web3MiddlewareBuilder):
+        profile = None
+
+        @staticmethod
+        @curry
+        def build(profile, w3):
+            middleware = RpcProfiler(w3)
+            middleware.profile = profile
+            return middleware
+
+        def wrap_make_request(self, make_request):
+            profile = self.profile
+
+            def middleware(method, params):
+                name, request_bytes = profile.name(method, params)
+                started = time.perf_counter()
+                try:
+                    response = make_request(method, params)
+                except Exception as e:
+                    profile.record_exception(name, e, time.perf_counter() - started)
+                    raise e
+                elapsed = time.perf_counter() - started
+                profile.record(name, method, request_bytes, response, elapsed)
+                return response
+
+            return middleware
+
+        def wrap_make_batch_request(self, make_batch_request):
+            profile = self.profile
+
+            def middleware(requests_info):
+                started = time.perf_counter()
+                responses = make_batch_request(requests_info)
+                elapsed = time.perf_counter() - started
+                record_batch(profile, requests_info, responses, elapsed)
+                return responses
+
+            return middleware
+
+        async def async_wrap_make_request(self, make_request):
+            profile = self.profile
+
+            async def middleware(method, params):
+                name, request_bytes = profile.name(method, params)
+                started = time.perf_counter()
+                try:
+                    response = await make_request(method, params)
+                except Exception as e:
+                    profile.record_exception(name, e, time.perf_counter() - started)
+                    raise e
+                elapsed = time.perf_counter() - started
+                profile.record(name, method, request_bytes, response, elapsed)
+                return response
+
+            return middleware
+
+        async def async_wrap_make_batch_request(self, make_batch_request):
+            profile = self.profile
+
+            async def middleware(requests_info):
+                started = time.perf_counter()
+                responses = await make_batch_request(requests_info)
+                elapsed = time.perf_counter() - started
+                record_batch(profile, requests_info, responses, elapsed)
+                return responses
+
+            return middleware
+
+    return RpcProfiler
+
+
+def record_batch(profile, requests_info, responses, elapsed):
+    # A failed batch comes back as one error response for all of its requests
+    if not isinstance(responses, list):
+        responses = [responses] * len(requests_info)
+    for (method, params), response in zip(requests_info, responses):
+        name, request_bytes = profile.name(method, params)
+        profile.record(name, method, request_bytes, response, elapsed)
+
+
+PROFILE = Profile()
+
+
+def instrument(w3, profile=PROFILE):
+    w3.middleware_onion.add(rpc_profiler_class().build(profile), name="rpc_profiler")
+    return w3
+
+
+def __getattr__(name):
+    if name == "RpcProfiler":
+        return rpc_profiler_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def install_dump_handlers(profile=PROFILE, path=None, at_exit=True):
+    # Dumps the profile on SIGUSR1 and when the process exits, call from the main thread
+    if at_exit:
+        atexit.register(profile.dump, path)
+    if hasattr(signal, "SIGUSR1"):
+        # The handler runs on the main thread, which may be holding the profile's
+        # lock in record(), so it only wakes a thread that does the dump
+        requested = threading.Event()
+
+        def dump_when_requested():
+            while True:
+                requested.wait()
+                requested.clear()
+                profile.dump(path)
+
+        threading.Thread(
+            target=dump_when_requested, name="rpc-profile-dump", daemon=True
+        ).start()
+        signal.signal(signal.SIGUSR1, lambda _signum, _frame: requested.set())
@@ -0,0 +1,95 @@
+# what a meter shows, kept apart from the widgets that show it
+"""
+MeterState is the single source of truth for a meter's bill, usage,
+connection status and grid alert. The blockchain classes update it with
+numbers and never read anything back from the widgets.
+
+RenderScheduler listens to a MeterState and coalesces any number of changes
+into at most one render per frame: the first change schedules a render and
+later changes before it runs only ride along. The renderer is given a
+snapshot of the state and reconfigures only the widgets whose value changed.
+
+Usage:
+    state = MeterState()
+    RenderScheduler(state, app.render, dispatcher.call)
+    state.set_bill(12.34, 56.1)
+"""
+import threading
+
+STATE_FIELDS = ("bill", "billed_usage", "usage", "connection_status", "alert")
+
+
+def price_text(bill):
+    return "£x.xx" if bill is None else f"£{bill:.2f}"
+
+
+def usage_text(usage):
+    return "Used so far: xx.xx kWh" if usage is None else f"Used so far: {usage:.2f} kWh"
+
+
+class MeterState:
+
+    def __init__(self):
+        self.bill = None  # pounds
+        self.billed_usage = None  # kWh covered by the bill on the blockchain
+        self.usage = None  # kWh shown, includes readings not billed yet
+        self.connection_status = None
+        self.alert = ""
+        self._listeners = []
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def update(self, **changes):
+        changed = {
+            field: value
+            for field, value in changes.items()
+            if getattr(self, field) != value
+        }
+        for field, value in changed.items():
+            setattr(self, field, value)
+        if changed:
+            for listener in self._listeners:
+                listener(changed)
+        return changed
+
+    def set_bill(self, bill, billed_usage, usage=None):
+        self.update(
+            bill=bill,
+            billed_usage=billed_usage,
+            usage=billed_usage if usage is None else usage,
+        )
+
+    def record_reading(self, reading):
+        # Shown straight away, the bill catches up once the reading is stored
+        if self.usage is not None:
+            self.update(usage=self.usage + reading)
+
+    def snapshot(self):
+        return {field: getattr(self, field) for field in STATE_FIELDS}
+
+
+class RenderScheduler:
+
+    def __init__(self, state, render, schedule):
+        # schedule(callback) runs callback on the next frame of the UI thread
+        self.state = state
+        self.render = render
+        self.schedule = schedule
+        self.renders = 0
+        self._pending = False
+        self._lock = threading.Lock()
+        state.subscribe(self.invalidate)
+
+    def invalidate(self, _changed=None):
+        with self._lock:
+            if self._pending:
+                return
+            self._pending = True
+        self.schedule(self.flush)
+
+    def flush(self):
+        with self._lock:
+            self._pending = False
+        self.renders += 1
+        self.render(self.state.snapshot())
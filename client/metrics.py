@@ -0,0 +1,458 @@
+# local Prometheus text and JSON metrics endpoint for meters and the server
+"""
+MetricsServer serves GET /metrics (Prometheus text format) and
+GET /metrics.json from a daemon thread with the standard library HTTP
+server, so scrapes never run on a meter's event loop.
+
+Nothing is worked out until a scrape comes in. The collectors read counters
+the meters already keep (scheduler counts, offline queue length, connection
+health, the RPC profile of client/instrumentation.py) and the two added
+here:
+    - POLL_ITERATIONS, bumped once per pass of every polling loop
+    - LoopLagMonitor, how late a sleep on the event loop wakes up
+
+Every meter serves on METRICS_BASE_PORT + its client number and the server
+on METRICS_BASE_PORT, with a meter label on every sample. One scraper can
+read them all from the aggregator, which fetches every port when it is
+scraped and serves each metric family once with the samples of every target,
+labelled by meter, and a meter_up gauge per target:
+
+    python -m client.metrics aggregate --meters 12
+
+Usage:
+    registry = create_registry({"meter": "3"}, health, [readings_obj])
+    await serve_metrics(registry, METRICS_BASE_PORT + 3)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from client.instrumentation import PROFILE, Histogram
+except Exception as e:
+    from instrumentation import PROFILE, Histogram
+
+METRICS_HOST = "127.0.0.1"
+METRICS_BASE_PORT = 9100  # The server's port, meter n serves on METRICS_BASE_PORT + n
+AGGREGATOR_PORT = 9099
+LOOP_LAG_INTERVAL = 0.5  # Seconds between event loop lag samples
+LOOP_LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+SCRAPE_TIMEOUT = 2  # Seconds the aggregator waits for each target
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Polling loops bump their own name once per pass, e.g. POLL_ITERATIONS["bill"] += 1
+POLL_ITERATIONS = Counter()
+
+
+class Metric:
+    """One metric family, samples are (name suffix, labels, value)"""
+
+    def __init__(self, name, kind, help_text, samples=None):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.samples = samples if samples is not None else []
+
+    def add(self, value, suffix="", **labels):
+        self.samples.append((suffix, labels, value))
+        return self
+
+    def add_histogram(self, histogram, **labels):
+        # histogram is a Histogram snapshot, Prometheus buckets are cumulative
+        cumulative = 0
+        for bound, count in histogram["buckets"].items():
+            cumulative += count
+            self.add(cumulative, "_bucket", **labels, le=bound)
+        self.add(histogram["count"], "_bucket", **labels, le="+Inf")
+        self.add(histogram["sum"], "_sum", **labels)
+        self.add(histogram["count"], "_count", **labels)
+        return self
+
+
+class MetricsRegistry:
+
+    def __init__(self, const_labels=None):
+        # Labels added to every sample, such as the meter number
+        self.const_labels = const_labels or {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, collector):
+        # collector() returns a list of Metric, it runs on the HTTP thread
+        with self._lock:
+            self.collectors.append(collector)
+        return collector
+
+    def collect(self):
+        with self._lock:
+            collectors = list(self.collectors)
+        metrics = []
+        for collector in collectors:
+            metrics.extend(collector())
+        return metrics
+
+    def render_prometheus(self):
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples:
+                labels = {**self.const_labels, **labels}
+                lines.append(f"{metric.name}{suffix}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def render_json(self):
+        return json.dumps(
+            {
+                "labels": self.const_labels,
+                "metrics": {
+                    metric.name: [
+                        {"name": metric.name + suffix, "labels": labels, "value": value}
+                        for suffix, labels, value in metric.samples
+                    ]
+                    for metric in self.collect()
+                },
+            }
+        )
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = (f'{key}="{escape(value)}"' for key, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsServer:
+
+    def __init__(self, registry, port, host=METRICS_HOST):
+        self.registry = registry
+        self.address = (host, port)
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    send(self, registry.render_prometheus(), PROMETHEUS_CONTENT_TYPE)
+                elif self.path == "/metrics.json":
+                    send(self, registry.render_json(), "application/json")
+                else:
+                    self.send_error(404)
+
+            def log_message(self, *args):
+                # Scrapes every few seconds would fill the meter's log
+                pass
+
+        self.httpd = ThreadingHTTPServer(self.address, Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def send(handler, body, content_type):
+    body = body.encode()
+    handler.send_response(200)
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a sleep that should take interval seconds"""
+
+    def __init__(self, interval=LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.lag_ms = Histogram(LOOP_LAG_BUCKETS_MS)
+        self.last_lag_ms = 0
+        self.max_lag_ms = 0
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0, (time.perf_counter() - started - self.interval) * 1000)
+            self.lag_ms.observe(lag_ms)
+            self.last_lag_ms = round(lag_ms, 3)
+            self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+
+    def collect(self):
+        return [
+            Metric(
+                "meter_event_loop_lag_ms",
+                "histogram",
+                "How late the event loop woke a sleep up",
+            ).add_histogram(self.lag_ms.snapshot()),
+            Metric(
+                "meter_event_loop_lag_max_ms", "gauge", "Worst event loop lag seen"
+            ).add(self.max_lag_ms),
+        ]
+
+
+def rpc_collector(profile=PROFILE):
+    # Latency, bytes, errors and gasUsed per contract method from the RPC profile
+    def collect():
+        latency = Metric(
+            "meter_rpc_latency_ms", "histogram", "JSON-RPC round trip per method"
+        )
+        requests = Metric("meter_rpc_requests_total", "counter", "Requests per method")
+        errors = Metric("meter_rpc_errors_total", "counter", "Failed requests by class")
+        sent = Metric("meter_rpc_request_bytes_total", "counter", "Calldata bytes sent")
+        received = Metric(
+            "meter_rpc_response_bytes_total", "counter", "Return data bytes received"
+        )
+        gas = Metric("meter_rpc_gas_used", "histogram", "gasUsed per transaction")
+        for method, stats in profile.snapshot()["methods"].items():
+            latency.add_histogram(stats["latency_ms"], method=method)
+            requests.add(stats["calls"], method=method)
+            for error_class, count in stats["errors"].items():
+                errors.add(count, method=method, error=error_class)
+            sent.add(stats["request_bytes"], method=method)
+            received.add(stats["response_bytes"], method=method)
+            if "gas_used" in stats:
+                gas.add_histogram(stats["gas_used"], method=method)
+        return [latency, requests, errors, sent, received, gas]
+
+    return collect
+
+
+def poll_collector(iterations=POLL_ITERATIONS):
+    def collect():
+        metric = Metric(
+            "meter_poll_iterations_total", "counter", "Passes of each polling loop"
+        )
+        for loop_name, count in sorted(iterations.items()):
+            metric.add(count, loop=loop_name)
+        return [metric]
+
+    return collect
+
+
+def readings_collector(readings_objs):
+    # readings_objs is every GenerateReadings of the process, summed
+    def collect():
+        generated = stored = confirmed = failed = queued = in_flight = waiting = 0
+        for obj in readings_objs:
+            scheduler = obj.scheduler.stats()
+            generated += obj.readings_generated
+            stored += obj.store_readings_obj.readings_stored
+            confirmed += scheduler["mined"]
+            failed += scheduler["failed"]
+            queued += len(obj.reading_queue)
+            in_flight += scheduler["in_flight"]
+            waiting += scheduler["queue_depth"]
+        return [
+            Metric("meter_readings_generated_total", "counter", "Readings generated").add(
+                generated
+            ),
+            Metric(
+                "meter_readings_stored_total", "counter", "Readings sent to the contract"
+            ).add(stored),
+            Metric(
+                "meter_readings_confirmed_total", "counter", "Readings seen mined"
+            ).add(confirmed),
+            Metric(
+                "meter_readings_failed_total", "counter", "Readings given up on"
+            ).add(failed),
+            Metric("meter_backlog_readings", "gauge", "Readings not yet on chain")
+            .add(queued, queue="offline")
+            .add(waiting, queue="scheduler")
+            .add(in_flight, queue="in_flight"),
+        ]
+
+    return collect
+
+
+def subscription_collector(subscriptions):
+    # Blocks between the chain head and the last block each event follower read.
+    # Only followers polling the chain are exported, a meter fed by the alert relay
+    # never reads the head again and its lag would only grow
+    def collect():
+        lag = Metric(
+            "meter_event_filter_lag_blocks", "gauge", "Head minus the handled block"
+        )
+        for subscription in subscriptions:
+            stats = subscription.stats()
+            if not stats["following"]:
+                continue
+            if stats["head"] is not None and stats["position"] is not None:
+                lag.add(
+                    max(0, stats["head"] - stats["position"][0]), event=stats["name"]
+                )
+        return [lag]
+
+    return collect
+
+
+def health_collector(health):
+    def collect():
+        stats = health.stats()
+        state = Metric("meter_connection_state", "gauge", "Circuit breaker state")
+        for name in ("closed", "open", "half_open"):
+            state.add(int(stats["state"] == name), state=name)
+        transitions = Metric(
+            "meter_connection_transitions_total", "counter", "Circuit state changes"
+        )
+        transitions.add(stats["opens"], to="open").add(stats["rebinds"], to="closed")
+        probes = Metric("meter_connection_probes_total", "counter", "Health probes sent")
+        return [state, transitions, probes.add(stats["probes"])]
+
+    return collect
+
+
+def create_registry(const_labels, health=None, readings_objs=(), subscriptions=()):
+    # The collectors every meter process serves, loop lag is added by the caller
+    registry = MetricsRegistry(const_labels)
+    registry.register(rpc_collector())
+    registry.register(poll_collector())
+    if readings_objs:
+        registry.register(readings_collector(readings_objs))
+    if subscriptions:
+        registry.register(subscription_collector(subscriptions))
+    if health is not None:
+        registry.register(health_collector(health))
+    return registry
+
+
+async def serve_metrics(registry, port, host=METRICS_HOST):
+    # Run next to a meter's other coroutines, it samples the lag of their loop
+    monitor = LoopLagMonitor()
+    registry.register(monitor.collect)
+    server = MetricsServer(registry, port, host).start()
+    logging.info("Serving metrics on http://%s:%s/metrics", host, server.port)
+    try:
+        await monitor.run()
+    finally:
+        server.stop()
+
+
+class Aggregator:
+    """Serves the samples of every target in one scrape, fetched when it is scraped"""
+
+    def __init__(self, targets):
+        # targets is {meter label: metrics URL}
+        self.targets = targets
+        self.pool = ThreadPoolExecutor(max_workers=min(32, len(targets)))
+
+    def fetch(self, url):
+        try:
+            with urllib.request.urlopen(url, timeout=SCRAPE_TIMEOUT) as response:
+                return response.read().decode()
+        except Exception:
+            return None
+
+    def render_prometheus(self):
+        bodies = list(self.pool.map(self.fetch, self.targets.values()))
+        # Family name -> its HELP and TYPE lines and the samples of every target,
+        # so each family is written once with all of its samples together
+        families = {
+            "meter_up": (
+                ["# HELP meter_up Whether the target answered", "# TYPE meter_up gauge"],
+                [],
+            )
+        }
+        for meter, body in zip(self.targets, bodies):
+            families["meter_up"][1].append(
+                f'meter_up{{meter="{escape(meter)}"}} {int(body is not None)}'
+            )
+            family = None
+            for line in (body or "").splitlines():
+                if line.startswith("#"):
+                    parts = line.split(" ", 3)
+                    if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                        family = parts[2]
+                        header = families.setdefault(family, ([], []))[0]
+                        if not any(kept.startswith(f"# {parts[1]} ") for kept in header):
+                            header.append(line)
+                    continue
+                if not line.strip():
+                    continue
+                name = line.split("{", 1)[0].split(" ", 1)[0]
+                if family is None or not name.startswith(family):
+                    family = name  # A sample without HELP or TYPE is its own family
+                families.setdefault(family, ([], []))[1].append(
+                    with_meter_label(line, name, meter)
+                )
+        lines = []
+        for header, samples in families.values():
+            lines.extend(header)
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def render_json(self):
+        json_urls = [url + ".json" for url in self.targets.values()]
+        bodies = list(self.pool.map(self.fetch, json_urls))
+        return json.dumps(
+            {
+                meter: json.loads(body) if body is not None else None
+                for meter, body in zip(self.targets, bodies)
+            }
+        )
+
+
+def with_meter_label(sample, name, meter):
+    # Samples from a target that does not label its meter get the target's name
+    labels = sample[len(name) :]
+    if labels.startswith("{"):
+        if labels.startswith('{meter="') or ',meter="' in labels:
+            return sample
+        separator = "" if labels.startswith("{}") else ","
+        return f'{name}{{meter="{escape(meter)}"{separator}{labels[1:]}'
+    return f'{name}{{meter="{escape(meter)}"}}{labels}'
+
+
+def meter_targets(meters, host=METRICS_HOST, base_port=METRICS_BASE_PORT):
+    # The server on the base port and meters 1..meters after it
+    return {
+        ("server" if number == 0 else str(number)): (
+            f"http://{host}:{base_port + number}/metrics"
+        )
+        for number in range(meters + 1)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve every meter's metrics together")
+    commands = parser.add_subparsers(dest="command", required=True)
+    aggregate = commands.add_parser("aggregate")
+    aggregate.add_argument("--meters", type=int, default=12)
+    aggregate.add_argument("--port", type=int, default=AGGREGATOR_PORT)
+    aggregate.add_argument("--base-port", type=int, default=METRICS_BASE_PORT)
+    args = parser.parse_args(argv)
+
+    aggregator = Aggregator(meter_targets(args.meters, base_port=args.base_port))
+    server = MetricsServer(aggregator, args.port)
+    server.start()
+    print(f"Serving {args.meters} meters on http://{METRICS_HOST}:{server.port}/metrics")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
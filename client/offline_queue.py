@@ -0,0 +1,95 @@
+# durable queue of readings waiting to be stored on the blockchain
+"""
+Every generated reading is written here before it is sent and removed once
+the blockchain has accepted it, so readings made while the node is down (or
+when the process crashes) are replayed later instead of being lost.
+
+Readings are keyed by their uid. Appending a uid twice is a no-op, and the
+contract rejects a uid it has already stored, so a replay can never store a
+reading twice.
+
+fsync policies (SQLite synchronous modes):
+    - "always": every append is flushed to disk before it returns
+    - "normal": survives a process crash, may lose the last appends on power loss
+    - "off": leaves flushing to the operating system
+"""
+import sqlite3
+import threading
+import time
+
+MAX_QUEUE_SIZE = 10000  # Readings kept per meter, roughly four days of readings
+FSYNC_POLICIES = {"always": "FULL", "normal": "NORMAL", "off": "OFF"}
+
+
+class ReadingQueueFull(Exception):
+    pass
+
+
+class ReadingQueue:
+
+    def __init__(self, path=":memory:", max_size=MAX_QUEUE_SIZE, fsync="always"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(f"PRAGMA synchronous={FSYNC_POLICIES[fsync]}")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_readings (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                uid TEXT NOT NULL UNIQUE,
+                reading REAL NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+        self._size = self._count()
+
+    def _count(self):
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM pending_readings"
+        ).fetchone()[0]
+
+    def __len__(self):
+        return self._size
+
+    def append(self, uid, reading):
+        with self._lock:
+            if self._size >= self.max_size:
+                raise ReadingQueueFull(
+                    f"Reading queue {self.path} is full ({self.max_size} readings)"
+                )
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO pending_readings (uid, reading, created_at) "
+                "VALUES (?, ?, ?)",
+                (uid, reading, time.time()),
+            )
+            self._connection.commit()
+            self._size += cursor.rowcount
+
+    def peek(self, limit):
+        # Oldest first, so readings reach the chain in the order they were taken
+        with self._lock:
+            return self._connection.execute(
+                "SELECT uid, reading FROM pending_readings ORDER BY seq LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+    def remove(self, uids):
+        if not uids:
+            return
+        with self._lock:
+            cursor = self._connection.executemany(
+                "DELETE FROM pending_readings WHERE uid = ?",
+                [(uid,) for uid in uids],
+            )
+            self._connection.commit()
+            self._size -= cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
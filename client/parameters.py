@@ -1,17 +1,21 @@
 import json 
 import os
+from functools import cache
 from pathlib import Path
 
 COMPILED_CONTRACT_FILE_NAME = 'ElectricityMeterReading.json'
 COTNRACT_ADDRESS_FILE_NAME = 'deployment_config.json'
+RUNTIME_CONFIG_FILE_NAME = 'runtime_config.json'
 CONTRACT_TRUFFLE_COMPILE_DIR = 'blockchain/build/contracts'
 GANACHE_DATA_DIR_PATH = 'docker-config/ganache-data/'
 GANACHE_ACCOUNTS_FILE = 'ganache-accounts.json'
 BLOCKCHAIN_BASE_DIR = 'blockchain'
 BLOCKCHAIN_URL = 'http://127.0.0.1:8545'
+RUNTIME_CONFIG_METERS = 12  # Meters whose keys the runtime config holds, run-clients.sh starts 12
 PARENT_DIR = str(Path(__file__).parents[1])
 CONTRACT_COMPILE_FILE_PATH = os.path.join(PARENT_DIR, CONTRACT_TRUFFLE_COMPILE_DIR, COMPILED_CONTRACT_FILE_NAME)
 CONTRACT_ADDRESS_FILE_PATH = os.path.join(PARENT_DIR, BLOCKCHAIN_BASE_DIR, COTNRACT_ADDRESS_FILE_NAME)
+RUNTIME_CONFIG_FILE_PATH = os.path.join(PARENT_DIR, BLOCKCHAIN_BASE_DIR, RUNTIME_CONFIG_FILE_NAME)
 GANACHE_ACCOUNTS_FILE_PATH = os.path.join(PARENT_DIR, GANACHE_DATA_DIR_PATH, GANACHE_ACCOUNTS_FILE)
 
 def load_json_file(file_path): 
@@ -22,13 +26,101 @@ def load_json_file(file_path):
     except Exception as e: 
         raise e 
 
-CONTRACT_ABI = load_json_file(CONTRACT_COMPILE_FILE_PATH)['abi']
-CONTRACT_ADDRESS = load_json_file(CONTRACT_ADDRESS_FILE_PATH)['address']
-ACCOUNTS_DATA = load_json_file(GANACHE_ACCOUNTS_FILE_PATH)
-first_address = list(ACCOUNTS_DATA['private_keys'].keys())[0]
-first_private_key = ACCOUNTS_DATA['private_keys'][first_address]
+def is_newer(file_path, than_file_path):
+    try:
+        return os.path.getmtime(file_path) > os.path.getmtime(than_file_path)
+    except OSError:
+        return False
 
+# The runtime config holds only the ABI, the address and the hex private keys of the
+# accounts in use (the deployer and the meters, not all 50 Ganache accounts), so a
+# meter starting up reads one small file instead of the Truffle artifact (bytecode,
+# AST, source maps) and the ganache accounts file (key byte buffers).
+# Written after each deployment by write_runtime_config, run-server.sh does it.
+@cache
+def load_runtime_config():
+    # None when missing or older than the deployment, the full files are read instead
+    if not os.path.exists(RUNTIME_CONFIG_FILE_PATH):
+        return None
+    for file_path in (CONTRACT_COMPILE_FILE_PATH, CONTRACT_ADDRESS_FILE_PATH):
+        if is_newer(file_path, RUNTIME_CONFIG_FILE_PATH):
+            return None
+    return load_json_file(RUNTIME_CONFIG_FILE_PATH)
+
+@cache
+def get_contract_abi():
+    config = load_runtime_config()
+    if config is not None:
+        return config['abi']
+    return load_json_file(CONTRACT_COMPILE_FILE_PATH)['abi']
+
+@cache
+def get_contract_address():
+    config = load_runtime_config()
+    if config is not None:
+        return config['address']
+    return load_json_file(CONTRACT_ADDRESS_FILE_PATH)['address']
+
+@cache
+def load_accounts_data():
+    return load_json_file(GANACHE_ACCOUNTS_FILE_PATH)
+
+@cache
 def get_account_pairs():
-    return list(ACCOUNTS_DATA['private_keys'].items())
+    config = load_runtime_config()
+    if config is not None:
+        return list(config['private_keys'].items())
+    return list(load_accounts_data()['private_keys'].items())
+
+def get_private_key(index):
+    account_pairs = get_account_pairs()
+    if index >= len(account_pairs):
+        # A meter beyond those the runtime config was written for
+        account_pairs = list(load_accounts_data()['private_keys'].items())
+    return account_pairs[index][1]
+
+def get_account_addresses():
+    return [address for address, _private_key in get_account_pairs()]
+
+def write_runtime_config(file_path=RUNTIME_CONFIG_FILE_PATH, meters=RUNTIME_CONFIG_METERS):
+    # Keys of accounts 0 (the deployer) to meters only, meter n uses account n.
+    # The engine shares these accounts between its meters, write more for it with --meters
+    account_pairs = list(load_accounts_data()['private_keys'].items())[:meters + 1]
+    config = {
+        'address': load_json_file(CONTRACT_ADDRESS_FILE_PATH)['address'],
+        'abi': load_json_file(CONTRACT_COMPILE_FILE_PATH)['abi'],
+        'private_keys': dict(account_pairs),
+    }
+    # Written whole then renamed, so a meter starting meanwhile never reads half a file
+    temp_file_path = file_path + '.tmp'
+    with open(temp_file_path, 'w') as f:
+        json.dump(config, f, separators=(',', ':'))
+    os.replace(temp_file_path, file_path)
+    load_runtime_config.cache_clear()
+    return file_path
+
+# Loaded on first use instead of at import, so importing this module for
+# BLOCKCHAIN_URL or the paths reads nothing from disk
+LAZY_ATTRIBUTES = {
+    'CONTRACT_ABI': get_contract_abi,
+    'CONTRACT_ADDRESS': get_contract_address,
+    'ACCOUNTS_DATA': load_accounts_data,
+    'first_address': lambda: get_account_pairs()[0][0],
+    'first_private_key': lambda: get_account_pairs()[0][1],
+    'all_account_pairs': get_account_pairs,
+}
+
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES:
+        value = LAZY_ATTRIBUTES[name]()
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if __name__ == '__main__':
+    import argparse
 
-all_account_pairs = get_account_pairs()
+    parser = argparse.ArgumentParser(description='Write the runtime config the meters start from')
+    parser.add_argument('--meters', type=int, default=RUNTIME_CONFIG_METERS)
+    args = parser.parse_args()
+    print(f"Wrote {write_runtime_config(meters=args.meters)}")
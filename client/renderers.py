@@ -0,0 +1,107 @@
+# display backends for a smart meter
+"""
+The blockchain classes only ever talk to a MeterDisplay: its MeterState and
+the update_connection_status / update_notice_message setters. How (or if)
+that state is drawn is up to the renderer behind it.
+
+A renderer implements:
+    - schedule(callback): run callback on the renderer's next frame
+    - render(view): draw a MeterState snapshot
+    - mainloop(): block the main thread while the meter runs
+
+Backends:
+    - "gui": SmartMeterUI from client/gui.py, customtkinter is only imported
+      when this backend is created
+    - "terminal": prints a status line whenever what it shows changes
+    - "null": draws nothing, for load runs and CI
+
+Usage:
+    renderer = create_renderer("terminal")
+    display = MeterDisplay(renderer)
+"""
+import asyncio
+import sys
+import threading
+
+try:
+    from client.meter_state import MeterState, RenderScheduler, price_text, usage_text
+except Exception as e:
+    from meter_state import MeterState, RenderScheduler, price_text, usage_text
+
+RENDERERS = ("gui", "terminal", "null")
+TERMINAL_FRAME = 0.5  # Seconds changes are collected before a status line is printed
+
+
+class MeterDisplay:
+    """The display the blockchain classes update, drawn by renderer if one is given"""
+
+    def __init__(self, renderer=None):
+        self.state = MeterState()
+        self.render_scheduler = None
+        if renderer is not None:
+            self.render_scheduler = RenderScheduler(
+                self.state, renderer.render, renderer.schedule
+            )
+
+    def update_connection_status(self, status):
+        self.state.update(connection_status=status)
+
+    def update_notice_message(self, message):
+        self.state.update(alert=message)
+
+
+class HeadlessRenderer:
+
+    def mainloop(self):
+        # The meter runs on the client runtime thread until the process is stopped
+        threading.Event().wait()
+
+
+class NullRenderer(HeadlessRenderer):
+    """Never renders, a scheduled render is simply dropped"""
+
+    def schedule(self, callback):
+        pass
+
+    def render(self, view):
+        pass
+
+
+class TerminalRenderer(HeadlessRenderer):
+    """Prints one line per change of what a meter shows"""
+
+    def __init__(self, stream=None, frame=TERMINAL_FRAME):
+        self.stream = stream or sys.stdout
+        self.frame = frame
+        self.last_line = None
+
+    def schedule(self, callback):
+        # Called from the client runtime loop, where the state is updated
+        asyncio.get_running_loop().call_later(self.frame, callback)
+
+    def render(self, view):
+        parts = [
+            price_text(view["bill"]),
+            usage_text(view["usage"]),
+            view["connection_status"] or "connecting",
+        ]
+        if view["alert"]:
+            parts.append(f"Alert from the grid: {view['alert']}")
+        line = " | ".join(parts)
+        if line != self.last_line:
+            print(line, file=self.stream, flush=True)
+            self.last_line = line
+
+
+def create_renderer(name="gui"):
+    if name == "gui":
+        try:
+            from client.gui import SmartMeterUI
+        except Exception as e:
+            from gui import SmartMeterUI
+        return SmartMeterUI()
+    if name == "terminal":
+        return TerminalRenderer()
+    if name == "null":
+        return NullRenderer()
+    raise ValueError(f"Unknown renderer: {name}, expected one of {RENDERERS}")
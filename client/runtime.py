@@ -0,0 +1,153 @@
+# runs one meter's background work on a single event loop next to the Tk main loop
+"""
+The GUI client used to start four threads, three of them with their own
+asyncio loop calling SmartMeterUI methods directly, which Tk does not allow.
+
+ClientRuntime instead runs every background task of a meter (readings, bill
+updates, grid alerts and the connection health) as coroutines on one event
+loop in one background thread. The coroutines update the MeterState of a
+MeterDisplay on the loop thread and its RenderScheduler asks the renderer to
+draw, on the renderer's own thread and at most once per frame (see
+client/renderers.py and client/gui.py).
+
+New background work is added as another coroutine in ClientRuntime.run.
+
+Usage:
+    renderer = create_renderer("gui")
+    ClientRuntime(renderer, private_key, client_number).start()
+    renderer.mainloop()
+"""
+import asyncio
+import logging
+import threading
+
+try:
+    from client.alert_relay import RELAY_ADDRESS
+    from client.blockchain_client import (
+        BlockchainGetAlerts,
+        BlockchainGetBill,
+        BlockchainStoreReading,
+        GenerateReadings,
+        generate_existing_readings,
+    )
+    from client.confirmations import ConfirmationTracker
+    from client.event_subscription import BlockCursor
+    from client.health import ConnectionHealth
+    from client.metrics import create_registry, serve_metrics
+    from client.offline_queue import ReadingQueue
+    from client.renderers import MeterDisplay
+    from client.transport import close_async_web3
+except Exception as e:
+    from alert_relay import RELAY_ADDRESS
+    from blockchain_client import (
+        BlockchainGetAlerts,
+        BlockchainGetBill,
+        BlockchainStoreReading,
+        GenerateReadings,
+        generate_existing_readings,
+    )
+    from confirmations import ConfirmationTracker
+    from event_subscription import BlockCursor
+    from health import ConnectionHealth
+    from metrics import create_registry, serve_metrics
+    from offline_queue import ReadingQueue
+    from renderers import MeterDisplay
+    from transport import close_async_web3
+
+
+class ClientRuntime:
+
+    def __init__(self, renderer, private_key, client_number, metrics_port=None):
+        self.renderer = renderer
+        self.private_key = private_key
+        self.client_number = client_number
+        # Serves the meter's metrics on this port when set, see client/metrics.py
+        self.metrics_port = metrics_port
+        self.display = MeterDisplay(renderer)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        logging.info("Client runtime started")
+
+    def _run_loop(self):
+        try:
+            self.loop.run_until_complete(self.run())
+        except Exception as e:
+            logging.error(e)
+
+    async def run(self):
+        # Waits for the node with backoff instead of failing when it is not up yet
+        health = ConnectionHealth(self.display)
+        w3, contract = await health.connect()
+        try:
+            await self.store_initial_set(w3, contract)
+            readings_obj = GenerateReadings(
+                self.private_key,
+                w3,
+                contract,
+                self.display,
+                local_signing=True,
+                reading_queue=ReadingQueue(
+                    f"Electricity-Meter-{self.client_number}-queue.sqlite"
+                ),
+                health=health,
+            )
+            health.on_reconnect = readings_obj.request_drain
+            bill_obj = BlockchainGetBill(
+                self.private_key, w3, contract, self.display, health=health
+            )
+            alerts_obj = BlockchainGetAlerts(
+                w3,
+                contract,
+                self.display,
+                health,
+                relay_address=RELAY_ADDRESS,
+                cursor=BlockCursor(
+                    f"Electricity-Meter-{self.client_number}-events.sqlite"
+                ),
+            )
+            coroutines = [
+                readings_obj.run(),
+                bill_obj.bill_monitor(),
+                alerts_obj.monitor_grid_alerts(),
+                health.run(),
+            ]
+            if self.metrics_port is not None:
+                registry = create_registry(
+                    {"meter": str(self.client_number)},
+                    health,
+                    [readings_obj],
+                    [alerts_obj.subscription],
+                )
+                coroutines.append(serve_metrics(registry, self.metrics_port))
+            await asyncio.gather(*coroutines)
+        finally:
+            await ConfirmationTracker.for_web3(w3).stop()
+            await close_async_web3(w3)
+
+    async def store_initial_set(self, w3, contract):
+        # server/seed.py stores every meter's history in bulk after deployment, a
+        # meter only stores its own when the chain has none for it.
+        # The meter still runs if its starting history could not be stored
+        try:
+            store_readings_obj = BlockchainStoreReading(
+                self.private_key, w3, contract, local_signing=True
+            )
+            _bill, _usage, reading_count, _last_uid = (
+                await contract.functions.getMeterSummary().call(
+                    {"from": store_readings_obj.acc.address}
+                )
+            )
+            if reading_count > 0:
+                logging.info("Found %s readings of history on chain", reading_count)
+                return
+            await store_readings_obj.store_readings(
+                [
+                    (record.get("uuid_"), record.get("reading"))
+                    for record in generate_existing_readings()
+                ]
+            )
+        except Exception as e:
+            logging.error(e)
@@ -0,0 +1,194 @@
+# schedules reading submissions with a bounded number of transactions in flight
+"""
+SubmissionScheduler sends readings through a fixed pool of workers instead of
+one fire and forget task per reading, so a slow node can not pile up open
+requests or memory.
+
+Each reading moves through the states:
+
+    queued -> sent -> mined
+                   -> failed
+
+    - at most max_in_flight readings are being sent or waiting to be mined
+    - at most max_queued readings wait in memory, submit returns False once
+      that is full and the reading stays in the offline queue until
+      on_capacity is called
+    - failed sends are retried with exponential backoff and full jitter
+    - the time from submit to mined is kept for the last LATENCY_SAMPLES
+      readings
+
+Usage:
+    scheduler = SubmissionScheduler(send, confirm)
+    asyncio.create_task(scheduler.run())
+    scheduler.submit(uid, reading)
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import Counter, deque
+
+QUEUED = "queued"
+SENT = "sent"
+MINED = "mined"
+FAILED = "failed"
+
+MAX_IN_FLIGHT = 8  # Readings being sent or waiting for their receipt at once
+MAX_QUEUED = 256  # Readings waiting in memory for a free worker
+MAX_RETRIES = 3  # Resends of a reading before it is marked failed
+RETRY_BASE_DELAY = 1  # Seconds, doubled on every retry before jitter
+RETRY_MAX_DELAY = 30
+LATENCY_SAMPLES = 1000  # Submit to mined latencies kept for the percentiles
+STATE_HISTORY = 1000  # Finished readings whose state is still reported
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    # Exponential backoff with full jitter, so clients that failed together
+    # do not all retry together
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarise_latencies(values):
+    values = list(values)
+
+    def to_ms(seconds):
+        return None if seconds is None else round(seconds * 1000, 2)
+
+    return {
+        "count": len(values),
+        "p50_ms": to_ms(percentile(values, 50)),
+        "p95_ms": to_ms(percentile(values, 95)),
+        "p99_ms": to_ms(percentile(values, 99)),
+        "max_ms": to_ms(max(values) if values else None),
+    }
+
+
+class SubmissionScheduler:
+
+    def __init__(
+        self,
+        send,
+        confirm,
+        final_state=None,
+        on_settled=None,
+        on_capacity=None,
+        max_in_flight=MAX_IN_FLIGHT,
+        max_queued=MAX_QUEUED,
+        max_retries=MAX_RETRIES,
+        retry_base_delay=RETRY_BASE_DELAY,
+    ):
+        # send(uid, reading) returns a tx hash, confirm(tx) returns its receipt
+        self.send = send
+        self.confirm = confirm
+        # final_state(error) gives MINED or FAILED for errors a retry can not fix
+        self.final_state = final_state or (lambda error: None)
+        self.on_settled = on_settled
+        self.on_capacity = on_capacity
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.states = {}
+        self.active = set()
+        self.counts = Counter()
+        self.in_flight = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.backpressure = False
+        self._finished = deque()
+        self._queue = asyncio.Queue(maxsize=max_queued)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def submit(self, uid, reading):
+        if self._queue.full():
+            if not self.backpressure:
+                logging.warning(
+                    "Submission queue full, readings wait in the offline queue"
+                )
+            self.backpressure = True
+            return False
+        self._set_state(uid, QUEUED)
+        self.active.add(uid)
+        self._queue.put_nowait((uid, reading, time.perf_counter()))
+        return True
+
+    def retry_delay(self, attempt):
+        return backoff_delay(attempt, self.retry_base_delay, RETRY_MAX_DELAY)
+
+    async def run(self):
+        await asyncio.gather(*(self._worker() for _ in range(self.max_in_flight)))
+
+    async def _worker(self):
+        while True:
+            uid, reading, enqueued = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await self._process(uid, reading, enqueued)
+            except Exception as e:
+                logging.error(e)
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+            if self.backpressure and self._queue.empty():
+                self.backpressure = False
+                if self.on_capacity is not None:
+                    self.on_capacity()
+
+    async def _process(self, uid, reading, enqueued):
+        for attempt in range(self.max_retries + 1):
+            try:
+                tx = await self.send(uid, reading)
+                self._set_state(uid, SENT)
+                receipt = await self.confirm(tx)
+                if receipt["status"] != 1:
+                    raise Exception(f"Transaction {tx.hex()} reverted")
+            except Exception as e:
+                state = self.final_state(e)
+                if state is not None:
+                    self._finish(uid, state, enqueued, settled=True)
+                    return
+                if attempt == self.max_retries:
+                    logging.warning(
+                        "Reading %s failed after %s attempts: %s", uid, attempt + 1, e
+                    )
+                    self._finish(uid, FAILED, enqueued, settled=False)
+                    return
+                self._set_state(uid, QUEUED)
+                await asyncio.sleep(self.retry_delay(attempt))
+            else:
+                self._finish(uid, MINED, enqueued, settled=True)
+                return
+
+    def _set_state(self, uid, state):
+        self.states[uid] = state
+
+    def _finish(self, uid, state, enqueued, settled):
+        self._set_state(uid, state)
+        self.active.discard(uid)
+        self.counts[state] += 1
+        if state == MINED:
+            self.latencies.append(time.perf_counter() - enqueued)
+        if settled and self.on_settled is not None:
+            self.on_settled(uid)
+        # Only the most recent finished readings keep their state
+        self._finished.append(uid)
+        if len(self._finished) > STATE_HISTORY:
+            self.states.pop(self._finished.popleft(), None)
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "mined": self.counts[MINED],
+            "failed": self.counts[FAILED],
+            "latency": summarise_latencies(self.latencies),
+        }
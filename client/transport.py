@@ -0,0 +1,114 @@
+# shared JSON-RPC transport for the client subsystems and the server
+"""
+Every Web3 instance built here sends its requests through one pooled
+keep-alive HTTP session per endpoint, instead of each provider (and each
+thread using it) opening its own connections.
+
+    - POOL_MAXSIZE persistent connections are kept per host
+    - requests block for a free connection once the pool is in use, which
+      caps concurrency per host
+    - connect and read timeouts are set on every request
+
+web3's default async session closes the connection after every request, so
+get_async_web3 installs a keep-alive aiohttp session with the same limits.
+
+Both add the RpcProfiler middleware, so every request is counted in the
+process wide profile of client/instrumentation.py.
+
+web3, requests and aiohttp are imported by the functions that use them, not
+at import, so a GUI meter shows its window before they load.
+"""
+import threading
+
+try:
+    from client.instrumentation import instrument
+    from client.parameters import BLOCKCHAIN_URL
+except Exception as e:
+    from instrumentation import instrument
+    from parameters import BLOCKCHAIN_URL
+
+POOL_CONNECTIONS = 4  # Number of hosts to keep connection pools for
+POOL_MAXSIZE = 16  # Persistent connections per host, also the per host concurrency limit
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 60
+KEEPALIVE_TIMEOUT = 30  # Seconds an idle async connection is kept open
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(endpoint_uri=BLOCKCHAIN_URL):
+    with _sessions_lock:
+        session = _sessions.get(endpoint_uri)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            adapter = HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                pool_block=True,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[endpoint_uri] = session
+        return session
+
+
+def get_provider(endpoint_uri=BLOCKCHAIN_URL):
+    from web3 import Web3
+
+    return Web3.HTTPProvider(
+        endpoint_uri,
+        request_kwargs={"timeout": (CONNECT_TIMEOUT, READ_TIMEOUT)},
+        session=get_session(endpoint_uri),
+    )
+
+
+def get_web3(endpoint_uri=BLOCKCHAIN_URL):
+    from web3 import Web3
+
+    # Every request is profiled per contract method, see client/instrumentation.py
+    return instrument(Web3(get_provider(endpoint_uri)))
+
+
+async def get_async_provider(endpoint_uri=BLOCKCHAIN_URL):
+    # aiohttp sessions belong to the running event loop so they are not shared
+    # across loops, call close_async_web3 when the loop is done with it
+    from aiohttp import ClientSession, ClientTimeout, TCPConnector
+    from web3 import AsyncWeb3
+
+    timeout = ClientTimeout(total=READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+    session = ClientSession(
+        raise_for_status=True,
+        timeout=timeout,
+        connector=TCPConnector(
+            limit=POOL_MAXSIZE,
+            limit_per_host=POOL_MAXSIZE,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ),
+    )
+    provider = AsyncWeb3.AsyncHTTPProvider(
+        endpoint_uri, request_kwargs={"timeout": timeout}
+    )
+    await provider.cache_async_session(session)
+    return provider
+
+
+async def get_async_web3(endpoint_uri=BLOCKCHAIN_URL):
+    from web3 import AsyncWeb3
+
+    return instrument(AsyncWeb3(await get_async_provider(endpoint_uri)))
+
+
+async def rebuild_async_web3(w3):
+    # Swaps in a fresh provider and connection pool, contracts and filters made
+    # from w3 keep working because they hold w3 rather than the provider
+    old_provider = w3.provider
+    w3.provider = await get_async_provider(old_provider.endpoint_uri)
+    await old_provider.disconnect()
+
+
+async def close_async_web3(w3):
+    await w3.provider.disconnect()
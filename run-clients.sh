@@ -3,6 +3,11 @@
 # Define the static path to the Python Tkinter app
 app_path="./blockchain_client.py"
 
+# One grid alert relay follows the chain for every meter, see client/alert_relay.py
+python3 -m client.alert_relay &
+echo "Started the grid alert relay."
+sleep 1
+
 # Start 10 instances in parallel, each with a unique instance number
 for i in $(seq 1 12); do
     # Run each instance in the background with the instance number as an argument
@@ -19,24 +19,39 @@ check_success "Failed to start Docker Compose."
 sleep 2
 cd ..
 
-echo "Running Truffle migrations..."
-if ! [ -x "$(command -v truffle)" ]; then
-    echo "Truffle is not installed. Please install Truffle and try again."
-    exit 1
-fi
+# Ganache keeps its chain in ganache-data/chain-db, a chain deployed and seeded
+# by an earlier run is used as it is, see server/seed.py
+if python3 -m server.seed check; then
+    echo "Using the deployed and seeded chain from the last run."
+else
+    echo "Running Truffle migrations..."
+    if ! [ -x "$(command -v truffle)" ]; then
+        echo "Truffle is not installed. Please install Truffle and try again."
+        exit 1
+    fi
 
-cd ./blockchain/
-truffle migrate --reset
-check_success "Truffle migration failed."
-cd ../server
+    cd ./blockchain/
+    truffle migrate --reset
+    check_success "Truffle migration failed."
+    cd ..
+
+    # ABI, address and keys in one small file the meters read at startup, see client/parameters.py
+    python3 -m client.parameters
+    check_success "Failed to write the runtime config."
+
+    # Every meter's starting history in bulk, so the clients send no seeding transactions
+    python3 -m server.seed --snapshot
+    check_success "Seeding the meter history failed."
+fi
 
 echo "Starting Python server..."
-if [ ! -f server.py ]; then
+if [ ! -f server/server.py ]; then
     echo "server.py not found."
     exit 1
 fi
 
-python3 server.py
+# Run as a module from the repository root so the server can share client/transport.py
+python3 -m server.server
 check_success "Failed to start server.py."
 
 echo "All processes completed successfully."
@@ -34,6 +34,10 @@ truffle migrate --reset
 check_success "Truffle migration failed."
 cd ..
 
+echo "Installing test dependencies..."
+pip install -r requirements-dev.txt
+check_success "Failed to install test dependencies."
+
 python -m unittest discover -s tests
 
 check_success "Tests failed."
@@ -0,0 +1,309 @@
+# re-bills every meter with time of use or tiered tariffs in vectorized passes
+"""
+The contract bills each reading at a flat cost_per_kwh as it is stored. The
+billing engine works the bills out again on the server from the readings
+indexed by server/indexer.py, so tariffs can depend on the time of day or on
+how much a meter has used, then pushes them back to the chain in bulk.
+
+Readings are loaded into NumPy arrays (meter id, timestamp, scaled kWh) a
+group of meters at a time and every meter of the group is billed in one
+vectorized pass, so memory stays bounded however many meters there are. A
+group is one query on the indexer's packed reading_columns, copied into
+arrays allocated once, so no Python object is made per reading.
+
+Only readings in blocks every reading event has been indexed through are
+billed, and each bill records how many of the meter's readings on chain it
+covers. Only bills of the whole history are pushed, --start and --end are for
+looking at a period.
+
+Scaling is the contract's: readings are kWh * SCALING_FACTOR, rates are
+pence per kWh and bills are pence. Every reading's cost is rounded down like
+the contract does, so TimeOfUseTariff.flat() gives the contract's own bills.
+
+Tariffs:
+    - TimeOfUseTariff: a rate for each half hour of the day
+    - TieredTariff: rates that step up with the kWh a meter used in the period
+
+Bills go back to the chain with setMeterBills, BILL_PUSH_BATCH meters per
+transaction or fewer when the gas estimate is over BILL_PUSH_GAS, together
+with the count of readings each one covers. Readings mined since the
+indexer's last block are past that count, so the contract adds them back at
+its flat rate instead of the new bill dropping them, up to 100 per meter. A
+meter further behind than that is skipped and reported, keeping its running
+bill, while the other bills are still pushed. The contract emits
+MeterBillUpdated for each meter, which the clients already follow, so the new
+bills reach them without extra requests.
+
+Usage:
+    python -m server.billing --db meter-index.sqlite --tariff time-of-use
+    python -m server.billing --db meter-index.sqlite --tariff tiered --push
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+
+from client.transport import get_web3
+from server.indexer import COST_PER_KWH, NO_END, SCALING_FACTOR, ReadingStore
+
+BILL_SCALING_FACTOR = 100  # Bills are stored in pence
+SLOT_SECONDS = 1800  # Time of use rates change every half hour
+SLOTS_PER_DAY = 86400 // SLOT_SECONDS
+METERS_PER_CHUNK = 1000  # Meters loaded into memory and billed together
+BILL_PUSH_BATCH = 500  # Meters per setMeterBills transaction
+BILL_PUSH_GAS = 15000000  # Gas limit of one setMeterBills transaction
+
+# Example tariffs for the command line, rates are pence per kWh
+ECONOMY_7 = [15] * 14 + [28] * 20 + [40] * 8 + [28] * 6  # Cheap nights, 4-8pm peak
+TIERS = [(1000, 18), (3000, 24), (None, 32)]  # kWh per period up to which each rate applies
+
+
+class TimeOfUseTariff:
+
+    def __init__(self, slot_rates, utc_offset=0):
+        # One rate for each half hour from midnight, or each hour (24 rates)
+        rates = np.asarray(slot_rates, dtype=np.int64)
+        if len(rates) == SLOTS_PER_DAY // 2:
+            rates = np.repeat(rates, 2)
+        if len(rates) != SLOTS_PER_DAY:
+            raise ValueError(f"Expected {SLOTS_PER_DAY} half hourly rates, got {len(rates)}")
+        self.rates = rates
+        self.utc_offset = utc_offset
+
+    @classmethod
+    def flat(cls, rate=COST_PER_KWH):
+        return cls([rate] * SLOTS_PER_DAY)
+
+    def costs(self, meter_ids, timestamps, readings):
+        slots = (timestamps + self.utc_offset) % 86400 // SLOT_SECONDS
+        return readings * self.rates[slots] // SCALING_FACTOR
+
+
+class TieredTariff:
+
+    def __init__(self, tiers):
+        # [(kWh limit, rate), ..., (None, rate)], a rate applies to the usage
+        # between the previous limit and its own
+        limits = [
+            np.iinfo(np.int64).max if limit is None else limit * SCALING_FACTOR
+            for limit, _rate in tiers
+        ]
+        if limits != sorted(limits):
+            raise ValueError("Tier limits must go up")
+        self.limits = limits
+        self.rates = [rate for _limit, rate in tiers]
+
+    def costs(self, meter_ids, timestamps, readings):
+        # Each reading is split over the tiers its meter's running usage crosses
+        same_meter = meter_ids[1:] == meter_ids[:-1]
+        in_order = np.all(meter_ids[1:] >= meter_ids[:-1]) and np.all(
+            timestamps[1:][same_meter] >= timestamps[:-1][same_meter]
+        )
+        # BillingEngine.load hands the readings over already sorted, skip the sort then
+        order = slice(None) if in_order else np.lexsort((timestamps, meter_ids))
+        meters = meter_ids[order]
+        usage = readings[order]
+        running = np.cumsum(usage)
+        firsts = np.flatnonzero(np.r_[True, meters[1:] != meters[:-1]])
+        counts = np.diff(np.r_[firsts, len(meters)])
+        after = running - np.repeat(running[firsts] - usage[firsts], counts)
+        before = after - usage
+
+        scaled_cost = np.zeros(len(usage), dtype=np.int64)
+        lower = 0
+        for limit, rate in zip(self.limits, self.rates):
+            in_tier = np.clip(after, lower, limit) - np.clip(before, lower, limit)
+            scaled_cost += in_tier * rate
+            lower = limit
+        costs = np.empty_like(scaled_cost)
+        costs[order] = scaled_cost // SCALING_FACTOR
+        return costs
+
+
+def compute_bills(meter_ids, timestamps, readings, tariff, meter_count):
+    # Bill of every meter id in 0..meter_count-1 from arrays of its readings
+    meter_ids = np.asarray(meter_ids, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    readings = np.asarray(readings, dtype=np.int64)
+    costs = tariff.costs(meter_ids, timestamps, readings)
+    # float64 sums are exact below 2**53 pence
+    return np.bincount(meter_ids, weights=costs, minlength=meter_count).astype(np.int64)
+
+
+class BillingEngine:
+
+    def __init__(self, store, tariff, meters_per_chunk=METERS_PER_CHUNK):
+        self.store = store
+        self.tariff = tariff
+        self.meters_per_chunk = meters_per_chunk
+        self.load_seconds = 0
+        self.compute_seconds = 0
+        # Readings on chain each bill of the last run covers, by meter address
+        self.reading_counts = {}
+
+    def meters(self):
+        return self.store.meters()
+
+    def load(self, meters, start=0, end=None, through_block=None):
+        """
+        (meter ids, timestamps, readings) of the meters' readings mined up to
+        through_block in start <= block time < end, and how many of each meter's
+        readings on chain that covers (those before start included).
+        """
+        end = end or NO_END
+        if through_block is None:
+            through_block = self.store.indexed_block()
+        meter_ids_by_address = {meter: meter_id for meter_id, meter in enumerate(meters)}
+        columns = self.store.reading_columns(meters, start, end, through_block)
+        size = sum(len(column[3]) for column in columns if column[3] is not None) // 8
+        meter_ids = np.empty(size, dtype=np.int64)
+        timestamps = np.empty(size, dtype=np.int64)
+        readings = np.empty(size, dtype=np.int64)
+        counts = np.zeros(len(meters), dtype=np.int64)
+        filled = 0
+        for meter, count, block_numbers, column_timestamps, column_readings in columns:
+            meter_id = meter_ids_by_address[meter]
+            if column_timestamps is None:
+                counts[meter_id] += count
+                continue
+            column_timestamps = np.frombuffer(column_timestamps, dtype=np.int64)
+            # Blocks only go up, so these are a prefix of the meter's readings on chain
+            covered = (np.frombuffer(block_numbers, dtype=np.int64) <= through_block) & (
+                column_timestamps < end
+            )
+            counts[meter_id] += np.count_nonzero(covered)
+            keep = covered & (column_timestamps >= start)
+            kept = filled + np.count_nonzero(keep)
+            meter_ids[filled:kept] = meter_id
+            timestamps[filled:kept] = column_timestamps[keep]
+            readings[filled:kept] = np.frombuffer(column_readings, dtype=np.int64)[keep]
+            filled = kept
+        return meter_ids[:filled], timestamps[:filled], readings[:filled], counts
+
+    def run(self, start=0, end=None):
+        # Bills for the period start <= block time < end, by meter address
+        meters = self.meters()
+        # Fixed for the whole run, so a reading indexed meanwhile is in no bill or count
+        through_block = self.store.indexed_block()
+        bills = {}
+        self.reading_counts = {}
+        for first in range(0, len(meters), self.meters_per_chunk):
+            group = meters[first : first + self.meters_per_chunk]
+            started = time.perf_counter()
+            *arrays, counts = self.load(group, start, end, through_block)
+            loaded = time.perf_counter()
+            group_bills = compute_bills(*arrays, self.tariff, len(group))
+            self.load_seconds += loaded - started
+            self.compute_seconds += time.perf_counter() - loaded
+            bills.update(zip(group, group_bills.tolist()))
+            self.reading_counts.update(zip(group, counts.tolist()))
+        return bills
+
+
+def push_bills(w3, contract, bills, reading_counts, owner, batch_size=BILL_PUSH_BATCH):
+    """
+    Sends every bill and the count of readings it covers with a few setMeterBills
+    transactions from the contract owner, returns (tx hashes, meters not billed).
+
+    A batch whose estimate is over BILL_PUSH_GAS, from readings the contract has
+    to add back, is halved. So is a batch that reverts, until the meter it
+    reverts for (one more than 100 readings behind the bill) is on its own. That
+    meter is skipped and reported, and the rest of the bills are still pushed.
+    """
+    from web3.exceptions import ContractLogicError
+
+    meters = list(bills)
+    batches = [meters[first : first + batch_size] for first in range(0, len(meters), batch_size)]
+    sent = []
+    skipped = []
+    while batches:
+        batch = batches.pop(0)
+        call = contract.functions.setMeterBills(
+            batch,
+            [bills[meter] for meter in batch],
+            [reading_counts[meter] for meter in batch],
+        )
+        try:
+            if len(batch) == 1 or call.estimate_gas({"from": owner}) <= BILL_PUSH_GAS:
+                sent.append((call.transact({"from": owner, "gas": BILL_PUSH_GAS}), batch))
+                continue
+        except ContractLogicError as e:
+            if len(batch) == 1:
+                logging.error("Not billing %s, setMeterBills reverts for it: %s", batch[0], e)
+                skipped.extend(batch)
+                continue
+        half = len(batch) // 2
+        batches[:0] = [batch[:half], batch[half:]]
+    for tx_hash, batch in sent:
+        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        if receipt["status"] != 1:
+            logging.error("setMeterBills transaction %s reverted", tx_hash.hex())
+            skipped.extend(batch)
+    return [tx_hash for tx_hash, _batch in sent], skipped
+
+
+def create_tariff(name):
+    if name == "flat":
+        return TimeOfUseTariff.flat()
+    if name == "time-of-use":
+        return TimeOfUseTariff(ECONOMY_7)
+    if name == "tiered":
+        return TieredTariff(TIERS)
+    raise ValueError(f"Unknown tariff: {name}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-bill every indexed meter")
+    parser.add_argument("--db", default="meter-index.sqlite")
+    parser.add_argument("--tariff", choices=("flat", "time-of-use", "tiered"), default="flat")
+    parser.add_argument("--start", type=int, default=0, help="period start, unix time")
+    parser.add_argument("--end", type=int, default=None, help="period end, unix time")
+    parser.add_argument("--push", action="store_true", help="store the bills on chain")
+    args = parser.parse_args(argv)
+    if args.push and (args.start or args.end is not None):
+        # A period's bill would replace the whole running bill on chain
+        parser.error("--push bills every reading, it can not be used with --start or --end")
+
+    logging.basicConfig(level=logging.WARNING)
+    engine = BillingEngine(ReadingStore(args.db), create_tariff(args.tariff))
+    bills = engine.run(args.start, args.end)
+    if args.push:
+        from web3 import Web3
+
+        try:
+            from server.parameters import BLOCKCHAIN_URL, CONTRACT_ABI, CONTRACT_ADDRESS
+        except Exception as e:
+            from parameters import BLOCKCHAIN_URL, CONTRACT_ABI, CONTRACT_ADDRESS
+        w3 = get_web3(BLOCKCHAIN_URL)
+        contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+        # The contract owner is the account that deployed it
+        owner = contract.functions.owner().call()
+        _tx_hashes, skipped = push_bills(
+            w3,
+            contract,
+            {Web3.to_checksum_address(meter): bill for meter, bill in bills.items()},
+            {
+                Web3.to_checksum_address(meter): count
+                for meter, count in engine.reading_counts.items()
+            },
+            owner,
+        )
+        if skipped:
+            logging.warning(
+                "%s meters keep their running bills on chain: %s",
+                len(skipped),
+                ", ".join(skipped),
+            )
+    json.dump(
+        {meter: bill / BILL_SCALING_FACTOR for meter, bill in bills.items()},
+        sys.stdout,
+        indent=2,
+    )
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,529 @@
+# indexes stored meter readings into a local SQLite store for fast queries
+"""
+Questions about many meters (top consumers, usage per hour, bills) used to
+mean calling contract views account by account. The indexer follows the
+MeterReadingSubmission and MeterReadingsSubmission events with the block
+cursor subscription from client/event_subscription.py and writes every
+reading to SQLite, where those questions are single indexed queries.
+
+Each chunk of logs is written in one transaction together with the
+subscription's cursor, so a restarted indexer resumes from its last block
+without indexing a reading twice. Block timestamps for the time buckets are
+fetched with one JSON-RPC batch per chunk.
+
+The hash of the last block readings came from is kept too. When the chain
+is reset or reverted under the store (a Ganache restart, evm_revert to the
+seeded snapshot), that block is gone or has another hash, so every table and
+cursor is emptied and both reading events are indexed again from block 0.
+
+Tables:
+    - readings: one row per reading with its meter, block, time and value
+    - meter_totals: running usage, reading count and bill per meter, kept up
+      to date on ingest so totals and bills never scan the readings
+    - usage_hourly: usage per meter per hour, buckets that are whole hours
+      are summed from here instead of from the readings
+    - reading_columns: each ingested chunk's readings of a meter packed as
+      int64 columns (block, time, reading), the billing engine loads a group
+      of meters from here with one query and no row per reading
+    - block_hashes: hash of the last block of each ingested chunk
+
+Readings are kept as the contract's scaled integers, bills use the
+contract's flat rate and per reading rounding.
+
+Usage:
+    python -m server.indexer --db meter-index.sqlite
+    python -m server.indexer --db meter-index.sqlite totals --top 10
+    python -m server.indexer --db meter-index.sqlite usage --bucket 3600
+    python -m server.indexer --db meter-index.sqlite bills
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from array import array
+from collections import defaultdict
+from itertools import groupby
+
+from client.event_subscription import (
+    LOG_INDEX_END,
+    BlockCursor,
+    EventSubscription,
+    log_position,
+)
+from client.transport import close_async_web3, get_async_web3
+
+COST_PER_KWH = 22  # Same flat rate as cost_per_kwh in the contract
+SCALING_FACTOR = 1000  # Readings are stored by the contract as kWh * 1000
+INDEX_CHUNK_SIZE = 2000  # Blocks per eth_getLogs request when the indexer starts
+TIMESTAMP_BATCH_SIZE = 500  # eth_getBlockByNumber calls per JSON-RPC batch
+ROLLUP_SECONDS = 3600  # Bucket size of the usage_hourly rollup
+NO_END = 2**62 // ROLLUP_SECONDS * ROLLUP_SECONDS  # Upper time bound when none is given
+READING_EVENTS = ("MeterReadingSubmission", "MeterReadingsSubmission")
+
+
+class ReadingStore(BlockCursor):
+    """SQLite store of indexed readings, it is also the indexer's block cursor"""
+
+    def __init__(self, path=":memory:"):
+        super().__init__(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS readings (
+                block_number INTEGER NOT NULL,
+                log_index INTEGER NOT NULL,
+                item INTEGER NOT NULL,
+                meter TEXT NOT NULL,
+                uid TEXT,
+                reading INTEGER NOT NULL,
+                timestamp INTEGER NOT NULL,
+                PRIMARY KEY (block_number, log_index, item)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS readings_meter_time
+                ON readings (meter, timestamp);
+            CREATE INDEX IF NOT EXISTS readings_time ON readings (timestamp);
+            CREATE TABLE IF NOT EXISTS usage_hourly (
+                hour INTEGER NOT NULL,
+                meter TEXT NOT NULL,
+                usage INTEGER NOT NULL,
+                readings INTEGER NOT NULL,
+                PRIMARY KEY (hour, meter)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS usage_hourly_meter ON usage_hourly (meter, hour);
+            CREATE TABLE IF NOT EXISTS meter_totals (
+                meter TEXT PRIMARY KEY,
+                total_usage INTEGER NOT NULL,
+                reading_count INTEGER NOT NULL,
+                bill INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS reading_columns (
+                meter TEXT NOT NULL,
+                first_block INTEGER NOT NULL,
+                last_block INTEGER NOT NULL,
+                first_timestamp INTEGER NOT NULL,
+                last_timestamp INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                block_numbers BLOB NOT NULL,
+                timestamps BLOB NOT NULL,
+                readings BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS reading_columns_meter
+                ON reading_columns (meter, first_block);
+            CREATE TABLE IF NOT EXISTS block_hashes (
+                block_number INTEGER PRIMARY KEY,
+                hash TEXT NOT NULL
+            ) WITHOUT ROWID;
+            """
+        )
+        self._connection.commit()
+        # Bumped by reset, so indexers sharing the store know to start over
+        self.resets = 0
+        self._backfill_columns()
+
+    def _backfill_columns(self):
+        # Stores indexed before reading_columns existed get theirs from the readings
+        with self._lock:
+            if self._connection.execute("SELECT 1 FROM reading_columns LIMIT 1").fetchone():
+                return
+            rows = self._connection.execute(
+                "SELECT meter, block_number, timestamp, reading FROM readings "
+                "ORDER BY meter, block_number, log_index, item"
+            )
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO reading_columns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        self._column_row(meter, [row[1:] for row in meter_rows])
+                        for meter, meter_rows in groupby(rows, key=lambda row: row[0])
+                    ],
+                )
+
+    @staticmethod
+    def _column_row(meter, readings):
+        # readings are (block_number, timestamp, reading) in the order they were mined
+        block_numbers, timestamps, values = (array("q", column) for column in zip(*readings))
+        return (
+            meter,
+            block_numbers[0],
+            block_numbers[-1],
+            min(timestamps),
+            max(timestamps),
+            len(values),
+            block_numbers.tobytes(),
+            timestamps.tobytes(),
+            values.tobytes(),
+        )
+
+    def ingest(self, rows, name, position, block_hash=None):
+        # rows are (block_number, log_index, item, meter, uid, reading, timestamp),
+        # block_hash is (block number, hash) of the last block the rows are from
+        totals = defaultdict(lambda: [0, 0, 0])
+        hourly = defaultdict(lambda: [0, 0])
+        columns = defaultdict(list)
+        for row in rows:
+            meter, reading, timestamp = row[3], row[5], row[6]
+            columns[meter].append((row[0], timestamp, reading))
+            totals[meter][0] += reading
+            totals[meter][1] += 1
+            # Rounded per reading like the contract's bill
+            totals[meter][2] += (reading * COST_PER_KWH) // SCALING_FACTOR
+            hour = hourly[(timestamp // ROLLUP_SECONDS * ROLLUP_SECONDS, meter)]
+            hour[0] += reading
+            hour[1] += 1
+        with self._lock:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO readings VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                self._connection.executemany(
+                    "INSERT INTO meter_totals VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (meter) DO UPDATE SET "
+                    "total_usage = total_usage + excluded.total_usage, "
+                    "reading_count = reading_count + excluded.reading_count, "
+                    "bill = bill + excluded.bill",
+                    [(meter, *values) for meter, values in totals.items()],
+                )
+                self._connection.executemany(
+                    "INSERT INTO usage_hourly VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (hour, meter) DO UPDATE SET "
+                    "usage = usage + excluded.usage, "
+                    "readings = readings + excluded.readings",
+                    [(*key, *values) for key, values in hourly.items()],
+                )
+                self._connection.executemany(
+                    "INSERT INTO reading_columns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [self._column_row(*item) for item in columns.items()],
+                )
+                if block_hash is not None:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO block_hashes VALUES (?, ?)", block_hash
+                    )
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO event_cursors VALUES (?, ?, ?)",
+                    (name, *position),
+                )
+
+    def last_block_hash(self):
+        # (block number, hash) of the latest block readings were indexed from
+        rows = self._query(
+            "SELECT block_number, hash FROM block_hashes "
+            "ORDER BY block_number DESC LIMIT 1"
+        )
+        return tuple(rows[0]) if rows else None
+
+    def reset(self):
+        # Drops every reading and cursor, for a chain that was reset or reverted
+        with self._lock:
+            with self._connection:
+                for table in (
+                    "readings",
+                    "meter_totals",
+                    "usage_hourly",
+                    "reading_columns",
+                    "block_hashes",
+                    "event_cursors",
+                ):
+                    self._connection.execute(f"DELETE FROM {table}")
+            self.resets += 1
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def reading_count(self):
+        return self._query("SELECT COUNT(*) FROM readings")[0][0]
+
+    def meter_totals(self, top=None):
+        # Highest usage first, top limits it to the biggest consumers
+        rows = self._query(
+            "SELECT meter, total_usage, reading_count, bill FROM meter_totals "
+            "ORDER BY total_usage DESC LIMIT ?",
+            (-1 if top is None else top,),
+        )
+        return [
+            {
+                "meter": meter,
+                "total_usage": total_usage,
+                "reading_count": reading_count,
+                "bill": bill,
+            }
+            for meter, total_usage, reading_count, bill in rows
+        ]
+
+    def usage_by_bucket(self, bucket_seconds=3600, meter=None, start=None, end=None):
+        # Usage summed per bucket_seconds of block time, oldest bucket first
+        start = start or 0
+        end = end or NO_END
+        if all(value % ROLLUP_SECONDS == 0 for value in (bucket_seconds, start, end)):
+            table, time_column = "usage_hourly", "hour"
+            sums = "SUM(usage), SUM(readings)"
+        else:
+            table, time_column = "readings", "timestamp"
+            sums = "SUM(reading), COUNT(*)"
+        conditions = [f"{time_column} >= ?", f"{time_column} < ?"]
+        params = [start, end]
+        if meter is not None:
+            conditions.append("meter = ?")
+            params.append(meter)
+        rows = self._query(
+            f"SELECT {time_column} / ? * ? AS bucket, {sums} FROM {table} "
+            f"WHERE {' AND '.join(conditions)} GROUP BY bucket ORDER BY bucket",
+            (bucket_seconds, bucket_seconds, *params),
+        )
+        return [
+            {"bucket": bucket, "usage": usage, "readings": count}
+            for bucket, usage, count in rows
+        ]
+
+    def meters(self):
+        rows = self._query("SELECT meter FROM meter_totals ORDER BY meter")
+        return [row[0] for row in rows]
+
+    def indexed_block(self):
+        # Last block every reading event has been indexed through, -1 before that
+        positions = [self.load(name) for name in READING_EVENTS]
+        if None in positions:
+            return -1
+        return min(
+            block if log_index == LOG_INDEX_END else block - 1
+            for block, log_index in positions
+        )
+
+    def reading_columns(self, meters, start=None, end=None, through_block=None):
+        """
+        (meter, count, block numbers, timestamps, readings) of every column of
+        the meters holding readings mined up to through_block before end, in one
+        query. The last three are packed int64 bytes, None for a column wholly
+        before start and through_block, which only adds count to its meter's
+        readings.
+        """
+        params = {f"meter{i}": meter for i, meter in enumerate(meters)}
+        params.update(
+            start=start or 0,
+            end=end or NO_END,
+            through=self.indexed_block() if through_block is None else through_block,
+        )
+        needed = "last_timestamp >= :start OR last_block > :through"
+        placeholders = ", ".join(f":meter{i}" for i in range(len(meters)))
+        return self._query(
+            f"SELECT meter, count, "
+            f"CASE WHEN {needed} THEN block_numbers END, "
+            f"CASE WHEN {needed} THEN timestamps END, "
+            f"CASE WHEN {needed} THEN readings END "
+            f"FROM reading_columns WHERE meter IN ({placeholders}) "
+            "AND first_block <= :through AND first_timestamp < :end "
+            "ORDER BY meter, first_block",
+            params,
+        )
+
+    def bills(self, meter=None):
+        if meter is None:
+            rows = self._query("SELECT meter, bill FROM meter_totals ORDER BY meter")
+        else:
+            rows = self._query(
+                "SELECT meter, bill FROM meter_totals WHERE meter = ?", (meter,)
+            )
+        return {meter: bill for meter, bill in rows}
+
+
+class ReadingIndexer(EventSubscription):
+    """Writes one reading event's logs to a ReadingStore a chunk at a time"""
+
+    def __init__(self, w3, contract, event_name, store, **kwargs):
+        super().__init__(
+            w3,
+            getattr(contract.events, event_name),
+            handler=None,
+            name=event_name,
+            cursor=store,
+            start_block=0,
+            chunk_size=INDEX_CHUNK_SIZE,
+            **kwargs,
+        )
+        self.store = store
+        self.readings_indexed = 0
+        self.resets_seen = store.resets
+
+    async def poll(self):
+        if self.store.resets != self.resets_seen:
+            self.start_over()
+        elif not await self.on_indexed_chain():
+            logging.warning("Block hashes of %s changed, indexing again", self.name)
+            self.restart()
+        behind = await super().poll()
+        if self.store.resets != self.resets_seen:
+            # Another indexer reset the store while this chunk was fetched
+            self.start_over()
+        return behind
+
+    def restart(self):
+        # The chain was reset or reverted under the cursor, the rows from it would
+        # clash with the ones replayed from the new chain
+        self.store.reset()
+        self.resets_seen = self.store.resets
+        self.position = None
+
+    def start_over(self):
+        # The store was reset by the other reading event's indexer
+        self.resets_seen = self.store.resets
+        self.advance((self.start_block - 1, LOG_INDEX_END))
+
+    async def on_indexed_chain(self):
+        # Whether the last block readings were indexed from is still on the chain
+        from web3.exceptions import BlockNotFound
+
+        last = self.store.last_block_hash()
+        if last is None:
+            return True
+        block_number, block_hash = last
+        try:
+            block = await self._get_block(block_number)
+        except BlockNotFound:
+            return False
+        return block is not None and bytes(block["hash"]).hex() == block_hash
+
+    async def handle_logs(self, logs):
+        if not logs:
+            return
+        blocks = await self.get_blocks({log["blockNumber"] for log in logs})
+        if self.store.resets != self.resets_seen:
+            # Rows of the old chain must not go into the reset store
+            return
+        rows = []
+        for log in logs:
+            args = log["args"]
+            block_number, log_index = log_position(log)
+            timestamp = blocks[block_number]["timestamp"]
+            if "mtr_readings" in args:
+                # Batches carry no uids, item is the reading's place in the batch
+                meter = args["addr"]
+                rows.extend(
+                    (block_number, log_index, item, meter, None, reading, timestamp)
+                    for item, reading in enumerate(args["mtr_readings"])
+                )
+            else:
+                reading = args["mtr"]
+                rows.append(
+                    (
+                        block_number,
+                        log_index,
+                        0,
+                        args["addr"],
+                        reading["uid"],
+                        reading["mtr_reading"],
+                        timestamp,
+                    )
+                )
+        # The rows, the last block's hash and the position of the last log are
+        # committed together
+        position = log_position(logs[-1])
+        last_block = blocks[position[0]]
+        self.store.ingest(
+            rows, self.name, position, (position[0], bytes(last_block["hash"]).hex())
+        )
+        self.position = position
+        self.logs_handled += len(logs)
+        self.readings_indexed += len(rows)
+
+    async def _get_block(self, block_number):
+        self.requests_sent += 1
+        if self.w3.provider.is_async:
+            return await self.w3.eth.get_block(block_number)
+        return await asyncio.to_thread(self.w3.eth.get_block, block_number)
+
+    async def get_blocks(self, block_numbers):
+        # {number: block} with one JSON-RPC batch per TIMESTAMP_BATCH_SIZE blocks
+        block_numbers = sorted(block_numbers)
+        blocks = {}
+        for start in range(0, len(block_numbers), TIMESTAMP_BATCH_SIZE):
+            numbers = block_numbers[start : start + TIMESTAMP_BATCH_SIZE]
+            self.requests_sent += 1
+            if self.w3.provider.is_async:
+                async with self.w3.batch_requests() as batch:
+                    for number in numbers:
+                        batch.add(self.w3.eth.get_block(number))
+                    results = await batch.async_execute()
+            else:
+                with self.w3.batch_requests() as batch:
+                    for number in numbers:
+                        batch.add(self.w3.eth.get_block(number))
+                    # The sync request blocks, on a thread the loop keeps running
+                    results = await asyncio.to_thread(batch.execute)
+            blocks.update((block["number"], block) for block in results)
+        return blocks
+
+
+def create_indexers(w3, contract, store, **kwargs):
+    return [
+        ReadingIndexer(w3, contract, event_name, store, **kwargs)
+        for event_name in READING_EVENTS
+    ]
+
+
+async def run_indexer(store, endpoint_uri, contract_address, abi, follow=True):
+    w3 = await get_async_web3(endpoint_uri)
+    try:
+        contract = w3.eth.contract(address=contract_address, abi=abi)
+        indexers = create_indexers(w3, contract, store)
+        # Catch up on everything first, then tail new blocks
+        for indexer in indexers:
+            await indexer.catch_up()
+        logging.warning("Indexed %s readings", store.reading_count())
+        if follow:
+            await asyncio.gather(*(indexer.run() for indexer in indexers))
+    finally:
+        await close_async_web3(w3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index meter readings into SQLite")
+    parser.add_argument("--db", default="meter-index.sqlite")
+    parser.add_argument("--once", action="store_true", help="exit once caught up")
+    parser.add_argument("--log-level", default="WARNING")
+    queries = parser.add_subparsers(dest="query")
+    totals = queries.add_parser("totals", help="usage, reading count and bill per meter")
+    totals.add_argument("--top", type=int, default=None)
+    usage = queries.add_parser("usage", help="usage per time bucket")
+    usage.add_argument("--bucket", type=int, default=3600, help="seconds per bucket")
+    usage.add_argument("--meter", default=None)
+    bills = queries.add_parser("bills", help="bill per meter")
+    bills.add_argument("--meter", default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=args.log_level,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    store = ReadingStore(args.db)
+    if args.query == "totals":
+        result = store.meter_totals(args.top)
+    elif args.query == "usage":
+        result = store.usage_by_bucket(args.bucket, args.meter)
+    elif args.query == "bills":
+        result = store.bills(args.meter)
+    else:
+        try:
+            from server.parameters import BLOCKCHAIN_URL, CONTRACT_ABI, CONTRACT_ADDRESS
+        except Exception as e:
+            from parameters import BLOCKCHAIN_URL, CONTRACT_ABI, CONTRACT_ADDRESS
+        try:
+            asyncio.run(
+                run_indexer(
+                    store,
+                    BLOCKCHAIN_URL,
+                    CONTRACT_ADDRESS,
+                    CONTRACT_ABI,
+                    follow=not args.once,
+                )
+            )
+        except KeyboardInterrupt:
+            logging.warning("Stopping indexer")
+        return
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
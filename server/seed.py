@@ -0,0 +1,219 @@
+# stores every meter's starting reading history in bulk, once after deployment
+"""
+Each client used to store its own starting history as it started, so twelve
+meters launched together queued their seeding transactions on the node ahead
+of their first bills, and again on every restart. The seeder stores the
+history of every meter account once, right after truffle migrate:
+    - SEED_BATCH_SIZE readings per storeMeterReadings transaction
+    - up to SEED_IN_FLIGHT transactions are sent before their receipts are
+      waited on, from the unlocked Ganache accounts in turn
+
+A meter that finds readings of its own on chain stores none at startup (see
+ClientRuntime.store_initial_set), so a seeded chain costs the clients no
+transactions at all.
+
+The seeded state is kept two ways, both recorded in blockchain/seed_state.json
+with the contract address they belong to:
+    - Ganache runs with --db on the ganache-data volume (docker-compose.yml),
+      so a restarted node loads the seeded chain as it was and run-server.sh
+      skips migrating and seeding when "check" finds it
+    - --snapshot takes an evm_snapshot once seeding is done, "revert" returns
+      the chain to it at once (to rerun a demo or benchmark from the seeded
+      state) for as long as the node runs. A restarted node has lost the
+      snapshot, revert then logs it and forgets the recorded id
+
+Usage:
+    python -m server.seed --meters 12 --readings 12 --snapshot
+    python -m server.seed check
+    python -m server.seed revert
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from uuid import uuid4
+
+from client.transport import get_web3
+from server.parameters import (
+    BLOCKCHAIN_BASE_DIR,
+    BLOCKCHAIN_URL,
+    PARENT_DIR,
+    get_account_addresses,
+    get_contract_abi,
+    get_contract_address,
+)
+
+SEED_METERS = 12  # Meter accounts seeded, account 0 deploys the contract
+SEED_READINGS = 12  # Readings of history per meter, the set each client used to store
+SEED_BATCH_SIZE = 100  # Readings per storeMeterReadings transaction
+SEED_IN_FLIGHT = 64  # Transactions sent before waiting on their receipts
+READING_SCALING_FACTOR = 1000  # Same 3dp scaled integer the clients send
+SEED_STATE_FILE_PATH = os.path.join(PARENT_DIR, BLOCKCHAIN_BASE_DIR, "seed_state.json")
+
+
+def generate_history(readings):
+    # (uid, scaled reading) pairs, the contract rejects zero readings
+    return [
+        (str(uuid4()), max(1, round(random.uniform(0, 1) * READING_SCALING_FACTOR)))
+        for _ in range(readings)
+    ]
+
+
+def seed_transactions(meters, readings, batch_size=SEED_BATCH_SIZE):
+    # (meter, uids, readings) per transaction, the meters in turn so no account
+    # has all of its transactions waiting at once
+    histories = {meter: generate_history(readings) for meter in meters}
+    transactions = []
+    for first in range(0, readings, batch_size):
+        for meter, history in histories.items():
+            uids, scaled = zip(*history[first : first + batch_size])
+            transactions.append((meter, list(uids), list(scaled)))
+    return transactions
+
+
+def seed(
+    w3, contract, meters, readings, batch_size=SEED_BATCH_SIZE, in_flight=SEED_IN_FLIGHT
+):
+    # Sends every transaction of the history, waiting on receipts in_flight at a time
+    sent = []
+    stored = 0
+
+    def wait_for_receipts():
+        nonlocal stored
+        for tx_hash, count in sent:
+            receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+            if receipt["status"] != 1:
+                raise Exception(f"Seeding transaction {tx_hash.hex()} reverted")
+            stored += count
+        sent.clear()
+
+    for meter, uids, scaled in seed_transactions(meters, readings, batch_size):
+        tx_hash = contract.functions.storeMeterReadings(uids, scaled).transact(
+            {"from": meter}
+        )
+        sent.append((tx_hash, len(uids)))
+        if len(sent) >= in_flight:
+            wait_for_receipts()
+    wait_for_receipts()
+    return stored
+
+
+def take_snapshot(w3):
+    # Supported by Ganache, Hardhat and eth-tester, reverting to an id uses it up
+    return w3.manager.request_blocking("evm_snapshot", [])
+
+
+def revert_snapshot(w3, snapshot_id):
+    # False when the node does not have the snapshot, ids are lost when Ganache restarts
+    reverted = w3.manager.request_blocking("evm_revert", [snapshot_id])
+    if reverted is False:
+        logging.error(
+            "evm_revert to snapshot %s failed, the node does not have it (snapshots "
+            "do not survive a Ganache restart)",
+            snapshot_id,
+        )
+    return reverted
+
+
+def load_seed_state(file_path=SEED_STATE_FILE_PATH):
+    try:
+        with open(file_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_seed_state(state, file_path=SEED_STATE_FILE_PATH):
+    with open(file_path, "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def is_seeded(w3, contract, state):
+    # The recorded seeding is of this deployment and the chain still holds it
+    if state is None or state["address"] != contract.address:
+        return False
+    if not w3.eth.get_code(contract.address):
+        return False
+    _bill, _usage, reading_count, _last_uid = contract.functions.getMeterSummary().call(
+        {"from": state["meters"][0]}
+    )
+    return reading_count >= state["readings"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed every meter's reading history")
+    parser.add_argument(
+        "command", nargs="?", choices=("seed", "check", "revert"), default="seed"
+    )
+    parser.add_argument("--meters", type=int, default=SEED_METERS)
+    parser.add_argument("--readings", type=int, default=SEED_READINGS)
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE)
+    parser.add_argument("--in-flight", type=int, default=SEED_IN_FLIGHT)
+    parser.add_argument(
+        "--snapshot", action="store_true", help="take an evm_snapshot once seeded"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    from web3 import Web3
+
+    w3 = get_web3(BLOCKCHAIN_URL)
+    state = load_seed_state()
+
+    if args.command == "check":
+        # Exit status 0 when the chain already holds this deployment's seeded history,
+        # run-server.sh migrates and seeds otherwise
+        try:
+            contract = w3.eth.contract(
+                address=get_contract_address(), abi=get_contract_abi()
+            )
+            seeded = is_seeded(w3, contract, state)
+        except Exception as e:
+            logging.warning("Could not check the seeded chain: %s", e)
+            seeded = False
+        print("seeded" if seeded else "not seeded")
+        sys.exit(0 if seeded else 1)
+
+    if args.command == "revert":
+        if state is None or state.get("snapshot") is None:
+            sys.exit("No snapshot recorded, run python -m server.seed --snapshot first")
+        if revert_snapshot(w3, state["snapshot"]) is False:
+            # The id could name another snapshot of the restarted node later, drop it
+            state["snapshot"] = None
+            save_seed_state(state)
+            sys.exit(
+                "The node no longer has the snapshot, python -m server.seed check tells "
+                "whether the chain is still seeded, seed it again with --snapshot if not"
+            )
+        state["snapshot"] = take_snapshot(w3)
+        save_seed_state(state)
+        print(f"Reverted to the seeded state at block {w3.eth.block_number}")
+        return
+
+    contract = w3.eth.contract(address=get_contract_address(), abi=get_contract_abi())
+    meters = [
+        Web3.to_checksum_address(address)
+        for address in get_account_addresses()[1 : args.meters + 1]
+    ]
+    started = time.perf_counter()
+    stored = seed(w3, contract, meters, args.readings, args.batch_size, args.in_flight)
+    elapsed = time.perf_counter() - started
+    state = {
+        "address": contract.address,
+        "meters": meters,
+        "readings": args.readings,
+        "block": w3.eth.block_number,
+        "snapshot": take_snapshot(w3) if args.snapshot else None,
+    }
+    save_seed_state(state)
+    print(
+        f"Seeded {stored} readings for {len(meters)} meters in {elapsed:.1f} s "
+        f"({stored / elapsed:.0f} readings/s), up to block {state['block']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
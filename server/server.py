@@ -1,9 +1,30 @@
+import asyncio
+import sys
 import time
 from uuid import uuid4
 import random 
-from parameters import ACCOUNTS_DATA, BLOCKCHAIN_URL, CONTRACT_ABI, CONTRACT_ADDRESS
 from web3 import Web3
 
+from client.batching import BatchedViewCaller
+from client.instrumentation import install_dump_handlers
+from client.metrics import METRICS_BASE_PORT, MetricsServer, create_registry
+from client.transport import get_web3
+
+try:
+    from server.parameters import (
+        BLOCKCHAIN_URL,
+        get_account_addresses,
+        get_contract_abi,
+        get_contract_address,
+    )
+except Exception as e:
+    from parameters import (
+        BLOCKCHAIN_URL,
+        get_account_addresses,
+        get_contract_abi,
+        get_contract_address,
+    )
+
 grid_alerts = [
     "High power use detected. Reduce consumption.",
     "Maintenance scheduled: Power outage 2-4 PM.",
@@ -24,6 +45,29 @@ def select_random_alert():
     return grid_alerts[index]
 
 
+async def get_meter_summaries(contract, addresses):
+    # All summaries go to the node as one JSON-RPC batch
+    batcher = BatchedViewCaller(contract.w3, contract)
+    try:
+        return await asyncio.gather(
+            *(batcher.get_meter_summary(address) for address in addresses),
+            return_exceptions=True,
+        )
+    finally:
+        await batcher.close()
+
+
+def print_meter_summaries(contract, addresses):
+    summaries = asyncio.run(get_meter_summaries(contract, addresses))
+    for address, summary in zip(addresses, summaries):
+        if isinstance(summary, Exception):
+            print(f"Could not read summary for meter {address}: {summary}")
+            continue
+        bill, total_usage, reading_count, _last_uid = summary
+        print(f"Meter {address}: {reading_count} readings, "
+              f"{total_usage} scaled kWh, bill {bill}")
+
+
 def send_alert(contract):
     try:
         select_random_alert_text = select_random_alert()
@@ -36,9 +80,21 @@ def send_alert(contract):
 
 
 if __name__ == "__main__":
-    w3 = Web3(Web3.HTTPProvider(BLOCKCHAIN_URL))
-    example_address = Web3.to_checksum_address(list(ACCOUNTS_DATA["addresses"])[1])
-    contract_instance = w3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+    # Same pooled keep-alive transport as the clients, its RPC profile is
+    # logged on SIGUSR1 and at exit
+    install_dump_handlers()
+    if "--metrics" in sys.argv[1:]:
+        # RPC and poll metrics on the base port, next to the meters' ports
+        MetricsServer(create_registry({"meter": "server"}), METRICS_BASE_PORT).start()
+    w3 = get_web3(BLOCKCHAIN_URL)
+    example_address = Web3.to_checksum_address(get_account_addresses()[1])
+    contract_instance = w3.eth.contract(
+        address=get_contract_address(), abi=get_contract_abi()
+    )
+    meter_addresses = [
+        Web3.to_checksum_address(address) for address in get_account_addresses()[1:13]
+    ]
+    print_meter_summaries(contract_instance, meter_addresses)
     while True:
         random_sleep_interval = random.randint(15,60)
         send_alert(contract_instance)
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from client.alert_relay import AlertRelay, read_relay_alerts
+from client.blockchain_client import BlockchainGetAlerts
+
+# run test with = python -m unittest tests/test_alert_relay.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestAlertRelay(unittest.TestCase):
+    """
+    unit tests for the grid alert relay and the meters' fallback to polling
+    """
+
+    def setUp(self):
+        """
+        method sets up a relay address in a temporary directory
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.address = os.path.join(self.directory.name, "alerts.sock")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # positive test
+    # one alert reaches every connected meter
+    def test_broadcast_to_meters(self):
+        """
+        test an alert given to the relay is read by two meters
+        """
+        relay = AlertRelay(self.address)
+        received = []
+
+        async def run():
+            server = asyncio.create_task(relay.serve())
+            await asyncio.sleep(0.05)
+            meters = [
+                asyncio.create_task(read_relay_alerts(received.append, self.address))
+                for _ in range(2)
+            ]
+            while len(relay.writers) < 2:
+                await asyncio.sleep(0.01)
+            relay.relay_alert(
+                MagicMock(
+                    args=MagicMock(message="Grid overload"), blockNumber=7, logIndex=0
+                )
+            )
+            while len(received) < 2:
+                await asyncio.sleep(0.01)
+            for task in [server, *meters]:
+                task.cancel()
+            await asyncio.gather(server, *meters, return_exceptions=True)
+
+        asyncio.run(asyncio.wait_for(run(), 5))
+
+        self.assertEqual(
+            [alert["message"] for alert in received], ["Grid overload"] * 2
+        )
+        self.assertEqual(relay.alerts_sent, 1)
+
+    # negative test
+    # a meter polls the chain itself when no relay is running
+    @patch("client.blockchain_client.RELAY_RETRY_INTERVAL", 0.05)
+    def test_fallback_without_relay(self):
+        """
+        test monitor_grid_alerts polls directly and retries the missing relay
+        """
+        alerts_obj = BlockchainGetAlerts(
+            MagicMock(), MagicMock(), MagicMock(), relay_address=self.address
+        )
+
+        async def poll_forever():
+            await asyncio.sleep(10)
+
+        alerts_obj.watch_grid_alerts = AsyncMock(side_effect=poll_forever)
+
+        async def run():
+            task = asyncio.create_task(alerts_obj.monitor_grid_alerts())
+            await asyncio.sleep(0.12)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(run())
+
+        self.assertGreaterEqual(alerts_obj.watch_grid_alerts.await_count, 2)
+
+
+    # negative test
+    # an alert the meter already read from the chain is not shown twice
+    def test_relayed_alert_deduplicated(self):
+        """
+        test handle_relayed_alert skips alerts at or before the meter's cursor
+        """
+        mock_display = MagicMock()
+        alerts_obj = BlockchainGetAlerts(MagicMock(), MagicMock(), mock_display)
+        alert = {"message": "Grid overload", "block": 7, "log_index": 0}
+
+        alerts_obj.handle_relayed_alert(alert)
+        alerts_obj.handle_relayed_alert(alert)
+
+        mock_display.update_notice_message.assert_called_once_with("Grid overload")
+        self.assertEqual(alerts_obj.subscription.position, (7, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from client.batching import BatchedViewCaller
+
+# run test with = python -m unittest tests/test_batching.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestBatchedViewCaller(unittest.TestCase):
+    """
+    unit tests for batching contract view calls
+    """
+
+    def setUp(self):
+        """
+        method sets up a sync web3 mock with a batch context
+        """
+        self.mock_w3 = MagicMock()
+        self.mock_w3.provider.is_async = False
+        self.mock_batch = self.mock_w3.batch_requests.return_value.__enter__.return_value
+        self.mock_contract = MagicMock()
+        self.addresses = ["0x1", "0x2", "0x3"]
+
+    def read_bills(self, batcher):
+        """
+        reads the bill of every address concurrently
+        """
+
+        async def read_all():
+            return await asyncio.gather(
+                *(batcher.get_meter_bill(address) for address in self.addresses),
+                return_exceptions=True,
+            )
+
+        return asyncio.run(read_all())
+
+    # positive test
+    # calls in the same window go out as one batch
+    def test_calls_are_batched(self):
+        """
+        test concurrent calls are sent in one batch and each caller gets its result
+        """
+        self.mock_batch.execute.return_value = [100, 200, 300]
+        batcher = BatchedViewCaller(self.mock_w3, self.mock_contract)
+
+        self.assertEqual(self.read_bills(batcher), [100, 200, 300])
+        self.assertEqual(batcher.batches_sent, 1)
+        self.assertEqual(self.mock_batch.add.call_count, 3)
+
+    # positive test
+    # a sync batch is sent from a thread so the event loop is not blocked
+    def test_sync_batch_off_loop(self):
+        """
+        test a sync provider's batch executes on a thread other than the event loop's
+        """
+        threads = []
+        self.mock_batch.execute.side_effect = lambda: threads.append(
+            threading.get_ident()
+        ) or [100, 200, 300]
+        batcher = BatchedViewCaller(self.mock_w3, self.mock_contract)
+
+        self.assertEqual(self.read_bills(batcher), [100, 200, 300])
+        self.assertNotEqual(threads, [threading.get_ident()])
+        self.assertEqual(len(threads), 1)
+
+    # positive test
+    # a full batch is sent without waiting for the window
+    def test_full_batch_sent_early(self):
+        """
+        test reaching max_batch_size flushes straight away
+        """
+        self.mock_batch.execute.side_effect = [[100, 200], [300]]
+        batcher = BatchedViewCaller(
+            self.mock_w3, self.mock_contract, window=60, max_batch_size=2
+        )
+
+        async def read_two():
+            return await asyncio.wait_for(
+                asyncio.gather(
+                    batcher.get_meter_bill("0x1"), batcher.get_meter_bill("0x2")
+                ),
+                timeout=1,
+            )
+
+        self.assertEqual(asyncio.run(read_two()), [100, 200])
+
+    # negative test
+    # a batch whose caller gave up is still awaited by close
+    def test_close_waits_for_sending_batch(self):
+        """
+        test close waits for a batch still being sent after its caller timed out
+        """
+        sending = threading.Event()
+        release = threading.Event()
+
+        def execute():
+            sending.set()
+            release.wait(5)
+            return [100]
+
+        self.mock_batch.execute.side_effect = execute
+        batcher = BatchedViewCaller(self.mock_w3, self.mock_contract)
+
+        async def read_and_close():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(batcher.get_meter_bill("0x1"), timeout=0.1)
+            self.assertTrue(sending.is_set())
+            self.assertEqual(len(batcher._sending), 1)
+            release.set()
+            await batcher.close()
+
+        asyncio.run(read_and_close())
+
+        self.assertEqual(batcher.batches_sent, 1)
+        self.assertEqual(batcher._sending, set())
+
+    # negative test
+    # a failed batch falls back to single calls
+    def test_failed_batch_falls_back(self):
+        """
+        test each caller still gets its own result or error when the batch fails
+        """
+        bills = {"0x1": 100, "0x3": 300}
+
+        def call(transaction):
+            if transaction["from"] not in bills:
+                raise Exception("reverted")
+            return bills[transaction["from"]]
+
+        self.mock_batch.execute.side_effect = Exception("batch not supported")
+        self.mock_contract.functions.getMeterBill.return_value.call.side_effect = call
+        batcher = BatchedViewCaller(self.mock_w3, self.mock_contract)
+
+        results = self.read_bills(batcher)
+
+        self.assertEqual(results[0], 100)
+        self.assertIsInstance(results[1], Exception)
+        self.assertEqual(results[2], 300)
+        self.assertEqual(batcher.batches_sent, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,264 @@
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+from web3.exceptions import ContractLogicError
+
+from server.billing import (
+    BILL_PUSH_GAS,
+    BillingEngine,
+    TieredTariff,
+    TimeOfUseTariff,
+    compute_bills,
+    main,
+    push_bills,
+)
+from client.event_subscription import LOG_INDEX_END
+from server.indexer import ReadingStore
+
+# run test with = python -m unittest tests/test_billing.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestBilling(unittest.TestCase):
+    """
+    unit tests for the server's vectorized billing engine
+    """
+
+    def setUp(self):
+        """
+        method sets up a store with readings for 2 meters at 1am and 6pm, both
+        reading events indexed through block 2
+        """
+        self.store = ReadingStore()
+        self.store.ingest(
+            [
+                (1, 0, 0, "0xA", "uid-1", 1500, 3600),
+                (2, 0, 0, "0xA", "uid-2", 999, 18 * 3600),
+                (2, 0, 1, "0xB", "uid-3", 2000, 18 * 3600 + 60),
+            ],
+            "MeterReadingsSubmission",
+            (2, LOG_INDEX_END),
+        )
+        self.store.save("MeterReadingSubmission", (2, LOG_INDEX_END))
+
+    # positive test
+    # a flat tariff gives the bills the contract and the indexer worked out
+    def test_flat_tariff_matches_contract(self):
+        """
+        test each reading's cost is rounded down like the contract does
+        """
+        bills = BillingEngine(self.store, TimeOfUseTariff.flat()).run()
+
+        # (1500 * 22) // 1000 + (999 * 22) // 1000 = 33 + 21
+        self.assertEqual(bills, {"0xA": 54, "0xB": 44})
+        self.assertEqual(bills, self.store.bills())
+
+    # positive test
+    # time of use rates follow the half hour of each reading
+    def test_time_of_use(self):
+        """
+        test night and peak readings are billed at their own rates
+        """
+        rates = [10] * 48
+        rates[36] = 40  # 6pm to 6:30pm
+        tariff = TimeOfUseTariff(rates, utc_offset=0)
+
+        bills = BillingEngine(self.store, tariff, meters_per_chunk=1).run()
+
+        # (1500 * 10) // 1000 + (999 * 40) // 1000
+        self.assertEqual(bills, {"0xA": 54, "0xB": 80})
+
+    # negative test
+    # readings past the block both events are indexed through are left out
+    def test_unindexed_readings_not_billed(self):
+        """
+        test a block only one event is indexed through is billed by neither, and
+        each bill counts the readings it covers
+        """
+        self.store.ingest(
+            [(3, 0, 0, "0xA", "uid-4", 5000, 19 * 3600)],
+            "MeterReadingsSubmission",
+            (3, LOG_INDEX_END),
+        )
+        engine = BillingEngine(self.store, TimeOfUseTariff.flat())
+
+        self.assertEqual(engine.run(), {"0xA": 54, "0xB": 44})
+        self.assertEqual(engine.reading_counts, {"0xA": 2, "0xB": 1})
+
+        # The period's bill still counts the readings before it
+        self.assertEqual(engine.run(start=18 * 3600), {"0xA": 21, "0xB": 44})
+        self.assertEqual(engine.reading_counts, {"0xA": 2, "0xB": 1})
+
+        self.store.save("MeterReadingSubmission", (3, LOG_INDEX_END))
+        self.assertEqual(engine.run(end=19 * 3600), {"0xA": 54, "0xB": 44})
+        self.assertEqual(engine.reading_counts, {"0xA": 2, "0xB": 1})
+        self.assertEqual(engine.run()["0xA"], 54 + 110)
+        self.assertEqual(engine.reading_counts["0xA"], 3)
+
+    # positive test
+    # tiered rates apply to the usage inside each band
+    def test_tiered(self):
+        """
+        test a reading crossing a tier limit is split between the rates
+        """
+        tariff = TieredTariff([(2, 10), (None, 20)])
+        meter_ids = np.array([0, 0, 1])
+        timestamps = np.array([200, 100, 100])
+        readings = np.array([1500, 1500, 3000])
+
+        bills = compute_bills(meter_ids, timestamps, readings, tariff, 3)
+
+        # meter 0: 1.5 kWh at 10 then 0.5 at 10 and 1 at 20, meter 1: 2 at 10 and 1 at 20
+        self.assertEqual(bills.tolist(), [15 + 5 + 20, 20 + 20, 0])
+
+    # negative test
+    # a time of use tariff needs a rate for every half hour
+    def test_bad_rates(self):
+        """
+        test tariffs with the wrong number of rates or unordered tiers are refused
+        """
+        with self.assertRaises(ValueError):
+            TimeOfUseTariff([22] * 10)
+        with self.assertRaises(ValueError):
+            TieredTariff([(10, 5), (2, 10), (None, 20)])
+
+    # positive test
+    # bills go to the contract in batches
+    def test_push_bills(self):
+        """
+        test bills and their reading counts are sent with one setMeterBills
+        transaction per batch
+        """
+        mock_w3 = MagicMock()
+        mock_w3.eth.wait_for_transaction_receipt.return_value = {"status": 1}
+        mock_contract = MagicMock()
+        mock_contract.functions.setMeterBills.return_value.estimate_gas.return_value = 100000
+        bills = {"0xA": 1, "0xB": 2, "0xC": 3}
+        reading_counts = {"0xA": 10, "0xB": 20, "0xC": 30}
+
+        push_bills(mock_w3, mock_contract, bills, reading_counts, "0xOwner", batch_size=2)
+
+        calls = mock_contract.functions.setMeterBills.call_args_list
+        self.assertEqual(calls[0].args, (["0xA", "0xB"], [1, 2], [10, 20]))
+        self.assertEqual(calls[1].args, (["0xC"], [3], [30]))
+
+    # positive test
+    # a batch estimated over the gas limit is split
+    def test_push_bills_splits_batch(self):
+        """
+        test batches are halved until their gas estimate fits BILL_PUSH_GAS
+        """
+        mock_w3 = MagicMock()
+        mock_w3.eth.wait_for_transaction_receipt.return_value = {"status": 1}
+        mock_contract = MagicMock()
+        sent = []
+
+        def set_meter_bills(meters, bills, reading_counts):
+            call = MagicMock()
+            call.estimate_gas.return_value = BILL_PUSH_GAS * len(meters) // 2 + 1
+            call.transact.side_effect = lambda tx: sent.append(meters) or b"tx"
+            return call
+
+        mock_contract.functions.setMeterBills.side_effect = set_meter_bills
+        bills = {"0xA": 1, "0xB": 2, "0xC": 3}
+
+        push_bills(mock_w3, mock_contract, bills, dict.fromkeys(bills, 0), "0xOwner", batch_size=3)
+
+        self.assertEqual(sent, [["0xA"], ["0xB"], ["0xC"]])
+
+    # negative test
+    # a meter the contract reverts for is skipped, the other bills are still pushed
+    def test_push_bills_skips_reverting_meter(self):
+        """
+        test a reverting batch is split until the stale meter is alone and skipped
+        """
+        mock_w3 = MagicMock()
+        mock_w3.eth.wait_for_transaction_receipt.return_value = {"status": 1}
+        mock_contract = MagicMock()
+        sent = []
+
+        def set_meter_bills(meters, bills, reading_counts):
+            def revert_for_b(*args):
+                if "0xB" in meters:
+                    raise ContractLogicError("Bill is too far behind the readings")
+
+            call = MagicMock()
+            call.estimate_gas.side_effect = lambda tx: revert_for_b() or 100000
+            call.transact.side_effect = lambda tx: revert_for_b() or sent.append(meters) or b"tx"
+            return call
+
+        mock_contract.functions.setMeterBills.side_effect = set_meter_bills
+        bills = {"0xA": 1, "0xB": 2, "0xC": 3}
+
+        with self.assertLogs(level="ERROR"):
+            tx_hashes, skipped = push_bills(
+                mock_w3, mock_contract, bills, dict.fromkeys(bills, 0), "0xOwner", batch_size=3
+            )
+
+        self.assertEqual(sent, [["0xA"], ["0xC"]])
+        self.assertEqual(len(tx_hashes), 2)
+        self.assertEqual(skipped, ["0xB"])
+
+    # negative test
+    # a period's bills are not pushed over the whole running bill
+    def test_push_refused_for_period(self):
+        """
+        test --push together with --start or --end stops before billing
+        """
+        for argv in (["--start", "3600"], ["--end", "7200"]):
+            with self.subTest(argv=argv):
+                with self.assertRaises(SystemExit):
+                    main(["--db", ":memory:", "--push", *argv])
+
+
+class TestBillingOnChain(unittest.TestCase):
+    """
+    pushes bills to the contract deployed on an in-process py-evm chain, skipped
+    when eth-tester or the contract bytecode is not available
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            from benchmarks.evm import InProcessChain
+
+            cls.chain = InProcessChain(accounts=2)
+        except Exception as e:
+            raise unittest.SkipTest(f"In-process chain is not available: {e}")
+
+    # positive test
+    # readings stored after the indexed block stay in the pushed bill
+    def test_pushed_bill_keeps_unindexed_readings(self):
+        """
+        test the bill on chain is the tariff's bill of the indexed readings plus
+        the flat cost of a reading stored after them
+        """
+        w3, contract = self.chain.w3, self.chain.contract
+        meter = w3.eth.accounts[1]
+        rows = []
+        for index, reading in enumerate((1500, 999, 2000)):
+            uid = f"uid-{index}"
+            tx = contract.functions.storeMeterReading(uid, reading).transact({"from": meter})
+            receipt = w3.eth.wait_for_transaction_receipt(tx)
+            block = w3.eth.get_block(receipt.blockNumber)
+            rows.append((block.number, 0, 0, meter, uid, reading, block.timestamp))
+        # The last reading is mined after the indexer's last block
+        store = ReadingStore()
+        store.ingest(rows[:2], "MeterReadingSubmission", (rows[1][0], LOG_INDEX_END))
+        store.save("MeterReadingsSubmission", (rows[1][0], LOG_INDEX_END))
+        engine = BillingEngine(store, TimeOfUseTariff.flat(44))
+
+        bills = engine.run()
+        _tx_hashes, skipped = push_bills(
+            w3, contract, bills, engine.reading_counts, self.chain.owner
+        )
+
+        # (1500 * 44) // 1000 + (999 * 44) // 1000 + (2000 * 22) // 1000
+        self.assertEqual(engine.reading_counts, {meter: 2})
+        self.assertEqual(skipped, [])
+        self.assertEqual(contract.functions.getMeterBill().call({"from": meter}), 66 + 43 + 44)
+
+
+if __name__ == "__main__":
+    unittest.main()
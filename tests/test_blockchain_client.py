@@ -1,18 +1,24 @@
 import asyncio
 import os
+import tempfile
 import unittest
 from unittest.mock import AsyncMock, MagicMock, mock_open, patch
 
+from web3.exceptions import ContractLogicError
+
 from client.blockchain_client import (
     BlockchainConnectionError,
     BlockchainConnectionMonitor,
     BlockchainGetAlerts,
     BlockchainGetBill,
+    BlockchainReadingHistory,
     BlockchainStoreReading,
     GenerateReadings,
+    NonceManager,
     SmartMeterUI,
     get_contract,
 )
+from client.offline_queue import ReadingQueue
 
 # run test with = python -m unittest tests/test_blockchain_client.py
 # all tests = python -m unittest discover -s tests
@@ -36,9 +42,10 @@ class TestClientBlockchain(unittest.TestCase):
 
     # positive test
     # get_contract works with connection
-    @patch("client.blockchain_client.Web3")
-    @patch("builtins.open", mock_open(read_data='{"contract_address": "0x12345"}'))
-    def test_get_contract_success(self, MockWeb3):
+    @patch("client.blockchain_client.get_web3")
+    @patch("client.blockchain_client.get_contract_abi", MagicMock(return_value=[]))
+    @patch("client.blockchain_client.get_contract_address", MagicMock(return_value="0x12345"))
+    def test_get_contract_success(self, mock_get_web3):
         """
         test get_contract works correctly when web3 is connected
         mocks web3 connection and contract
@@ -49,7 +56,7 @@ class TestClientBlockchain(unittest.TestCase):
         contract_mock = MagicMock()
         self.mock_w3.eth.contract.return_value = contract_mock
 
-        MockWeb3.return_value = self.mock_w3
+        mock_get_web3.return_value = self.mock_w3
 
         w3, contract = get_contract(self.mock_app)
 
@@ -59,8 +66,8 @@ class TestClientBlockchain(unittest.TestCase):
 
     # positive test
     # check connection when web3 is connected
-    @patch("client.blockchain_client.Web3")
-    def test_check_connection_connected(self, MockWeb3):
+    @patch("client.blockchain_client.get_web3")
+    def test_check_connection_connected(self, mock_get_web3):
         """
         test BlockchainConnectionMonitor when web3 is connected
         checks if monitor updates UI
@@ -118,6 +125,77 @@ class TestClientBlockchain(unittest.TestCase):
 
         mock_poll_bill.assert_called_once()
 
+    # positive test
+    # bill and usage come from the summary view
+    def test_get_current_bill_uses_summary(self):
+        """
+        test get_current_bill reads getMeterSummary and not the reading history
+        """
+        self.mock_contract.functions.getMeterSummary.return_value.call.return_value = (
+            1234,
+            56100,
+            12,
+            "uid",
+        )
+        bill_instance = BlockchainGetBill(
+            self.private_key,
+            self.mock_w3,
+            self.mock_contract,
+            self.mock_ui_callback,
+        )
+
+        self.assertEqual(asyncio.run(bill_instance.get_current_bill()), (12.34, 56.1))
+        self.mock_contract.functions.getMeterReadings.assert_not_called()
+
+    # positive test
+    # bill update events refresh the display
+    def test_handle_bill_update(self):
+        """
+        test handle_bill_update scales the event values and updates the UI
+        """
+        bill_instance = BlockchainGetBill(
+            self.private_key,
+            self.mock_w3,
+            self.mock_contract,
+            self.mock_ui_callback,
+        )
+
+        mock_event = MagicMock()
+        mock_event.args.bill = 1234
+        mock_event.args.totalUsage = 56100
+
+        bill_instance.handle_bill_update(mock_event)
+
+        self.mock_ui_callback.state.set_bill.assert_called_with(12.34, 56.1)
+
+    # positive test
+    # push mode is used by default and polling can still be selected
+    @patch(
+        "client.blockchain_client.BlockchainGetBill.poll_bill", new_callable=AsyncMock
+    )
+    @patch(
+        "client.blockchain_client.BlockchainGetBill.watch_bill_updates",
+        new_callable=AsyncMock,
+    )
+    def test_start_bill_monitor_modes(self, mock_watch, mock_poll):
+        """
+        test start_bill_monitor picks the event subscription unless polling is requested
+        """
+        BlockchainGetBill(
+            self.private_key, self.mock_w3, self.mock_contract, self.mock_ui_callback
+        ).start_bill_monitor()
+        mock_watch.assert_called_once()
+        mock_poll.assert_not_called()
+
+        BlockchainGetBill(
+            self.private_key,
+            self.mock_w3,
+            self.mock_contract,
+            self.mock_ui_callback,
+            push_updates=False,
+        ).start_bill_monitor()
+        mock_poll.assert_called_once()
+
     # positive test
     # gen random readings test
     def test_generate_reading(self):
@@ -128,6 +206,134 @@ class TestClientBlockchain(unittest.TestCase):
         generated_reading = GenerateReadings.generate_reading()
         self.assertTrue(0 <= generated_reading <= 1)
 
+    # positive test
+    # queued readings are replayed and removed once settled
+    def test_drain_backlog(self):
+        """
+        test drain_backlog keeps failed readings and removes stored or duplicate ones
+        """
+        readings_instance = GenerateReadings(
+            self.private_key, self.mock_w3, self.mock_contract, self.mock_app
+        )
+        readings_instance.reading_queue.append("stored", 0.1)
+        readings_instance.reading_queue.append("duplicate", 0.2)
+        readings_instance.reading_queue.append("failed", 0.3)
+
+        async def store_reading(reading, uid):
+            if uid == "duplicate":
+                raise Exception("revert Duplicate reading is not allowed")
+            if uid == "failed":
+                raise Exception("connection refused")
+
+        async def store_readings(batch):
+            # the duplicate reverts the whole batch
+            raise Exception("revert Duplicate reading is not allowed")
+
+        readings_instance.store_readings_obj.store_reading = store_reading
+        readings_instance.store_readings_obj.store_readings = store_readings
+
+        drained = asyncio.run(readings_instance.drain_backlog())
+
+        self.assertEqual(drained, 2)
+        self.assertEqual(readings_instance.reading_queue.peek(10), [("failed", 0.3)])
+
+    # positive test
+    # an empty durable queue is kept rather than swapped for an in memory one
+    def test_empty_durable_queue_kept(self):
+        """
+        test readings queued on an empty file backed queue are still there when reopened
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, "queue.sqlite")
+        reading_queue = ReadingQueue(path)
+        readings_instance = GenerateReadings(
+            self.private_key,
+            self.mock_w3,
+            self.mock_contract,
+            self.mock_app,
+            reading_queue=reading_queue,
+        )
+
+        self.assertIs(readings_instance.reading_queue, reading_queue)
+        readings_instance.reading_queue.append("uid-1", 0.1)
+        reading_queue.close()
+        self.assertEqual(ReadingQueue(path).peek(10), [("uid-1", 0.1)])
+
+    # positive test
+    # queued readings are replayed in one batch transaction
+    def test_drain_backlog_batch(self):
+        """
+        test drain_backlog sends the queue with storeMeterReadings and empties it
+        """
+        readings_instance = GenerateReadings(
+            self.private_key, self.mock_w3, self.mock_contract, self.mock_app
+        )
+        readings_instance.reading_queue.append("first", 0.1)
+        readings_instance.reading_queue.append("second", 0.25)
+
+        drained = asyncio.run(readings_instance.drain_backlog())
+
+        self.assertEqual(drained, 2)
+        self.assertEqual(len(readings_instance.reading_queue), 0)
+        self.mock_contract.functions.storeMeterReadings.assert_called_once_with(
+            ["first", "second"], [100, 250]
+        )
+        self.assertEqual(readings_instance.store_readings_obj.readings_stored, 2)
+
+    # positive test
+    # readings the scheduler is still sending are not drained twice
+    def test_next_drain_batch_skips_active(self):
+        """
+        test next_drain_batch leaves out uids held by the scheduler
+        """
+        readings_instance = GenerateReadings(
+            self.private_key, self.mock_w3, self.mock_contract, self.mock_app
+        )
+        readings_instance.reading_queue.append("sending", 0.1)
+        readings_instance.reading_queue.append("waiting", 0.2)
+        readings_instance.scheduler.active.add("sending")
+
+        self.assertEqual(readings_instance.next_drain_batch(), [("waiting", 0.2)])
+
+    # negative test
+    # an unreachable node leaves the batch queued
+    def test_drain_backlog_batch_unreachable(self):
+        """
+        test drain_backlog keeps the whole batch when the node can not be reached
+        """
+        readings_instance = GenerateReadings(
+            self.private_key, self.mock_w3, self.mock_contract, self.mock_app
+        )
+        readings_instance.reading_queue.append("first", 0.1)
+        readings_instance.reading_queue.append("second", 0.25)
+        self.mock_contract.functions.storeMeterReadings.return_value.transact.side_effect = (
+            Exception("connection refused")
+        )
+
+        drained = asyncio.run(readings_instance.drain_backlog())
+
+        self.assertEqual(drained, 0)
+        self.assertEqual(len(readings_instance.reading_queue), 2)
+
+    # positive test
+    # the connection monitor reports a reconnect
+    @patch("time.sleep", return_value=None)
+    def test_check_connection_reconnect(self, mock_sleep):
+        """
+        test on_reconnect is called when the connection comes back
+        """
+        on_reconnect = MagicMock()
+        monitor = BlockchainConnectionMonitor(
+            self.mock_app, self.mock_w3, on_reconnect=on_reconnect
+        )
+
+        for connected in (True, False, True):
+            self.mock_w3.is_connected.return_value = connected
+            monitor.check_connection(stop_flag=True)
+
+        on_reconnect.assert_called_once()
+
     # positive test
     # simulate storing readings in blockchain
     @patch(
@@ -151,17 +357,147 @@ class TestClientBlockchain(unittest.TestCase):
 
         mock_store_reading.assert_called_once_with(5)
 
+    # positive test
+    # reading history is streamed page by page
+    def test_iter_readings_pages(self):
+        """
+        test BlockchainReadingHistory.iter_readings walks every page and can resume
+        """
+        history = [(f"uid-{i}", (i + 1) * 100) for i in range(7)]
+        history_instance = BlockchainReadingHistory(
+            self.private_key, self.mock_w3, self.mock_contract, page_size=3
+        )
+        history_instance.get_page = MagicMock(
+            side_effect=lambda offset, limit: history[offset:offset + limit]
+        )
+
+        async def collect(offset):
+            return [item async for item in history_instance.iter_readings(offset)]
+
+        readings = asyncio.run(collect(0))
+        self.assertEqual(len(readings), 7)
+        self.assertEqual(readings[0], (0, "uid-0", 0.1))
+        self.assertEqual(readings[-1], (6, "uid-6", 0.7))
+        self.assertEqual(history_instance.get_page.call_count, 3)
+
+        resumed = asyncio.run(collect(5))
+        self.assertEqual([index for index, _uid, _reading in resumed], [5, 6])
+
+    # positive test
+    # on AsyncWeb3 the page calls are awaited instead of run on a thread
+    def test_iter_readings_async_provider(self):
+        """
+        test BlockchainReadingHistory.iter_readings awaits AsyncWeb3 contract calls
+        """
+        history = [(f"uid-{i}", (i + 1) * 100) for i in range(4)]
+        self.mock_w3.provider.is_async = True
+        page_function = self.mock_contract.functions.getMeterReadingsPage
+        page_function.side_effect = lambda offset, limit: MagicMock(
+            call=AsyncMock(return_value=history[offset:offset + limit])
+        )
+        history_instance = BlockchainReadingHistory(
+            self.private_key, self.mock_w3, self.mock_contract, page_size=3
+        )
+
+        async def collect():
+            return [item async for item in history_instance.iter_readings()]
+
+        with patch("client.blockchain_client.asyncio.to_thread") as to_thread:
+            readings = asyncio.run(collect())
+            to_thread.assert_not_called()
+        self.assertEqual(len(readings), 4)
+        self.assertEqual(readings[-1], (3, "uid-3", 0.4))
+        self.assertEqual(page_function.call_count, 2)
+
+    # positive test
+    # senders on one Web3 share a manager, another Web3 gets its own
+    def test_nonce_manager_per_web3(self):
+        """
+        test NonceManager.for_account keys managers by Web3 and address
+        """
+        other_w3 = MagicMock()
+
+        manager = NonceManager.for_account(self.mock_w3, "0xabc")
+
+        self.assertIs(NonceManager.for_account(self.mock_w3, "0xabc"), manager)
+        other = NonceManager.for_account(other_w3, "0xabc")
+        self.assertIsNot(other, manager)
+        self.assertIs(other.w3, other_w3)
+
+    # positive test
+    # nonces are handed out locally and resynced from the node
+    def test_nonce_manager(self):
+        """
+        test NonceManager counts up from the pending nonce and resyncs
+        """
+        self.mock_w3.eth.get_transaction_count.return_value = 5
+        nonce_manager = NonceManager(self.mock_w3, "0xabc")
+
+        self.assertEqual(asyncio.run(nonce_manager.next_nonce()), 5)
+        self.assertEqual(asyncio.run(nonce_manager.next_nonce()), 6)
+        self.mock_w3.eth.get_transaction_count.assert_called_once_with(
+            "0xabc", "pending"
+        )
+
+        self.mock_w3.eth.get_transaction_count.return_value = 9
+        asyncio.run(nonce_manager.resync())
+        self.assertEqual(asyncio.run(nonce_manager.next_nonce()), 9)
+
+    # negative test
+    # rejected signed transactions are resent after a resync
+    def test_send_signed_recovers_from_rejection(self):
+        """
+        test send_signed resyncs the nonce and retries when the node rejects a transaction
+        """
+        reading_instance = BlockchainStoreReading(
+            self.private_key, self.mock_w3, self.mock_contract, local_signing=True
+        )
+        reading_instance.acc = MagicMock()
+        reading_instance.nonce_manager = NonceManager(self.mock_w3, "0xabc")
+        self.mock_w3.eth.get_transaction_count.return_value = 3
+        self.mock_w3.eth.send_raw_transaction.side_effect = [
+            Exception("nonce too low"),
+            b"tx_hash",
+        ]
+
+        tx = asyncio.run(reading_instance.send_signed(MagicMock()))
+
+        self.assertEqual(tx, b"tx_hash")
+        self.assertEqual(self.mock_w3.eth.get_transaction_count.call_count, 2)
+
+    # negative test
+    # a reverted reading is not resent
+    def test_send_signed_revert_not_retried(self):
+        """
+        test send_signed raises a revert at once without resyncing the nonce
+        """
+        reading_instance = BlockchainStoreReading(
+            self.private_key, self.mock_w3, self.mock_contract, local_signing=True
+        )
+        reading_instance.acc = MagicMock()
+        reading_instance.nonce_manager = NonceManager(self.mock_w3, "0xabc")
+        self.mock_w3.eth.get_transaction_count.return_value = 3
+        self.mock_w3.eth.send_raw_transaction.side_effect = ContractLogicError(
+            "VM Exception while processing transaction: revert Duplicate reading is not allowed"
+        )
+
+        with self.assertRaises(ContractLogicError):
+            asyncio.run(reading_instance.send_signed(MagicMock()))
+
+        self.assertEqual(self.mock_w3.eth.send_raw_transaction.call_count, 1)
+        self.assertEqual(self.mock_w3.eth.get_transaction_count.call_count, 1)
+
     # negative test
     # test to see how get_contract is handled
-    @patch("client.blockchain_client.Web3")
+    @patch("client.blockchain_client.get_web3")
     @patch("builtins.open", mock_open())
-    def test_get_contract_error_handling(self, MockWeb3):
+    def test_get_contract_error_handling(self, mock_get_web3):
         """
         test get_contract function when web3 is not connected
         """
         self.mock_w3.is_connected.return_value = False
 
-        MockWeb3.return_value = self.mock_w3
+        mock_get_web3.return_value = self.mock_w3
 
         with self.assertRaises(BlockchainConnectionError):
             get_contract(self.mock_app)
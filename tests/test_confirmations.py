@@ -0,0 +1,214 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from hexbytes import HexBytes
+
+from client.confirmations import ConfirmationTracker
+
+# run test with = python -m unittest tests/test_confirmations.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestConfirmationTracker(unittest.TestCase):
+    """
+    unit tests for the block driven confirmation tracker
+    """
+
+    def setUp(self):
+        """
+        method sets up a mock web3 whose batches return the results queued in self.batches
+        """
+        self.mock_w3 = MagicMock()
+        self.mock_w3.provider.is_async = False
+        self.batches = []
+        batch = self.mock_w3.batch_requests.return_value.__enter__.return_value
+        batch.execute.side_effect = lambda: self.batches.pop(0)
+        self.tx_a = HexBytes("0x" + "aa" * 32)
+        self.tx_b = HexBytes("0x" + "bb" * 32)
+
+    def block(self, number, *tx_hashes, chain=0):
+        block_hash = HexBytes(bytes([chain]) + number.to_bytes(31, "big"))
+        return {"number": number, "hash": block_hash, "transactions": list(tx_hashes)}
+
+    def receipt(self, block_number):
+        return {"blockNumber": block_number, "status": 1}
+
+    # positive test
+    # every waiter in a block is resolved from one pass over it
+    def test_resolves_waiters(self):
+        """
+        test two transactions in one block are confirmed with three requests
+        """
+        tracker = ConfirmationTracker(self.mock_w3)
+        tracker.last_block = 4
+        self.mock_w3.eth.block_number = 5
+        self.batches = [
+            [self.block(5, self.tx_a, self.tx_b)],
+            [self.receipt(5), self.receipt(5)],
+        ]
+
+        async def run():
+            waiters = [
+                asyncio.ensure_future(tracker.wait(tx)) for tx in (self.tx_a, self.tx_b)
+            ]
+            await asyncio.sleep(0)
+            await tracker.stop()
+            await tracker.poll()
+            return await asyncio.gather(*waiters)
+
+        receipts = asyncio.run(run())
+
+        self.assertEqual(receipts, [self.receipt(5), self.receipt(5)])
+        self.assertEqual(tracker.requests_sent, 3)
+        self.assertEqual(tracker.pending, {})
+
+    # positive test
+    # a transaction mined before anyone waited on it is still found
+    def test_late_waiter(self):
+        """
+        test a hash seen in an earlier block resolves a later waiter
+        """
+        tracker = ConfirmationTracker(self.mock_w3)
+        tracker.last_block = 4
+        self.mock_w3.eth.block_number = 5
+        self.batches = [[self.block(5, self.tx_a)], [self.receipt(5)]]
+
+        async def run():
+            await tracker.poll()
+            waiter = asyncio.ensure_future(tracker.wait(self.tx_a))
+            await asyncio.sleep(0)
+            await tracker.stop()
+            await tracker.poll()
+            return await waiter
+
+        self.assertEqual(asyncio.run(run()), self.receipt(5))
+
+    # positive test
+    # a sync provider's requests are sent from a thread so the event loop is not blocked
+    def test_sync_requests_off_loop(self):
+        """
+        test eth_blockNumber and the batches run on a thread other than the event loop's
+        """
+        tracker = ConfirmationTracker(self.mock_w3)
+        tracker.last_block = 4
+        threads = []
+        type(self.mock_w3.eth).block_number = property(
+            lambda eth: threads.append(threading.get_ident()) or 5
+        )
+        self.batches = [[self.block(5, self.tx_a)], [self.receipt(5)]]
+        batch = self.mock_w3.batch_requests.return_value.__enter__.return_value
+        batch.execute.side_effect = lambda: threads.append(
+            threading.get_ident()
+        ) or self.batches.pop(0)
+
+        async def run():
+            waiter = asyncio.ensure_future(tracker.wait(self.tx_a))
+            await asyncio.sleep(0)
+            await tracker.stop()
+            await tracker.poll()
+            return await waiter
+
+        self.assertEqual(asyncio.run(run()), self.receipt(5))
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    # negative test
+    # waiters are not resolved before the confirmation depth is reached
+    def test_confirmation_depth(self):
+        """
+        test a depth of 3 needs two more blocks on top of the transaction
+        """
+        tracker = ConfirmationTracker(self.mock_w3, confirmations=3)
+        tracker.last_block = 4
+        self.batches = [
+            [self.block(5, self.tx_a)],
+            [self.receipt(5)],
+            [self.block(5, self.tx_a), self.block(6), self.block(7)],
+        ]
+
+        async def run():
+            waiter = asyncio.ensure_future(tracker.wait(self.tx_a))
+            await asyncio.sleep(0)
+            await tracker.stop()
+            self.mock_w3.eth.block_number = 5
+            await tracker.poll()
+            resolved_early = waiter.done()
+            self.mock_w3.eth.block_number = 7
+            await tracker.poll()
+            return resolved_early, await waiter
+
+        resolved_early, receipt = asyncio.run(run())
+
+        self.assertFalse(resolved_early)
+        self.assertEqual(receipt, self.receipt(5))
+
+    # negative test
+    # a chain restarted below the last block followed is followed again
+    def test_chain_restart(self):
+        """
+        test the tracker forgets the old chain's hashes when the block number goes back
+        """
+        tracker = ConfirmationTracker(self.mock_w3)
+        tracker.last_block = 4
+        self.mock_w3.eth.block_number = 5
+        self.batches = [[self.block(5, self.tx_a)], [self.block(0), self.block(1)]]
+
+        async def run():
+            await tracker.poll()
+            self.mock_w3.eth.block_number = 1
+            await tracker.poll()
+
+        asyncio.run(run())
+
+        self.assertEqual(tracker.last_block, 1)
+        self.assertNotIn(self.tx_a, tracker.seen)
+
+    # negative test
+    # a block replaced under the tracker drops what was seen in it
+    def test_block_hash_changed(self):
+        """
+        test a new hash for the last block followed resets the tracker
+        """
+        tracker = ConfirmationTracker(self.mock_w3)
+        tracker.last_block = 4
+        self.batches = [
+            [self.block(5, self.tx_a)],
+            [self.block(5, chain=1), self.block(6, chain=1)],
+        ]
+
+        async def run():
+            self.mock_w3.eth.block_number = 5
+            await tracker.poll()
+            self.mock_w3.eth.block_number = 6
+            return await tracker.poll()
+
+        behind = asyncio.run(run())
+
+        self.assertTrue(behind)
+        self.assertIsNone(tracker.last_block)
+        self.assertEqual(tracker.seen, {})
+
+    # negative test
+    # a waiter that gives up stops being tracked
+    def test_timed_out_waiter_removed(self):
+        """
+        test a cancelled wait removes its hash from pending
+        """
+        tracker = ConfirmationTracker(self.mock_w3)
+
+        async def run():
+            waiter = asyncio.ensure_future(tracker.wait(self.tx_a))
+            await asyncio.sleep(0)
+            await tracker.stop()
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+
+        asyncio.run(run())
+
+        self.assertEqual(tracker.pending, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
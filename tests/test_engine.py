@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from client.engine import MeterEngine
+from client.renderers import MeterDisplay
+
+# run test with = python -m unittest tests/test_engine.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestMeterEngine(unittest.TestCase):
+    """
+    unit tests for the headless meter engine
+    """
+
+    # positive test
+    # headless display keeps the meter state without widgets
+    def test_headless_display(self):
+        """
+        test MeterDisplay updates its MeterState
+        """
+        display = MeterDisplay()
+        display.state.set_bill(1.23, 4.56)
+        display.update_connection_status("error")
+
+        self.assertEqual(display.state.usage, 4.56)
+        self.assertEqual(display.state.connection_status, "error")
+
+    # positive test
+    # alerts and connection status are fanned out to every meter
+    def test_fan_out(self):
+        """
+        test engine wide updates reach every meter display
+        """
+        engine = MeterEngine(3)
+        engine.displays = [MeterDisplay() for _ in range(3)]
+
+        engine.update_notice_message("Grid overload")
+        engine.update_connection_status("connected")
+
+        for display in engine.displays:
+            self.assertEqual(display.state.alert, "Grid overload")
+            self.assertEqual(display.state.connection_status, "connected")
+
+    # positive test
+    # meters share accounts once there are more meters than accounts
+    def test_private_keys_cycle(self):
+        """
+        test get_private_key skips the deployer account and wraps around
+        """
+        self.assertEqual(MeterEngine.get_private_key(0), MeterEngine.get_private_key(49))
+        self.assertNotEqual(
+            MeterEngine.get_private_key(0), MeterEngine.get_private_key(1)
+        )
+
+    # positive test
+    # meters past the runtime config's keys get their own accounts
+    def test_private_keys_past_runtime_config(self):
+        """
+        test keys the runtime config does not hold come from the accounts file
+        """
+        pairs = [(f"0x{i}", f"key-{i}") for i in range(3)]
+        accounts = {"private_keys": {f"0x{i}": f"key-{i}" for i in range(6)}}
+        with patch("client.engine.get_account_pairs", return_value=pairs), patch(
+            "client.engine.load_accounts_data", return_value=accounts
+        ), patch("client.engine.get_private_key", side_effect=lambda i: f"key-{i}"):
+            keys = [MeterEngine.get_private_key(i) for i in range(6)]
+
+        self.assertEqual(keys, ["key-1", "key-2", "key-3", "key-4", "key-5", "key-1"])
+
+    # positive test
+    # every meter gets a reading generator and a bill watcher
+    def test_create_meters(self):
+        """
+        test create_meters builds two coroutines per meter
+        """
+        engine = MeterEngine(4, min_wait=1, max_wait=2)
+        coroutines = engine.create_meters(MagicMock(), MagicMock())
+
+        self.assertEqual(len(coroutines), 8)
+        self.assertEqual(len(engine.displays), 4)
+        self.assertEqual(engine.readings_objs[0].min_wait, 1)
+        for coroutine in coroutines:
+            coroutine.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from client.event_subscription import (
+    LOG_INDEX_END,
+    BlockCursor,
+    EventSubscription,
+)
+
+# run test with = python -m unittest tests/test_event_subscription.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestEventSubscription(unittest.TestCase):
+    """
+    unit tests for the block cursor event subscription
+    """
+
+    def setUp(self):
+        """
+        method sets up a mock web3 whose GridAlert logs are kept in self.logs
+        """
+        self.mock_w3 = MagicMock()
+        self.mock_w3.provider.is_async = False
+        self.mock_w3.eth.block_number = 0
+        self.logs = []
+        self.requests = []
+        self.threads = []
+        self.failing_sizes = set()
+        self.event = MagicMock()
+        self.event.get_logs.side_effect = self.get_logs
+        self.handled = []
+
+    def get_logs(self, argument_filters=None, from_block=None, to_block=None):
+        self.requests.append((from_block, to_block))
+        self.threads.append(threading.get_ident())
+        if to_block - from_block + 1 in self.failing_sizes:
+            raise ValueError("query returned more than 10000 results")
+        return [
+            log for log in self.logs if from_block <= log["blockNumber"] <= to_block
+        ]
+
+    def log(self, block_number, log_index=0):
+        return {"blockNumber": block_number, "logIndex": log_index}
+
+    def subscription(self, cursor=None, **kwargs):
+        return EventSubscription(
+            self.mock_w3,
+            self.event,
+            self.handled.append,
+            name="GridAlert",
+            cursor=cursor,
+            **kwargs,
+        )
+
+    # positive test
+    # a long gap is read back in chunks before tailing new blocks
+    def test_backfill_in_chunks(self):
+        """
+        test every missed log is handled once with chunk sized requests
+        """
+        self.mock_w3.eth.block_number = 25
+        self.logs = [self.log(3), self.log(12, 0), self.log(12, 1), self.log(25)]
+        subscription = self.subscription(start_block=0, chunk_size=10)
+
+        asyncio.run(subscription.catch_up())
+
+        self.assertEqual(self.handled, self.logs)
+        self.assertEqual(self.requests, [(0, 9), (10, 25)])
+        self.assertEqual(subscription.position, (25, LOG_INDEX_END))
+
+    # positive test
+    # a sync provider's eth_getLogs is sent from a thread so the event loop is not blocked
+    def test_sync_get_logs_off_loop(self):
+        """
+        test every eth_getLogs request runs on a thread other than the event loop's
+        """
+        self.mock_w3.eth.block_number = 25
+        self.logs = [self.log(3), self.log(25)]
+        subscription = self.subscription(start_block=0, chunk_size=10)
+
+        asyncio.run(subscription.catch_up())
+
+        self.assertEqual(self.handled, self.logs)
+        self.assertEqual(len(self.threads), 2)
+        self.assertNotIn(threading.get_ident(), self.threads)
+
+    # positive test
+    # a failing range is retried with smaller chunks
+    def test_adaptive_chunk_size(self):
+        """
+        test the chunk is halved after an eth_getLogs error
+        """
+        self.mock_w3.eth.block_number = 40
+        self.logs = [self.log(30)]
+        self.failing_sizes = {40}
+        subscription = self.subscription(start_block=1, chunk_size=40)
+
+        asyncio.run(subscription.catch_up())
+
+        self.assertEqual(self.requests[:2], [(1, 40), (1, 20)])
+        self.assertEqual(self.handled, self.logs)
+
+    # positive test
+    # a restarted subscription carries on from the saved cursor
+    def test_resume_from_cursor(self):
+        """
+        test logs already handled before a restart are not handled again
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "events.sqlite")
+            self.mock_w3.eth.block_number = 5
+            self.logs = [self.log(5, 0)]
+            asyncio.run(self.subscription(BlockCursor(path), start_block=0).poll())
+
+            self.mock_w3.eth.block_number = 8
+            self.logs.append(self.log(7, 2))
+            asyncio.run(self.subscription(BlockCursor(path), start_block=0).poll())
+
+        self.assertEqual(self.handled, [self.log(5, 0), self.log(7, 2)])
+
+    # negative test
+    # logs at or before the cursor are skipped
+    def test_deduplicates_by_position(self):
+        """
+        test a block read again after a relayed alert skips the handled log
+        """
+        self.mock_w3.eth.block_number = 4
+        self.logs = [self.log(4, 0), self.log(4, 1)]
+        subscription = self.subscription(start_block=0)
+        subscription.advance((4, 0))
+
+        asyncio.run(subscription.poll())
+
+        self.assertEqual(self.handled, [self.log(4, 1)])
+        self.assertEqual(subscription.duplicates, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import unittest
+from uuid import uuid4
+
+# gas regression tests run against the contract deployed on an in-process py-evm
+# chain, no Ganache needed. The contract comes from the Truffle artifact or is
+# compiled with py-solc-x, the tests are skipped when neither is available or
+# eth-tester is not installed
+# run test with = python -m unittest tests/test_gas_regression.py
+# number of readings per account can be changed with GAS_REGRESSION_READINGS
+
+READINGS_PER_ACCOUNT = int(os.getenv("GAS_REGRESSION_READINGS", "2000"))
+ACCOUNT_INDEXES = (1, 2)
+WARMUP_READINGS = 10  # first writes to a meter's totals cost more as slots go from zero
+WINDOW = 100
+TOLERANCE = 0.01  # allowed relative gas growth between the first and last window
+
+
+class TestGasRegression(unittest.TestCase):
+    """
+    gas regression tests for storing and looking up meter readings
+    gas per call must stay flat as the reading history grows
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        deploys the contract to an in-process chain, skips the tests if it cannot
+        be built
+        """
+        try:
+            from benchmarks.evm import InProcessChain
+        except ImportError as e:
+            raise unittest.SkipTest(f"eth-tester is not installed: {e}")
+        try:
+            chain = InProcessChain(accounts=max(ACCOUNT_INDEXES) + 1)
+        except Exception as e:
+            raise unittest.SkipTest(f"Contract bytecode is not available: {e}")
+        cls.w3 = chain.w3
+        cls.contract = chain.contract
+        cls.addresses = [cls.w3.eth.accounts[index] for index in ACCOUNT_INDEXES]
+
+    def store_readings(self, address, count):
+        """
+        stores count readings for address and returns gas used and uid of each one
+        """
+        gas_used = []
+        uids = []
+        for _ in range(count):
+            uid = str(uuid4())
+            tx = self.contract.functions.storeMeterReading(uid, 500).transact(
+                {"from": address}
+            )
+            receipt = self.w3.eth.wait_for_transaction_receipt(tx)
+            gas_used.append(receipt.gasUsed)
+            uids.append(uid)
+        return gas_used, uids
+
+    def assert_flat(self, first, last):
+        """
+        checks the mean gas of the last window did not grow beyond the tolerance
+        """
+        first_mean = sum(first) / len(first)
+        last_mean = sum(last) / len(last)
+        self.assertLessEqual(
+            last_mean,
+            first_mean * (1 + TOLERANCE),
+            f"gas grew from {first_mean:.0f} to {last_mean:.0f}",
+        )
+
+    # positive test
+    # store and lookup gas does not grow with history
+    def test_gas_stays_flat(self):
+        """
+        submits thousands of readings per account and compares gas used
+        by the first and last readings, and by uid lookups of both
+        """
+        for address in self.addresses:
+            with self.subTest(address=address):
+                gas_used, uids = self.store_readings(address, READINGS_PER_ACCOUNT)
+                self.assert_flat(
+                    gas_used[WARMUP_READINGS:WARMUP_READINGS + WINDOW],
+                    gas_used[-WINDOW:],
+                )
+
+                lookup = self.contract.functions.getSpecificMeterReading
+                first_lookup = lookup(uids[0]).estimate_gas({"from": address})
+                last_lookup = lookup(uids[-1]).estimate_gas({"from": address})
+                self.assert_flat([first_lookup], [last_lookup])
+
+    # negative test
+    # duplicates are still rejected through the uid index
+    def test_duplicate_uid_rejected(self):
+        """
+        storing the same uid twice must revert
+        """
+        address = self.addresses[0]
+        _gas_used, uids = self.store_readings(address, 1)
+
+        with self.assertRaises(Exception) as context:
+            self.contract.functions.storeMeterReading(uids[0], 500).transact(
+                {"from": address}
+            )
+        self.assertIn("Duplicate reading is not allowed", str(context.exception))
+
+    # positive test
+    # a batch costs less gas per reading and bills the same as single readings
+    def test_batch_gas_per_reading(self):
+        """
+        stores the same readings one by one and as one storeMeterReadings batch
+        and compares gas per reading and the bill increase
+        """
+        single_address, batch_address = self.addresses
+        readings = [500, 1234, 999, 1] * 5
+
+        bill_before = self.contract.functions.getMeterBill().call({"from": single_address})
+        single_gas = []
+        for reading in readings:
+            tx = self.contract.functions.storeMeterReading(str(uuid4()), reading).transact(
+                {"from": single_address}
+            )
+            single_gas.append(self.w3.eth.wait_for_transaction_receipt(tx).gasUsed)
+        single_bill = (
+            self.contract.functions.getMeterBill().call({"from": single_address})
+            - bill_before
+        )
+
+        bill_before = self.contract.functions.getMeterBill().call({"from": batch_address})
+        tx = self.contract.functions.storeMeterReadings(
+            [str(uuid4()) for _ in readings], readings
+        ).transact({"from": batch_address})
+        batch_gas = self.w3.eth.wait_for_transaction_receipt(tx).gasUsed
+        batch_bill = (
+            self.contract.functions.getMeterBill().call({"from": batch_address})
+            - bill_before
+        )
+
+        self.assertLess(batch_gas / len(readings), sum(single_gas) / len(readings))
+        self.assertEqual(batch_bill, single_bill)
+
+
+if __name__ == "__main__":
+    unittest.main()
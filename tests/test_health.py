@@ -0,0 +1,123 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from client.blockchain_client import GenerateReadings, run_resilient
+from client.health import CLOSED, OPEN, ConnectionHealth
+
+# run test with = python -m unittest tests/test_health.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestConnectionHealth(unittest.TestCase):
+    """
+    unit tests for the connection health check and its circuit breaker
+    """
+
+    def setUp(self):
+        """
+        method sets up a health check on a mock async web3 with no backoff delay
+        """
+        self.mock_app = MagicMock()
+        self.on_reconnect = MagicMock()
+        self.health = ConnectionHealth(
+            self.mock_app,
+            on_reconnect=self.on_reconnect,
+            base_delay=0,
+            max_delay=0,
+        )
+        self.health.w3 = MagicMock()
+        self.health.w3.is_connected = AsyncMock(return_value=True)
+
+    # positive test
+    # the first connection is retried until the node answers
+    @patch("client.health.asyncio.sleep", new_callable=AsyncMock)
+    @patch("client.health.get_async_contract", new_callable=AsyncMock)
+    def test_connect_retries(self, mock_get_contract, mock_sleep):
+        """
+        test connect backs off after each failure and returns the contract
+        """
+        mock_get_contract.side_effect = [
+            Exception("Failed to connect to the blockchain"),
+            Exception("Failed to connect to the blockchain"),
+            ("w3", "contract"),
+        ]
+
+        result = asyncio.run(self.health.connect())
+
+        self.assertEqual(result, ("w3", "contract"))
+        self.assertEqual(mock_sleep.await_count, 2)
+
+    # positive test
+    # repeated failures open the circuit and pause callers
+    def test_failures_open_circuit(self):
+        """
+        test failure_threshold failures open the circuit and report an error
+        """
+        for _ in range(self.health.failure_threshold):
+            self.health.record_failure(Exception("timeout"))
+
+        self.assertEqual(self.health.state, OPEN)
+        self.assertFalse(self.health.available)
+        self.assertFalse(self.health._available.is_set())
+        self.mock_app.update_connection_status.assert_called_with("error")
+
+    # positive test
+    # a reachable node closes the circuit with a new provider
+    @patch("client.health.rebuild_async_web3", new_callable=AsyncMock)
+    def test_reconnect_rebinds(self, mock_rebuild):
+        """
+        test the half open probe rebuilds the provider and requests a drain
+        """
+        self.health.open_circuit("probe failed")
+
+        async def run():
+            task = asyncio.ensure_future(self.health.run())
+            await asyncio.wait_for(self.health.wait_available(), 1)
+            task.cancel()
+
+        asyncio.run(run())
+
+        self.assertEqual(self.health.state, CLOSED)
+        mock_rebuild.assert_awaited_once_with(self.health.w3)
+        self.on_reconnect.assert_called_once()
+        self.assertEqual(self.health.stats()["rebinds"], 1)
+        self.mock_app.update_connection_status.assert_called_with("connected")
+
+    # negative test
+    # readings are only queued while the circuit is open
+    def test_open_circuit_skips_drain(self):
+        """
+        test drain_backlog sends nothing while the node is unavailable
+        """
+        self.health.open_circuit("probe failed")
+        readings_obj = GenerateReadings(
+            "0x" + "11" * 32,
+            MagicMock(),
+            MagicMock(),
+            MagicMock(),
+            health=self.health,
+        )
+        readings_obj.reading_queue.append("uid-1", 0.5)
+        readings_obj.store_readings_obj.store_readings = AsyncMock()
+
+        drained = asyncio.run(readings_obj.drain_backlog())
+
+        self.assertEqual(drained, 0)
+        readings_obj.store_readings_obj.store_readings.assert_not_called()
+        self.assertEqual(len(readings_obj.reading_queue), 1)
+
+    # negative test
+    # without a health check monitor errors are still raised
+    def test_run_resilient_without_health(self):
+        """
+        test run_resilient raises when no health check is given
+        """
+        monitor = AsyncMock(side_effect=Exception("filter not found"))
+
+        with self.assertRaises(Exception):
+            asyncio.run(run_resilient(monitor))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,241 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from array import array
+from unittest.mock import MagicMock
+
+from web3.exceptions import BlockNotFound
+
+from client.event_subscription import LOG_INDEX_END
+from server.indexer import ReadingIndexer, ReadingStore
+
+# run test with = python -m unittest tests/test_indexer.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestReadingIndexer(unittest.TestCase):
+    """
+    unit tests for the server's reading indexer and its SQLite store
+    """
+
+    def setUp(self):
+        """
+        method sets up a mock web3 with reading logs in self.logs and 1 hour blocks,
+        block hashes change with self.chain
+        """
+        self.mock_w3 = MagicMock()
+        self.mock_w3.provider.is_async = False
+        self.mock_w3.eth.block_number = 3
+        self.mock_w3.eth.get_block.side_effect = self.get_block
+        self.chain = "a"
+        batch = self.mock_w3.batch_requests.return_value.__enter__.return_value
+        batch.add.side_effect = lambda block: self.added.append(block)
+        batch.execute.side_effect = lambda: self.added[:]
+        self.added = []
+        self.logs = [
+            self.single(1, "0xA", 500),
+            self.batch(2, "0xB", [1000, 2000]),
+            self.single(3, "0xA", 250),
+        ]
+        self.mock_contract = MagicMock()
+        self.mock_contract.events.MeterReadingsSubmission.get_logs.side_effect = (
+            lambda argument_filters, from_block, to_block: [
+                log for log in self.logs if from_block <= log["blockNumber"] <= to_block
+            ]
+        )
+
+    def get_block(self, number):
+        if number > self.mock_w3.eth.block_number:
+            raise BlockNotFound(f"Block {number} not found")
+        return {
+            "number": number,
+            "timestamp": number * 3600,
+            "hash": f"{self.chain}-{number}".encode(),
+        }
+
+    def single(self, block_number, meter, reading):
+        return {
+            "blockNumber": block_number,
+            "logIndex": 0,
+            "args": {
+                "addr": meter,
+                "mtr": {"uid": f"uid-{block_number}", "mtr_reading": reading},
+            },
+        }
+
+    def batch(self, block_number, meter, readings):
+        return {
+            "blockNumber": block_number,
+            "logIndex": 0,
+            "args": {"addr": meter, "firstIndex": 0, "mtr_readings": readings},
+        }
+
+    def index(self, store):
+        self.added.clear()
+        indexer = ReadingIndexer(
+            self.mock_w3, self.mock_contract, "MeterReadingsSubmission", store
+        )
+        asyncio.run(indexer.catch_up())
+        return indexer
+
+    # positive test
+    # every reading is stored with its totals and bill
+    def test_ingest_and_totals(self):
+        """
+        test single and batched readings are indexed into the meter totals
+        """
+        store = ReadingStore()
+        indexer = self.index(store)
+
+        self.assertEqual(indexer.readings_indexed, 4)
+        self.assertEqual(store.reading_count(), 4)
+        self.assertEqual(
+            store.meter_totals(top=1),
+            [{"meter": "0xB", "total_usage": 3000, "reading_count": 2, "bill": 66}],
+        )
+        # (500 * 22) // 1000 + (250 * 22) // 1000, rounded per reading
+        self.assertEqual(store.bills("0xA"), {"0xA": 16})
+        self.assertEqual(store.meters(), ["0xA", "0xB"])
+
+    # positive test
+    # usage is summed per time bucket
+    def test_usage_by_bucket(self):
+        """
+        test hourly buckets come from the rollup and other sizes from the readings
+        """
+        store = ReadingStore()
+        self.index(store)
+
+        hourly = store.usage_by_bucket(3600)
+        self.assertEqual([bucket["usage"] for bucket in hourly], [500, 3000, 250])
+        two_hours = store.usage_by_bucket(7200, meter="0xA")
+        self.assertEqual(
+            two_hours,
+            [
+                {"bucket": 0, "usage": 500, "readings": 1},
+                {"bucket": 7200, "usage": 250, "readings": 1},
+            ],
+        )
+        half_hours = store.usage_by_bucket(1800)
+        self.assertEqual(len(half_hours), 3)
+
+    # negative test
+    # a restarted indexer does not index a reading twice
+    def test_resume_without_duplicates(self):
+        """
+        test indexing again from the same store only adds new readings
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.sqlite")
+            self.index(ReadingStore(path))
+
+            self.mock_w3.eth.block_number = 4
+            self.logs.append(self.single(4, "0xC", 100))
+            store = ReadingStore(path)
+            indexer = self.index(store)
+
+            self.assertEqual(indexer.readings_indexed, 1)
+            self.assertEqual(store.reading_count(), 5)
+            self.assertEqual(
+                store.load("MeterReadingsSubmission"), (4, LOG_INDEX_END)
+            )
+            store.close()
+
+    # positive test
+    # readings are packed into columns, and rebuilt for a store indexed without them
+    def test_reading_columns(self):
+        """
+        test a meter's columns hold its readings and are backfilled when missing
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.sqlite")
+            store = ReadingStore(path)
+            self.index(store)
+            self.assertEqual(store.indexed_block(), -1)
+            store.save("MeterReadingSubmission", (3, 0))
+            # Only block 2 has every log of both events indexed
+            self.assertEqual(store.indexed_block(), 2)
+            columns = store.reading_columns(["0xA"], through_block=3)
+            self.assertEqual(sum(count for _meter, count, *_ in columns), 2)
+
+            store._connection.execute("DELETE FROM reading_columns")
+            store._connection.commit()
+            store.close()
+            store = ReadingStore(path)
+            ((meter, count, _blocks, timestamps, readings),) = store.reading_columns(
+                ["0xA"], through_block=3
+            )
+            self.assertEqual((meter, count), ("0xA", 2))
+            self.assertEqual(timestamps, array("q", [3600, 10800]).tobytes())
+            self.assertEqual(readings, array("q", [500, 250]).tobytes())
+            # Before start and through the indexed block, only counted
+            columns = store.reading_columns(["0xA"], start=20000, through_block=3)
+            self.assertEqual(columns[0][2:], (None,) * 3)
+            store.close()
+
+    # negative test
+    # a reverted chain is indexed again instead of clashing with the old rows
+    def test_reindex_after_revert(self):
+        """
+        test a changed block hash or a chain below the cursor resets the store
+        """
+        store = ReadingStore()
+        self.index(store)
+
+        # Reverted and mined again up to the same height with other readings
+        self.chain = "b"
+        self.logs = [self.single(2, "0xC", 700), self.single(3, "0xC", 300)]
+        indexer = self.index(store)
+        self.assertEqual(store.resets, 1)
+        self.assertEqual(indexer.readings_indexed, 2)
+        self.assertEqual(store.bills(), {"0xC": 15 + 6})
+        self.assertEqual(store.last_block_hash(), (3, b"b-3".hex()))
+
+        # Reset to a chain shorter than the cursor
+        self.mock_w3.eth.block_number = 2
+        self.chain = "c"
+        self.logs = [self.single(2, "0xD", 1000)]
+        self.index(store)
+        self.assertEqual(store.resets, 2)
+        self.assertEqual(store.meters(), ["0xD"])
+        self.assertEqual(store.load("MeterReadingsSubmission"), (2, LOG_INDEX_END))
+
+    # negative test
+    # an indexer sharing the store starts over when the other one resets it
+    def test_reset_by_other_indexer(self):
+        """
+        test a chunk fetched while the store was reset is dropped and indexed again
+        """
+        store = ReadingStore()
+        self.index(store)
+        self.mock_contract.events.MeterReadingSubmission.get_logs.side_effect = (
+            lambda argument_filters, from_block, to_block: [
+                log for log in self.logs if from_block <= log["blockNumber"] <= to_block
+            ]
+        )
+        single = ReadingIndexer(
+            self.mock_w3, self.mock_contract, "MeterReadingSubmission", store
+        )
+        batch = self.mock_w3.batch_requests.return_value.__enter__.return_value
+        execute = batch.execute.side_effect
+
+        def reset_once():
+            # The other indexer saw a new chain while these blocks were fetched
+            batch.execute.side_effect = execute
+            store.reset()
+            return execute()
+
+        batch.execute.side_effect = reset_once
+        asyncio.run(single.poll())
+        self.assertEqual(store.reading_count(), 0)
+        self.assertEqual(store.load("MeterReadingSubmission"), (-1, LOG_INDEX_END))
+
+        self.added.clear()
+        asyncio.run(single.catch_up())
+        self.assertEqual(store.reading_count(), 4)
+        self.assertEqual(store.load("MeterReadingSubmission"), (3, LOG_INDEX_END))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,221 @@
+import os
+import signal
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from eth_account import Account
+from eth_utils import function_abi_to_4byte_selector
+
+from client import instrumentation
+from client.instrumentation import Profile, RpcProfiler, install_dump_handlers
+
+# run test with = python -m unittest tests/test_instrumentation.py
+# all tests = python -m unittest discover -s tests
+
+STORE_READING_ABI = {
+    "type": "function",
+    "name": "storeMeterReading",
+    "inputs": [
+        {"name": "uid", "type": "string"},
+        {"name": "mtr_reading", "type": "uint256"},
+    ],
+    "outputs": [],
+}
+SUMMARY_ABI = {
+    "type": "function",
+    "name": "getMeterSummary",
+    "inputs": [],
+    "outputs": [{"name": "bill", "type": "uint256"}],
+}
+TX_HASH = "0x" + "ab" * 32
+
+
+def selector(abi):
+    return "0x" + function_abi_to_4byte_selector(abi).hex()
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    unit tests for the per contract method RPC profile
+    """
+
+    def setUp(self):
+        """
+        method sets up a profile for two contract functions and its middleware
+        """
+        self.profile = Profile([STORE_READING_ABI, SUMMARY_ABI])
+        self.middleware = RpcProfiler.build(self.profile)(MagicMock())
+        self.store_selector = selector(STORE_READING_ABI)
+        self.summary_selector = selector(SUMMARY_ABI)
+
+    def send(self, method, params, response):
+        make_request = self.middleware.wrap_make_request(lambda method, params: response)
+        return make_request(method, params)
+
+    # positive test
+    # contract calls are named after the function they call
+    def test_names_contract_calls(self):
+        """
+        test eth_call is recorded under the function with its calldata and return size
+        """
+        self.send(
+            "eth_call",
+            [{"to": "0x1", "data": self.summary_selector}, "latest"],
+            {"result": "0x" + "00" * 32},
+        )
+        self.send("eth_blockNumber", [], {"result": "0x10"})
+
+        methods = self.profile.snapshot()["methods"]
+        summary = methods["getMeterSummary:eth_call"]
+        self.assertEqual(summary["calls"], 1)
+        self.assertEqual(summary["request_bytes"], 4)
+        self.assertEqual(summary["response_bytes"], 32)
+        self.assertEqual(summary["latency_ms"]["count"], 1)
+        self.assertEqual(methods["eth_blockNumber"]["calls"], 1)
+
+    # positive test
+    # gasUsed of a receipt is counted against the method that sent it
+    def test_gas_from_receipts(self):
+        """
+        test a signed transaction's receipt adds its gas to the sending function
+        """
+        account = Account.create()
+        signed = account.sign_transaction(
+            {
+                "to": "0x" + "11" * 20,
+                "data": self.store_selector + "00" * 64,
+                "nonce": 0,
+                "gas": 300000,
+                "gasPrice": 1,
+                "chainId": 1,
+            }
+        )
+        with patch.object(instrumentation, "GAS_WINDOW", 2):
+            for gas_used in ("0x61a8", "0x61a8"):
+                self.send(
+                    "eth_sendRawTransaction",
+                    [signed.raw_transaction.hex()],
+                    {"result": TX_HASH},
+                )
+                self.send(
+                    "eth_getTransactionReceipt",
+                    [TX_HASH],
+                    {
+                        "result": {
+                            "transactionHash": TX_HASH,
+                            "gasUsed": gas_used,
+                            "status": "0x1",
+                        }
+                    },
+                )
+
+        store = self.profile.snapshot()["methods"][
+            "storeMeterReading:eth_sendRawTransaction"
+        ]
+        self.assertEqual(store["calls"], 2)
+        self.assertEqual(store["gas_used"]["count"], 2)
+        self.assertEqual(store["gas_used"]["buckets"]["25000"], 2)
+        self.assertEqual(store["gas_used_windows"], [25000])
+        self.assertEqual(self.profile.pending, {})
+
+    # positive test
+    # raw transactions of every type are named from their RLP headers
+    def test_raw_transaction_types(self):
+        """
+        test legacy, EIP-2930 and EIP-1559 transactions give the selector and calldata size
+        """
+        account = Account.create()
+        base = {
+            "to": "0x" + "11" * 20,
+            "data": self.store_selector + "00" * 300,
+            "nonce": 70000,
+            "gas": 300000,
+            "value": 10**20,
+            "chainId": 1337,
+        }
+        transactions = [
+            {"gasPrice": 1},
+            {"gasPrice": 1, "accessList": []},
+            {"maxFeePerGas": 2 * 10**9, "maxPriorityFeePerGas": 10**9},
+        ]
+        for fields in transactions:
+            raw = account.sign_transaction({**base, **fields}).raw_transaction
+            for encoded in (raw, raw.hex(), "0x" + raw.hex()):
+                self.assertEqual(
+                    instrumentation.raw_transaction_data(encoded),
+                    (self.store_selector, 304),
+                )
+
+    # positive test
+    # every request in a JSON-RPC batch is recorded
+    def test_batch_requests(self):
+        """
+        test batched calls are recorded per function
+        """
+        make_batch_request = self.middleware.wrap_make_batch_request(
+            lambda requests_info: [{"result": "0x"} for _ in requests_info]
+        )
+        make_batch_request(
+            [("eth_call", [{"data": self.summary_selector}, "latest"])] * 3
+        )
+
+        summary = self.profile.snapshot()["methods"]["getMeterSummary:eth_call"]
+        self.assertEqual(summary["calls"], 3)
+
+    # negative test
+    # reverts, RPC errors and exceptions are counted by class
+    def test_error_classes(self):
+        """
+        test failed requests are counted under their error class and still raise
+        """
+        self.send(
+            "eth_call",
+            [{"data": self.summary_selector}, "latest"],
+            {"error": {"code": 3, "message": "execution reverted: Not Authorized"}},
+        )
+        self.send("eth_blockNumber", [], {"error": {"code": -32000, "message": "busy"}})
+
+        def timeout(method, params):
+            raise TimeoutError("read timed out")
+
+        with self.assertRaises(TimeoutError):
+            self.middleware.wrap_make_request(timeout)("eth_blockNumber", [])
+
+        methods = self.profile.snapshot()["methods"]
+        self.assertEqual(
+            methods["getMeterSummary:eth_call"]["errors"], {"ContractLogicError": 1}
+        )
+        self.assertEqual(
+            methods["eth_blockNumber"]["errors"], {"RPCError": 1, "TimeoutError": 1}
+        )
+
+    # negative test
+    # SIGUSR1 while the main thread holds the profile's lock does not deadlock
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "needs SIGUSR1")
+    def test_dump_signal_while_recording(self):
+        """
+        test the signal handler returns while the lock is held and the dump follows
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, "profile.json")
+        previous = signal.getsignal(signal.SIGUSR1)
+        self.addCleanup(signal.signal, signal.SIGUSR1, previous)
+        install_dump_handlers(self.profile, path, at_exit=False)
+
+        with self.profile._lock:
+            os.kill(os.getpid(), signal.SIGUSR1)
+            # Python runs the handler on the main thread between bytecodes
+            time.sleep(0.05)
+            self.assertFalse(os.path.exists(path))
+
+        deadline = time.monotonic() + 5
+        while not os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
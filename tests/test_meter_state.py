@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import MagicMock
+
+from client.gui import SmartMeterUI
+from client.meter_state import MeterState, RenderScheduler
+
+# run test with = python -m unittest tests/test_meter_state.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestMeterState(unittest.TestCase):
+    """
+    unit tests for the meter view-model and the render scheduler
+    """
+
+    # positive test
+    # listeners only hear about values that changed
+    def test_update_notifies_changes(self):
+        """
+        test update reports changed fields and stays quiet when nothing changed
+        """
+        state = MeterState()
+        listener = MagicMock()
+        state.subscribe(listener)
+
+        state.update(connection_status="connected")
+        state.update(connection_status="connected")
+
+        listener.assert_called_once_with({"connection_status": "connected"})
+
+    # positive test
+    # readings add to the shown usage once a bill is known
+    def test_record_reading(self):
+        """
+        test record_reading is ignored before the first bill and added after it
+        """
+        state = MeterState()
+        state.record_reading(0.5)
+        self.assertIsNone(state.usage)
+
+        state.set_bill(1.0, 2.0)
+        state.record_reading(0.5)
+
+        self.assertEqual(state.usage, 2.5)
+        self.assertEqual(state.billed_usage, 2.0)
+
+    # positive test
+    # many changes before a frame are rendered once
+    def test_render_scheduler_coalesces(self):
+        """
+        test three changes schedule one render with the latest values
+        """
+        state = MeterState()
+        render = MagicMock()
+        scheduled = []
+        scheduler = RenderScheduler(state, render, scheduled.append)
+
+        state.set_bill(1.0, 2.0)
+        state.record_reading(0.5)
+        state.update(alert="Grid overload")
+        self.assertEqual(len(scheduled), 1)
+
+        scheduled[0]()
+
+        render.assert_called_once()
+        self.assertEqual(render.call_args.args[0]["usage"], 2.5)
+        self.assertEqual(scheduler.renders, 1)
+
+    # negative test
+    # unchanged widgets are not reconfigured
+    def test_render_skips_unchanged_widgets(self):
+        """
+        test SmartMeterUI.render only configures labels whose text changed
+        """
+        app = MagicMock()
+        app.rendered = {
+            "price": "£1.00",
+            "usage": "Used so far: 2.00 kWh",
+            "connection_status": "connected",
+            "alert": "",
+            "time": None,
+        }
+        view = {
+            "bill": 1.0,
+            "billed_usage": 2.0,
+            "usage": 2.5,
+            "connection_status": "connected",
+            "alert": "",
+        }
+
+        SmartMeterUI.render(app, view)
+
+        app.price_label.configure.assert_not_called()
+        app.usage_label.configure.assert_called_once_with(text="Used so far: 2.50 kWh")
+        app.update_connection_status.assert_not_called()
+        app.update_notice_message.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import json
+import unittest
+import urllib.request
+from collections import Counter
+from unittest.mock import MagicMock
+
+from client.event_subscription import LOG_INDEX_END, EventSubscription
+from client.instrumentation import Histogram, Profile
+from client.metrics import (
+    Aggregator,
+    Metric,
+    MetricsRegistry,
+    MetricsServer,
+    poll_collector,
+    rpc_collector,
+    subscription_collector,
+)
+
+# run test with = python -m unittest tests/test_metrics.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    unit tests for the Prometheus and JSON metrics endpoint
+    """
+
+    def setUp(self):
+        """
+        method sets up a registry labelled with a meter number
+        """
+        self.registry = MetricsRegistry({"meter": "3"})
+
+    def scrape(self, port, path="/metrics"):
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as r:
+            return r.read().decode()
+
+    # negative test
+    # a subscription fed by the alert relay exports no filter lag
+    def test_subscription_lag_only_while_following(self):
+        """
+        test the lag gauge covers subscriptions polling the chain and skips relayed ones
+        """
+        subscription = EventSubscription(MagicMock(), MagicMock(), print, name="GridAlert")
+        subscription.head = 10
+        subscription.position = (4, LOG_INDEX_END)
+        collect = subscription_collector([subscription])
+
+        self.assertEqual(collect()[0].samples, [])
+        subscription.following = True
+        self.assertEqual(collect()[0].samples, [("", {"event": "GridAlert"}, 6)])
+
+    # positive test
+    # counters carry the registry's labels and their own
+    def test_render_prometheus(self):
+        """
+        test poll counters are rendered with HELP, TYPE and the meter label
+        """
+        self.registry.register(poll_collector(Counter({"bill": 4, "health": 2})))
+
+        lines = self.registry.render_prometheus().splitlines()
+        self.assertEqual(lines[0], "# HELP meter_poll_iterations_total Passes of each polling loop")
+        self.assertEqual(lines[1], "# TYPE meter_poll_iterations_total counter")
+        self.assertIn('meter_poll_iterations_total{meter="3",loop="bill"} 4', lines)
+        self.assertIn('meter_poll_iterations_total{meter="3",loop="health"} 2', lines)
+
+    # positive test
+    # histogram buckets are cumulative and end with +Inf
+    def test_cumulative_histogram(self):
+        """
+        test a histogram snapshot is rendered as cumulative buckets, sum and count
+        """
+        histogram = Histogram((1, 10))
+        for value in (0.5, 5, 5, 50):
+            histogram.observe(value)
+        self.registry.register(
+            lambda: [Metric("lag_ms", "histogram", "lag").add_histogram(histogram.snapshot())]
+        )
+
+        text = self.registry.render_prometheus()
+        self.assertIn('lag_ms_bucket{meter="3",le="1"} 1', text)
+        self.assertIn('lag_ms_bucket{meter="3",le="10"} 3', text)
+        self.assertIn('lag_ms_bucket{meter="3",le="+Inf"} 4', text)
+        self.assertIn('lag_ms_sum{meter="3"} 60.5', text)
+        self.assertIn('lag_ms_count{meter="3"} 4', text)
+
+    # negative test
+    # quotes, backslashes and newlines in label values are escaped
+    def test_label_escaping(self):
+        """
+        test label values that would break the text format are escaped
+        """
+        self.registry.register(
+            lambda: [Metric("errors", "counter", "errors").add(1, error='a"b\\c\nd')]
+        )
+
+        text = self.registry.render_prometheus()
+        self.assertIn('errors{meter="3",error="a\\"b\\\\c\\nd"} 1', text)
+
+    # positive test
+    # both formats are served over HTTP from the RPC profile
+    def test_http_scrape(self):
+        """
+        test /metrics and /metrics.json serve the profile and unknown paths 404
+        """
+        profile = Profile([])
+        profile.record("eth_blockNumber", "eth_blockNumber", 0, {"result": "0x1"}, 0.003)
+        self.registry.register(rpc_collector(profile))
+        server = MetricsServer(self.registry, 0).start()
+        self.addCleanup(server.stop)
+
+        text = self.scrape(server.port)
+        self.assertIn('meter_rpc_requests_total{meter="3",method="eth_blockNumber"} 1', text)
+        self.assertIn(
+            'meter_rpc_latency_ms_bucket{meter="3",method="eth_blockNumber",le="5"} 1',
+            text,
+        )
+        metrics = json.loads(self.scrape(server.port, "/metrics.json"))
+        self.assertEqual(metrics["labels"], {"meter": "3"})
+        self.assertEqual(metrics["metrics"]["meter_rpc_requests_total"][0]["value"], 1)
+        with self.assertRaises(urllib.error.HTTPError):
+            self.scrape(server.port, "/other")
+
+    # positive test
+    # the same family from several targets is written once with all its samples
+    def test_aggregator_merges_families(self):
+        """
+        test HELP and TYPE appear once per family and unlabelled samples get the target
+        """
+        self.registry.register(poll_collector(Counter({"bill": 1})))
+        unlabelled = MetricsRegistry()
+        unlabelled.register(poll_collector(Counter({"bill": 2})))
+        servers = [MetricsServer(registry, 0).start() for registry in (self.registry, unlabelled)]
+        for server in servers:
+            self.addCleanup(server.stop)
+        aggregator = Aggregator(
+            {
+                meter: f"http://127.0.0.1:{server.port}/metrics"
+                for meter, server in zip(("3", "4"), servers)
+            }
+        )
+
+        lines = aggregator.render_prometheus().splitlines()
+        family = "meter_poll_iterations_total"
+        self.assertEqual(lines.count(f"# TYPE {family} counter"), 1)
+        start = lines.index(f"# TYPE {family} counter")
+        self.assertEqual(
+            lines[start + 1 : start + 3],
+            [f'{family}{{meter="3",loop="bill"}} 1', f'{family}{{meter="4",loop="bill"}} 2'],
+        )
+
+    # negative test
+    # a target that does not answer is reported down, the others still served
+    def test_aggregator_target_down(self):
+        """
+        test the aggregator merges live targets and marks a dead one down
+        """
+        self.registry.register(poll_collector(Counter({"bill": 1})))
+        server = MetricsServer(self.registry, 0).start()
+        self.addCleanup(server.stop)
+        # Port 1 is privileged and nothing listens on it
+        aggregator = Aggregator(
+            {
+                "3": f"http://127.0.0.1:{server.port}/metrics",
+                "4": "http://127.0.0.1:1/metrics",
+            }
+        )
+
+        lines = aggregator.render_prometheus().splitlines()
+        self.assertIn('meter_up{meter="3"} 1', lines)
+        self.assertIn('meter_up{meter="4"} 0', lines)
+        self.assertIn('meter_poll_iterations_total{meter="3",loop="bill"} 1', lines)
+        self.assertEqual(json.loads(aggregator.render_json())["4"], None)
+
+
+if __name__ == "__main__":
+    unittest.main()
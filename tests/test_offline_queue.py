@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+from client.offline_queue import ReadingQueue, ReadingQueueFull
+
+# run test with = python -m unittest tests/test_offline_queue.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestReadingQueue(unittest.TestCase):
+    """
+    unit tests for the durable offline reading queue
+    """
+
+    def setUp(self):
+        """
+        method creates a queue file in a temporary directory
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "queue.sqlite")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    # positive test
+    # readings come back oldest first and are removed by uid
+    def test_append_peek_remove(self):
+        """
+        test readings are kept in order until removed
+        """
+        reading_queue = ReadingQueue(self.path)
+        reading_queue.append("uid-1", 0.1)
+        reading_queue.append("uid-2", 0.2)
+        reading_queue.append("uid-3", 0.3)
+
+        self.assertEqual(reading_queue.peek(2), [("uid-1", 0.1), ("uid-2", 0.2)])
+
+        reading_queue.remove(["uid-1", "uid-2"])
+        self.assertEqual(len(reading_queue), 1)
+        self.assertEqual(reading_queue.peek(10), [("uid-3", 0.3)])
+
+    # positive test
+    # queued readings survive the process going away
+    def test_readings_persist(self):
+        """
+        test a reopened queue still holds the readings that were not removed
+        """
+        reading_queue = ReadingQueue(self.path)
+        reading_queue.append("uid-1", 0.1)
+        reading_queue.close()
+
+        reopened = ReadingQueue(self.path)
+        self.assertEqual(len(reopened), 1)
+        self.assertEqual(reopened.peek(10), [("uid-1", 0.1)])
+
+    # negative test
+    # the same uid is only queued once
+    def test_duplicate_uid_ignored(self):
+        """
+        test appending a uid twice keeps one reading
+        """
+        reading_queue = ReadingQueue(self.path)
+        reading_queue.append("uid-1", 0.1)
+        reading_queue.append("uid-1", 0.1)
+
+        self.assertEqual(len(reading_queue), 1)
+
+    # negative test
+    # the queue is bounded
+    def test_queue_full(self):
+        """
+        test appending to a full queue raises ReadingQueueFull
+        """
+        reading_queue = ReadingQueue(self.path, max_size=2)
+        reading_queue.append("uid-1", 0.1)
+        reading_queue.append("uid-2", 0.2)
+
+        with self.assertRaises(ReadingQueueFull):
+            reading_queue.append("uid-3", 0.3)
+
+    # negative test
+    # unknown fsync policies are rejected
+    def test_invalid_fsync_policy(self):
+        """
+        test an unknown fsync policy raises ValueError
+        """
+        with self.assertRaises(ValueError):
+            ReadingQueue(self.path, fsync="sometimes")
+
+
+if __name__ == "__main__":
+    unittest.main()
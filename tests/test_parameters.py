@@ -0,0 +1,137 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from client import parameters
+
+# run test with = python -m unittest tests/test_parameters.py
+# all tests = python -m unittest discover -s tests
+
+ABI = [{"type": "function", "name": "getMeterSummary", "inputs": [], "outputs": []}]
+ADDRESS = "0x" + "12" * 20
+PRIVATE_KEYS = {
+    "0x" + "aa" * 20: "0x" + "01" * 32,
+    "0x" + "bb" * 20: "0x" + "02" * 32,
+    "0x" + "cc" * 20: "0x" + "03" * 32,
+}
+
+
+class TestParameters(unittest.TestCase):
+    """
+    unit tests for the runtime config and lazily loaded parameters
+    """
+
+    def setUp(self):
+        """
+        method sets up an artifact, deployment config and accounts file in a temp dir
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.paths = {
+            "CONTRACT_COMPILE_FILE_PATH": os.path.join(directory.name, "artifact.json"),
+            "CONTRACT_ADDRESS_FILE_PATH": os.path.join(directory.name, "deployment.json"),
+            "GANACHE_ACCOUNTS_FILE_PATH": os.path.join(directory.name, "accounts.json"),
+            "RUNTIME_CONFIG_FILE_PATH": os.path.join(directory.name, "runtime.json"),
+        }
+        self.write("CONTRACT_COMPILE_FILE_PATH", {"abi": ABI, "bytecode": "0x6080"})
+        self.write("CONTRACT_ADDRESS_FILE_PATH", {"address": ADDRESS})
+        self.write(
+            "GANACHE_ACCOUNTS_FILE_PATH",
+            {
+                "addresses": {address: {} for address in PRIVATE_KEYS},
+                "private_keys": PRIVATE_KEYS,
+            },
+        )
+        for name, path in self.paths.items():
+            patcher = patch.object(parameters, name, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.clear_caches()
+        self.addCleanup(self.clear_caches)
+
+    def write(self, name, data):
+        with open(self.paths[name], "w") as f:
+            json.dump(data, f)
+
+    def clear_caches(self):
+        for loader in (
+            parameters.load_runtime_config,
+            parameters.get_contract_abi,
+            parameters.get_contract_address,
+            parameters.load_accounts_data,
+            parameters.get_account_pairs,
+        ):
+            loader.cache_clear()
+
+    # positive test
+    # the runtime config is read instead of the artifact and accounts file
+    def test_runtime_config(self):
+        """
+        test the written config holds only the abi, address and used keys and is read back
+        """
+        parameters.write_runtime_config(self.paths["RUNTIME_CONFIG_FILE_PATH"], meters=1)
+        with open(self.paths["RUNTIME_CONFIG_FILE_PATH"]) as f:
+            config = json.load(f)
+        self.assertEqual(set(config), {"abi", "address", "private_keys"})
+        # The deployer and meter 1, not the third account
+        self.assertEqual(config["private_keys"], dict(list(PRIVATE_KEYS.items())[:2]))
+
+        os.remove(self.paths["CONTRACT_COMPILE_FILE_PATH"])
+        os.remove(self.paths["GANACHE_ACCOUNTS_FILE_PATH"])
+        self.clear_caches()
+        self.assertEqual(parameters.get_contract_abi(), ABI)
+        self.assertEqual(parameters.get_contract_address(), ADDRESS)
+        self.assertEqual(parameters.get_private_key(1), "0x" + "02" * 32)
+        self.assertEqual(parameters.get_account_addresses(), list(PRIVATE_KEYS)[:2])
+        with self.assertRaises(FileNotFoundError):
+            # Meter 2 is not in the config, its key is looked up in the accounts file
+            parameters.get_private_key(2)
+
+    # negative test
+    # a config older than the deployment is ignored
+    def test_stale_runtime_config(self):
+        """
+        test a redeployment after the config was written falls back to the full files
+        """
+        parameters.write_runtime_config(self.paths["RUNTIME_CONFIG_FILE_PATH"])
+        self.write("CONTRACT_ADDRESS_FILE_PATH", {"address": "0x" + "34" * 20})
+        later = time.time() + 10
+        os.utime(self.paths["CONTRACT_ADDRESS_FILE_PATH"], (later, later))
+        self.clear_caches()
+
+        self.assertIsNone(parameters.load_runtime_config())
+        self.assertEqual(parameters.get_contract_address(), "0x" + "34" * 20)
+
+    # positive test
+    # importing the module reads no files and the client does not import web3
+    def test_lazy_import(self):
+        """
+        test the client imports without web3 and CONTRACT_ABI loads on first access
+        """
+        script = (
+            "import sys, client.blockchain_client, client.runtime; "
+            "from client import parameters; "
+            "heavy = ('web3', 'eth_account', 'aiohttp'); "
+            "print(sorted(m for m in heavy if m in sys.modules), "
+            "'CONTRACT_ABI' in vars(parameters))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=parameters.PARENT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        self.assertEqual(output.strip(), "[] False")
+        with patch.dict(vars(parameters)):
+            vars(parameters).pop("CONTRACT_ADDRESS", None)
+            self.assertEqual(parameters.CONTRACT_ADDRESS, ADDRESS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import asyncio
+import io
+import sys
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from client.gui import TkDispatcher
+from client.renderers import (
+    MeterDisplay,
+    NullRenderer,
+    TerminalRenderer,
+    create_renderer,
+)
+
+# run test with = python -m unittest tests/test_renderers.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestTkDispatcher(unittest.TestCase):
+    """
+    unit tests for marshalling UI updates onto the Tk main loop
+    """
+
+    def setUp(self):
+        """
+        method sets up a mock Tk app
+        """
+        self.mock_app = MagicMock()
+
+    # positive test
+    # calls queued from another thread run in order on drain
+    def test_drain_runs_queued_calls(self):
+        """
+        test drain applies calls made from a worker thread in order and reschedules itself
+        """
+        dispatcher = TkDispatcher(self.mock_app)
+        applied = []
+
+        worker = threading.Thread(
+            target=lambda: [dispatcher.call(applied.append, i) for i in range(3)]
+        )
+        worker.start()
+        worker.join()
+        dispatcher.drain()
+
+        self.assertEqual(applied, [0, 1, 2])
+        self.mock_app.after.assert_called_once_with(dispatcher.interval_ms, dispatcher.drain)
+
+    # negative test
+    # a failing update does not stop the others
+    def test_drain_survives_errors(self):
+        """
+        test an exception in one call is logged and the next call still runs
+        """
+        dispatcher = TkDispatcher(self.mock_app)
+        applied = []
+
+        def fail():
+            raise Exception("widget destroyed")
+
+        dispatcher.call(fail)
+        dispatcher.call(applied.append, "after")
+        with self.assertLogs(level="ERROR"):
+            dispatcher.drain()
+
+        self.assertEqual(applied, ["after"])
+
+    # positive test
+    # state changes reach the app as one render on the Tk thread
+    def test_gui_display(self):
+        """
+        test several changes are rendered once, and only when the dispatcher drains
+        """
+        dispatcher = TkDispatcher(self.mock_app)
+        self.mock_app.schedule = dispatcher.call
+        display = MeterDisplay(self.mock_app)
+
+        display.state.set_bill(1.0, 2.0)
+        display.update_connection_status("connected")
+        self.mock_app.render.assert_not_called()
+
+        dispatcher.drain()
+
+        self.mock_app.render.assert_called_once()
+        view = self.mock_app.render.call_args.args[0]
+        self.assertEqual(view["usage"], 2.0)
+        self.assertEqual(view["connection_status"], "connected")
+
+
+class TestRenderers(unittest.TestCase):
+    """
+    unit tests for the headless display backends
+    """
+
+    # positive test
+    # the terminal renderer prints one line per change
+    def test_terminal_renderer(self):
+        """
+        test a burst of changes prints one status line after a frame
+        """
+        stream = io.StringIO()
+        renderer = TerminalRenderer(stream, frame=0)
+        display = MeterDisplay(renderer)
+
+        async def run():
+            display.state.set_bill(1.5, 2.25)
+            display.update_connection_status("connected")
+            await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+
+        self.assertEqual(
+            stream.getvalue(), "£1.50 | Used so far: 2.25 kWh | connected\n"
+        )
+
+    # positive test
+    # the null renderer draws nothing and the state is still kept
+    def test_null_renderer(self):
+        """
+        test state updates work with nothing rendered
+        """
+        renderer = NullRenderer()
+        renderer.render = MagicMock()
+        display = MeterDisplay(renderer)
+
+        display.update_notice_message("Grid overload")
+
+        self.assertEqual(display.state.alert, "Grid overload")
+        renderer.render.assert_not_called()
+
+    # positive test
+    # headless backends do not import customtkinter
+    def test_create_renderer_headless(self):
+        """
+        test terminal and null renderers are created without loading the GUI module
+        """
+        sys.modules.pop("client.gui", None)
+
+        self.assertIsInstance(create_renderer("terminal"), TerminalRenderer)
+        self.assertIsInstance(create_renderer("null"), NullRenderer)
+        self.assertNotIn("client.gui", sys.modules)
+
+    # negative test
+    # unknown backends are rejected
+    def test_create_renderer_unknown(self):
+        """
+        test an unknown renderer name raises ValueError
+        """
+        with self.assertRaises(ValueError):
+            create_renderer("hologram")
+
+if __name__ == "__main__":
+    unittest.main()
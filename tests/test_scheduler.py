@@ -0,0 +1,173 @@
+import asyncio
+import unittest
+
+from client.scheduler import FAILED, MINED, SubmissionScheduler
+
+# run test with = python -m unittest tests/test_scheduler.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestSubmissionScheduler(unittest.TestCase):
+    """
+    unit tests for the reading submission scheduler
+    """
+
+    def run_scheduler(self, scheduler, readings):
+        """
+        submits readings, runs the workers until they are done and returns what submit gave back
+        """
+
+        async def run():
+            accepted = [scheduler.submit(uid, reading) for uid, reading in readings]
+            workers = asyncio.create_task(scheduler.run())
+            await scheduler._queue.join()
+            workers.cancel()
+            return accepted
+
+        return asyncio.run(run())
+
+    # positive test
+    # readings are sent and mined
+    def test_readings_mined(self):
+        """
+        test every reading ends mined, settled and with a latency sample
+        """
+        settled = []
+
+        async def send(uid, reading):
+            return b"tx-" + uid.encode()
+
+        async def confirm(tx):
+            return {"status": 1}
+
+        scheduler = SubmissionScheduler(send, confirm, on_settled=settled.append)
+        self.run_scheduler(scheduler, [("a", 0.1), ("b", 0.2)])
+
+        self.assertEqual(scheduler.states, {"a": MINED, "b": MINED})
+        self.assertEqual(settled, ["a", "b"])
+        self.assertEqual(scheduler.stats()["latency"]["count"], 2)
+        self.assertEqual(scheduler.active, set())
+
+    # positive test
+    # no more than max_in_flight readings are sent at once
+    def test_in_flight_limit(self):
+        """
+        test the number of concurrent sends never exceeds the limit
+        """
+        concurrent = 0
+        peak = 0
+
+        async def send(uid, reading):
+            nonlocal concurrent, peak
+            concurrent += 1
+            peak = max(peak, concurrent)
+            await asyncio.sleep(0.01)
+            concurrent -= 1
+            return b"tx"
+
+        async def confirm(tx):
+            return {"status": 1}
+
+        scheduler = SubmissionScheduler(send, confirm, max_in_flight=3)
+        self.run_scheduler(scheduler, [(str(i), 0.1) for i in range(20)])
+
+        self.assertEqual(peak, 3)
+        self.assertEqual(scheduler.counts[MINED], 20)
+
+    # positive test
+    # failed sends are retried
+    def test_retry_then_mined(self):
+        """
+        test a reading that fails twice is retried and mined
+        """
+        attempts = []
+
+        async def send(uid, reading):
+            attempts.append(uid)
+            if len(attempts) < 3:
+                raise Exception("connection refused")
+            return b"tx"
+
+        async def confirm(tx):
+            return {"status": 1}
+
+        scheduler = SubmissionScheduler(send, confirm, retry_base_delay=0)
+        self.run_scheduler(scheduler, [("a", 0.1)])
+
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(scheduler.states["a"], MINED)
+
+    # negative test
+    # a reading still failing after the retries is marked failed and not settled
+    def test_failed_after_retries(self):
+        """
+        test the reading is failed and left for the offline queue
+        """
+        settled = []
+
+        async def send(uid, reading):
+            raise Exception("connection refused")
+
+        async def confirm(tx):
+            return {"status": 1}
+
+        scheduler = SubmissionScheduler(
+            send, confirm, on_settled=settled.append, max_retries=2, retry_base_delay=0
+        )
+        self.run_scheduler(scheduler, [("a", 0.1)])
+
+        self.assertEqual(scheduler.states["a"], FAILED)
+        self.assertEqual(settled, [])
+
+    # negative test
+    # final errors are not retried
+    def test_final_error_not_retried(self):
+        """
+        test an error with a final state settles the reading on the first attempt
+        """
+        attempts = []
+
+        async def send(uid, reading):
+            attempts.append(uid)
+            raise Exception("Meter reading must be greater than zero")
+
+        async def confirm(tx):
+            return {"status": 1}
+
+        scheduler = SubmissionScheduler(
+            send, confirm, final_state=lambda error: FAILED, retry_base_delay=0
+        )
+        self.run_scheduler(scheduler, [("a", 0.0)])
+
+        self.assertEqual(attempts, ["a"])
+        self.assertEqual(scheduler.states["a"], FAILED)
+
+    # negative test
+    # submit refuses readings once the queue is full
+    def test_backpressure(self):
+        """
+        test submit returns False when full and on_capacity runs once there is room
+        """
+        capacity_calls = []
+
+        async def send(uid, reading):
+            return b"tx"
+
+        async def confirm(tx):
+            return {"status": 1}
+
+        scheduler = SubmissionScheduler(
+            send,
+            confirm,
+            on_capacity=lambda: capacity_calls.append(True),
+            max_queued=2,
+        )
+        accepted = self.run_scheduler(scheduler, [("a", 0.1), ("b", 0.2), ("c", 0.3)])
+
+        self.assertEqual(accepted, [True, True, False])
+        self.assertEqual(capacity_calls, [True])
+        self.assertFalse(scheduler.backpressure)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from web3 import EthereumTesterProvider, Web3
+
+from client.renderers import create_renderer
+from client.runtime import ClientRuntime
+from server.seed import (
+    is_seeded,
+    main,
+    revert_snapshot,
+    seed,
+    seed_transactions,
+    take_snapshot,
+)
+
+# run test with = python -m unittest tests/test_seed.py
+# all tests = python -m unittest discover -s tests
+
+PRIVATE_KEY = "0x" + "01" * 32
+
+
+class TestSeed(unittest.TestCase):
+    """
+    unit tests for seeding every meter's history in bulk
+    """
+
+    # positive test
+    # histories are split into batches and the meters take turns
+    def test_seed_transactions(self):
+        """
+        test 250 readings for 2 meters go in 6 interleaved transactions
+        """
+        transactions = seed_transactions(["0xA", "0xB"], 250, batch_size=100)
+
+        self.assertEqual([meter for meter, _, _ in transactions], ["0xA", "0xB"] * 3)
+        self.assertEqual(
+            [len(uids) for _, uids, _ in transactions], [100, 100, 100, 100, 50, 50]
+        )
+        uids = [uid for _, batch, _ in transactions for uid in batch]
+        self.assertEqual(len(set(uids)), 500)
+        readings = [reading for _, _, batch in transactions for reading in batch]
+        self.assertTrue(all(reading > 0 for reading in readings))
+
+    # positive test
+    # receipts are waited on once in_flight transactions have been sent
+    def test_seed_pipelines(self):
+        """
+        test every transaction is sent and its receipt checked, in_flight at a time
+        """
+        mock_w3 = MagicMock()
+        mock_w3.eth.wait_for_transaction_receipt.return_value = {"status": 1}
+        mock_contract = MagicMock()
+        order = []
+        mock_contract.functions.storeMeterReadings.return_value.transact.side_effect = (
+            lambda tx: order.append("send") or b"\x01"
+        )
+        mock_w3.eth.wait_for_transaction_receipt.side_effect = (
+            lambda tx_hash: order.append("wait") or {"status": 1}
+        )
+
+        stored = seed(
+            mock_w3, mock_contract, ["0xA", "0xB"], 30, batch_size=10, in_flight=4
+        )
+
+        self.assertEqual(stored, 60)
+        self.assertEqual(order, ["send"] * 4 + ["wait"] * 4 + ["send"] * 2 + ["wait"] * 2)
+
+    # negative test
+    # a reverted seeding transaction stops the seeder
+    def test_seed_reverted(self):
+        """
+        test a failed receipt raises instead of recording the chain as seeded
+        """
+        mock_w3 = MagicMock()
+        mock_w3.eth.wait_for_transaction_receipt.return_value = {"status": 0}
+
+        with self.assertRaises(Exception):
+            seed(mock_w3, MagicMock(), ["0xA"], 10)
+
+    # positive test
+    # evm_snapshot and evm_revert return the chain to the seeded block
+    def test_snapshot_revert(self):
+        """
+        test a reverted chain is back at the block of its snapshot
+        """
+        try:
+            import eth_tester  # noqa: F401
+        except ImportError:
+            self.skipTest("eth-tester is not installed")
+        w3 = Web3(EthereumTesterProvider())
+        snapshot_id = take_snapshot(w3)
+        block = w3.eth.block_number
+        w3.eth.send_transaction(
+            {"from": w3.eth.accounts[0], "to": w3.eth.accounts[1], "value": 1}
+        )
+        self.assertEqual(w3.eth.block_number, block + 1)
+
+        revert_snapshot(w3, snapshot_id)
+        self.assertEqual(w3.eth.block_number, block)
+
+    # negative test
+    # a snapshot lost with a node restart is logged and forgotten
+    def test_lost_snapshot(self):
+        """
+        test a failed evm_revert is logged and the stale snapshot id is dropped
+        """
+        mock_w3 = MagicMock()
+        mock_w3.manager.request_blocking.return_value = False
+        state = {"address": "0xC", "meters": ["0xA"], "readings": 12, "snapshot": "0x1"}
+
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertFalse(revert_snapshot(mock_w3, "0x1"))
+        self.assertIn("do not survive a Ganache restart", logs.output[0])
+
+        with patch("server.seed.get_web3", return_value=mock_w3), patch(
+            "server.seed.load_seed_state", return_value=state
+        ), patch("server.seed.save_seed_state") as mock_save:
+            with self.assertRaises(SystemExit):
+                main(["revert"])
+        mock_save.assert_called_once_with({**state, "snapshot": None})
+
+    # negative test
+    # a record of another deployment or an emptied chain is not seeded
+    def test_is_seeded(self):
+        """
+        test the seed state must match the contract and the meter's history
+        """
+        mock_w3 = MagicMock()
+        mock_contract = MagicMock()
+        mock_contract.address = "0xC"
+        mock_contract.functions.getMeterSummary.return_value.call.return_value = (
+            0,
+            0,
+            12,
+            "uid",
+        )
+        state = {"address": "0xC", "meters": ["0xA"], "readings": 12}
+
+        self.assertTrue(is_seeded(mock_w3, mock_contract, state))
+        self.assertFalse(is_seeded(mock_w3, mock_contract, None))
+        self.assertFalse(is_seeded(mock_w3, mock_contract, {**state, "address": "0xD"}))
+        mock_w3.eth.get_code.return_value = b""
+        self.assertFalse(is_seeded(mock_w3, mock_contract, state))
+
+    # positive test
+    # a meter with history on chain sends no seeding transaction
+    def test_client_skips_seeding(self):
+        """
+        test the client only stores a starting set when it has no readings
+        """
+        runtime = ClientRuntime(create_renderer("null"), PRIVATE_KEY, 1)
+        mock_contract = MagicMock()
+        summary = mock_contract.functions.getMeterSummary.return_value
+        summary.call = AsyncMock(return_value=(0, 0, 12, "uid"))
+
+        with patch("client.runtime.BlockchainStoreReading.store_readings") as store:
+            asyncio.run(runtime.store_initial_set(MagicMock(), mock_contract))
+            store.assert_not_called()
+
+            summary.call.return_value = (0, 0, 0, "")
+            store.side_effect = AsyncMock()
+            asyncio.run(runtime.store_initial_set(MagicMock(), mock_contract))
+            self.assertEqual(len(store.call_args.args[0]), 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from client.transport import POOL_MAXSIZE, get_session, get_web3
+
+# run test with = python -m unittest tests/test_transport.py
+# all tests = python -m unittest discover -s tests
+
+
+class TestTransport(unittest.TestCase):
+    """
+    unit tests for the shared JSON-RPC transport
+    """
+
+    # positive test
+    # every provider for an endpoint shares one pooled session
+    def test_providers_share_session(self):
+        """
+        test get_web3 reuses the same requests session for the same endpoint
+        """
+        first = get_web3("http://127.0.0.1:8545")
+        second = get_web3("http://127.0.0.1:8545")
+
+        self.assertIsNot(first, second)
+        self.assertIs(
+            first.provider._request_session_manager.cache_and_return_session(
+                first.provider.endpoint_uri
+            ),
+            second.provider._request_session_manager.cache_and_return_session(
+                second.provider.endpoint_uri
+            ),
+        )
+
+    # positive test
+    # the pool is bounded and blocks when full
+    def test_session_pool_is_bounded(self):
+        """
+        test the session adapter keeps a bounded, blocking connection pool
+        """
+        adapter = get_session("http://127.0.0.1:8545").get_adapter("http://127.0.0.1")
+
+        self.assertEqual(adapter._pool_maxsize, POOL_MAXSIZE)
+        self.assertTrue(adapter._pool_block)
+
+    # negative test
+    # different endpoints do not share a session
+    def test_sessions_per_endpoint(self):
+        """
+        test each endpoint gets its own session
+        """
+        self.assertIsNot(
+            get_session("http://127.0.0.1:8545"), get_session("http://127.0.0.1:7545")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()